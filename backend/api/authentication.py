@@ -0,0 +1,30 @@
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework.authentication import TokenAuthentication
+
+from .metrics import increment
+
+TOKEN_CACHE_KEY = 'auth_token:{}'
+
+
+def invalidate_token(key):
+    cache.delete(TOKEN_CACHE_KEY.format(key))
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """Аутентификация по токену с кэшированием пары токен → юзер.
+    Только с общим кэшем: иначе удалённый токен продолжал бы работать
+    в остальных воркерах до истечения TOKEN_CACHE_TIMEOUT."""
+
+    def authenticate_credentials(self, key):
+        if not settings.CACHE_IS_SHARED:
+            return super().authenticate_credentials(key)
+        cache_key = TOKEN_CACHE_KEY.format(key)
+        cached = cache.get(cache_key)
+        if cached is not None:
+            increment('auth_token.hits')
+            return cached
+        increment('auth_token.misses')
+        user, token = super().authenticate_credentials(key)
+        cache.set(cache_key, (user, token), settings.TOKEN_CACHE_TIMEOUT)
+        return user, token
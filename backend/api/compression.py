@@ -0,0 +1,90 @@
+import gzip
+import hashlib
+import re
+
+import brotli
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.utils.cache import patch_vary_headers
+from django.utils.deprecation import MiddlewareMixin
+
+PAYLOAD_KEY = 'payload:{}'
+ACCEPT_ENCODING = re.compile(r'\s*([\w*-]+)\s*(?:;\s*q=(\d(?:\.\d*)?))?')
+
+
+def compress(content, encoding):
+    if encoding == 'br':
+        return brotli.compress(content, quality=settings.BROTLI_QUALITY)
+    return gzip.compress(content, compresslevel=settings.GZIP_LEVEL)
+
+
+def get_encoding(request, available=('br', 'gzip')):
+    """Лучшее из доступных сжатий по Accept-Encoding; '' - без сжатия."""
+    accepted = set()
+    for part in request.META.get('HTTP_ACCEPT_ENCODING', '').split(','):
+        match = ACCEPT_ENCODING.match(part)
+        if match and float(match[2] or 1) > 0:
+            accepted.add(match[1].lower())
+    for encoding in available:
+        if encoding in accepted or '*' in accepted:
+            return encoding
+    return ''
+
+
+class CompressionMiddleware(MiddlewareMixin):
+    """Сжатие ответов brotli или gzip по Accept-Encoding, начиная с
+    COMPRESSION_MIN_SIZE байт. Уже сжатые ответы не трогает. Как
+    и GZipMiddleware, поддерживает ASGI: в async-режиме в потоке
+    выполняется только сжатие, а не весь запрос."""
+
+    def process_response(self, request, response):
+        if (response.streaming
+                or response.has_header('Content-Encoding')
+                or len(response.content) < settings.COMPRESSION_MIN_SIZE):
+            return response
+        patch_vary_headers(response, ('Accept-Encoding',))
+        encoding = get_encoding(request)
+        if not encoding:
+            return response
+        content = compress(response.content, encoding)
+        if len(content) >= len(response.content):
+            return response
+        response.content = content
+        response['Content-Length'] = str(len(content))
+        response['Content-Encoding'] = encoding
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response['ETag'] = 'W/' + etag
+        return response
+
+
+def get_payload(name, render, timeout, url=None):
+    """Тело ответа из кэша вместе с заранее сжатыми вариантами, чтобы
+    не сжимать его на каждом попадании."""
+    key = PAYLOAD_KEY.format(name)
+    if url is not None:
+        key += ':' + hashlib.md5(url.encode()).hexdigest()
+    payload = cache.get(key)
+    if payload is None:
+        content = render()
+        payload = {'': content}
+        if len(content) >= settings.COMPRESSION_MIN_SIZE:
+            for encoding in ('br', 'gzip'):
+                payload[encoding] = compress(content, encoding)
+        cache.set(key, payload, timeout)
+    return payload
+
+
+def invalidate_payload(name):
+    cache.delete(PAYLOAD_KEY.format(name))
+
+
+def payload_response(request, payload, content_type='application/json'):
+    encoding = get_encoding(request, tuple(name for name in payload if name))
+    response = HttpResponse(payload[encoding], content_type=content_type)
+    if encoding:
+        response['Content-Encoding'] = encoding
+    if len(payload) > 1:
+        patch_vary_headers(response, ('Accept-Encoding',))
+    return response
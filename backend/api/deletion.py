@@ -0,0 +1,103 @@
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+
+from recipes.models import (Favorite, FeedItem, Recipe, RecipeIngredient,
+                            RecipeScore, RecipeTag, ShoppingCart,
+                            ShoppingListItem, Tombstone)
+from users.models import Subscription, User
+from .similarity import invalidate_index, mark_recipe_changed
+from .tasks import enqueue_many
+from .utils import (chunked, delete_recipe_image, invalidate_tag_facets,
+                    remove_recipes_from_shopping_lists)
+
+DELETE_USER_KEY = 'delete_user:{}'
+
+
+def raw_delete(queryset):
+    """Один DELETE по условию, без сборщика Django: строки не читаются
+    в память и сигналы не отправляются, их работу делает вызывающий
+    код."""
+    return queryset._raw_delete(queryset.db)
+
+
+def get_relation_tombstones(model, kind, recipe_ids):
+    return [
+        Tombstone(kind=kind, object_id=recipe_id, user_id=user_id)
+        for user_id, recipe_id in model.objects.filter(
+            recipe_id__in=recipe_ids).values_list('user_id', 'recipe_id')
+    ]
+
+
+def delete_recipes(recipe_ids, batch_size=None):
+    """Удаляет рецепты пачками по DELETE_BATCH_SIZE, каждая пачка -
+    в своей транзакции. Связанные строки удаляются запросом на таблицу,
+    а не по одной; списки покупок, записи об удалениях, картинки
+    и индексы обновляются так же, как сигналами при удалении одного
+    рецепта."""
+    batch_size = batch_size or settings.DELETE_BATCH_SIZE
+    deleted = 0
+    for chunk in chunked(recipe_ids, batch_size):
+        with transaction.atomic():
+            rows = list(Recipe.objects.select_for_update().filter(
+                id__in=chunk).values_list('id', 'image', 'author_id'))
+            if not rows:
+                continue
+            ids = [recipe_id for recipe_id, _, _ in rows]
+            remove_recipes_from_shopping_lists(ids)
+            tombstones = [Tombstone(kind=Tombstone.RECIPE, object_id=recipe_id,
+                                    user_id=author_id)
+                          for recipe_id, _, author_id in rows]
+            tombstones += get_relation_tombstones(
+                Favorite, Tombstone.FAVORITE, ids)
+            tombstones += get_relation_tombstones(
+                ShoppingCart, Tombstone.SHOPPING_CART, ids)
+            for model in (Favorite, ShoppingCart, RecipeIngredient,
+                          RecipeTag, FeedItem, RecipeScore):
+                raw_delete(model.objects.filter(recipe_id__in=ids))
+            raw_delete(Recipe.objects.filter(id__in=ids))
+            Tombstone.objects.bulk_create(tombstones, batch_size=batch_size)
+            enqueue_many(delete_recipe_image,
+                         [(image,) for _, image, _ in rows if image],
+                         queue='files')
+            if len(ids) == 1:
+                mark_recipe_changed(ids[0])
+            else:
+                transaction.on_commit(invalidate_index)
+        deleted += len(ids)
+    if deleted:
+        invalidate_tag_facets()
+    return deleted
+
+
+def delete_user(user_id, batch_size=None):
+    """Удаляет юзера: рецепты - пачками через delete_recipes, подписки,
+    ленту, избранное, корзину и список покупок - запросом на таблицу.
+    Оставшиеся связи (токены, журнал админки) немногочисленны и удаляются
+    обычным каскадом. Повторный запуск продолжает прерванное удаление."""
+    user = User.objects.filter(id=user_id).first()
+    if user is None:
+        return 0
+    deleted = delete_recipes(list(Recipe.objects.filter(
+        author_id=user_id).order_by('id').values_list('id', flat=True)),
+        batch_size)
+    with transaction.atomic():
+        Tombstone.objects.bulk_create(
+            [Tombstone(kind=Tombstone.SUBSCRIPTION, object_id=user_id,
+                       user_id=subscriber_id)
+             for subscriber_id in Subscription.objects.filter(
+                subscribed_id=user_id).values_list(
+                'subscriber_id', flat=True)],
+            batch_size=batch_size or settings.DELETE_BATCH_SIZE,
+        )
+        raw_delete(Subscription.objects.filter(
+            Q(subscriber_id=user_id) | Q(subscribed_id=user_id)))
+        raw_delete(FeedItem.objects.filter(
+            Q(user_id=user_id) | Q(author_id=user_id)))
+        for model in (Favorite, ShoppingCart, ShoppingListItem):
+            raw_delete(model.objects.filter(user_id=user_id))
+        # Записи об удалении его рецептов нужны подписчикам.
+        raw_delete(Tombstone.objects.filter(user_id=user_id).exclude(
+            kind=Tombstone.RECIPE))
+        user.delete()
+    return deleted
@@ -0,0 +1,62 @@
+from django.conf import settings
+from django.db.models import Exists, OuterRef
+
+from recipes.models import FeedItem, Recipe
+from users.models import Subscription
+
+FAN_OUT_KEY = 'fan_out:{}:{}'
+BACKFILL_FEED_KEY = 'backfill_feed:{}:{}'
+
+
+def has_many_subscribers(author_id):
+    """Для популярных авторов лента собирается при чтении."""
+    threshold = settings.FEED_FANOUT_MAX_SUBSCRIBERS
+    return Subscription.objects.filter(
+        subscribed_id=author_id).order_by()[threshold:threshold + 1].exists()
+
+
+def fan_out_recipe(recipe_id, author_id):
+    if (has_many_subscribers(author_id)
+            or not Recipe.objects.filter(id=recipe_id).exists()):
+        return
+    subscriber_ids = Subscription.objects.filter(
+        subscribed_id=author_id).values_list('subscriber_id', flat=True)
+    FeedItem.objects.bulk_create(
+        (FeedItem(user_id=subscriber_id, author_id=author_id,
+                  recipe_id=recipe_id)
+         for subscriber_id in subscriber_ids.iterator()),
+        batch_size=settings.FEED_FANOUT_BATCH_SIZE,
+        ignore_conflicts=True,
+    )
+
+
+def backfill_feed(user_id, author_id):
+    if has_many_subscribers(author_id):
+        return
+    recipe_ids = Recipe.objects.filter(author_id=author_id).values_list(
+        'id', flat=True)[:settings.FEED_BACKFILL_SIZE]
+    FeedItem.objects.bulk_create(
+        (FeedItem(user_id=user_id, author_id=author_id, recipe_id=recipe_id)
+         for recipe_id in recipe_ids),
+        ignore_conflicts=True,
+    )
+
+
+def get_feed_recipe_ids(user, cursor, limit):
+    """Id рецептов ленты по убыванию, строго меньше курсора."""
+    timeline = FeedItem.objects.filter(user=user)
+    threshold = settings.FEED_FANOUT_MAX_SUBSCRIBERS
+    popular_authors = Subscription.objects.filter(
+        subscriber=user,
+    ).annotate(popular=Exists(
+        Subscription.objects.filter(
+            subscribed_id=OuterRef('subscribed_id')
+        ).order_by()[threshold:threshold + 1]
+    )).filter(popular=True).values('subscribed_id')
+    popular = Recipe.objects.filter(author_id__in=popular_authors)
+    if cursor is not None:
+        timeline = timeline.filter(recipe_id__lt=cursor)
+        popular = popular.filter(id__lt=cursor)
+    recipe_ids = set(timeline.values_list('recipe_id', flat=True)[:limit])
+    recipe_ids.update(popular.values_list('id', flat=True)[:limit])
+    return sorted(recipe_ids, reverse=True)[:limit]
@@ -1,13 +1,40 @@
+from django.conf import settings
+from django.db.models import Case, IntegerField, When
 from django_filters import rest_framework
 from rest_framework import filters
 from recipes.models import Recipe, Tag
 
+from .trigrams import search_ingredients
+
 
 class IngredientSearchFilter(filters.SearchFilter):
+    """Поиск по началу названия и по триграммам с учётом опечаток,
+    результаты упорядочены по релевантности."""
     search_param = 'name'
 
+    def filter_queryset(self, request, queryset, view):
+        query = request.query_params.get(self.search_param, '')
+        if not query.strip():
+            return queryset
+        ingredient_ids = search_ingredients(
+            query, settings.INGREDIENT_SEARCH_LIMIT,
+            settings.INGREDIENT_SEARCH_THRESHOLD)
+        if not ingredient_ids:
+            return queryset.none()
+        return queryset.filter(id__in=ingredient_ids).order_by(Case(
+            *(When(id=ingredient_id, then=position)
+              for position, ingredient_id in enumerate(ingredient_ids)),
+            output_field=IntegerField(),
+        ))
+
+
+class NumberInFilter(rest_framework.BaseInFilter,
+                     rest_framework.NumberFilter):
+    pass
+
 
 class RecipeFilter(rest_framework.FilterSet):
+    ids = NumberInFilter(field_name='id', lookup_expr='in')
     author = rest_framework.NumberFilter(field_name='author__id',
                                          lookup_expr='exact')
     tags = rest_framework.ModelMultipleChoiceFilter(
@@ -18,6 +45,14 @@ class RecipeFilter(rest_framework.FilterSet):
     is_favorited = rest_framework.NumberFilter(method='filter_favorited',)
     is_in_shopping_cart = rest_framework.NumberFilter(
         method='filter_is_in_shopping_cart',)
+    max_kcal = rest_framework.NumberFilter(field_name='kcal',
+                                           lookup_expr='lte')
+    min_protein = rest_framework.NumberFilter(field_name='protein',
+                                              lookup_expr='gte')
+    max_fat = rest_framework.NumberFilter(field_name='fat',
+                                          lookup_expr='lte')
+    max_carbs = rest_framework.NumberFilter(field_name='carbs',
+                                            lookup_expr='lte')
 
     def filter_favorited(self, queryset, name, value):
         if self.request.user.is_authenticated:
@@ -41,4 +76,6 @@ class RecipeFilter(rest_framework.FilterSet):
 
     class Meta:
         model = Recipe
-        fields = ('author', 'tags', 'is_favorited', 'is_in_shopping_cart')
+        fields = ('ids', 'author', 'tags', 'is_favorited',
+                  'is_in_shopping_cart', 'max_kcal', 'min_protein',
+                  'max_fat', 'max_carbs')
@@ -0,0 +1,20 @@
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management import BaseCommand
+
+from api.similarity import VERSION_KEY, index
+
+
+class Command(BaseCommand):
+    help = 'Построить MinHash-индекс похожих рецептов и сохранить в файл.'
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        index.version = cache.get(VERSION_KEY, 0)
+        index.build()
+        index.save(settings.SIMILARITY_INDEX_PATH)
+        self.stdout.write(
+            f'Проиндексировано рецептов: {len(index.recipe_ids)} '
+            f'за {time.monotonic() - started:.2f} с')
@@ -0,0 +1,18 @@
+from django.core.management import BaseCommand
+
+from api.trending import decay_scores, rebuild_scores
+
+
+class Command(BaseCommand):
+    help = 'Применить затухание к популярности рецептов (запускать по cron).'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--rebuild', action='store_true',
+            help='Пересчитать популярность заново по избранному и корзинам.')
+
+    def handle(self, *args, **options):
+        if options['rebuild']:
+            rebuild_scores()
+        else:
+            decay_scores()
@@ -0,0 +1,35 @@
+from django.core.management import BaseCommand
+
+from api.trigrams import choose_canonical, index, merge_ingredients
+from recipes.models import Ingredient
+
+
+class Command(BaseCommand):
+    help = ('Найти вероятные дубли ингредиентов по триграммам названий '
+            'и при --merge объединить их.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threshold', type=float, default=0.8,
+                            help='Минимальный коэффициент Жаккара '
+                                 'наборов триграмм.')
+        parser.add_argument('--merge', action='store_true',
+                            help='Перенести рецепты на основной ингредиент '
+                                 'группы и удалить остальные.')
+
+    def handle(self, *args, **options):
+        with index.lock:
+            index.load()
+            clusters = index.get_clusters(options['threshold'])
+        names = dict(Ingredient.objects.values_list('id', 'name'))
+        for cluster in clusters:
+            canonical_id = choose_canonical(cluster)
+            duplicate_ids = [ingredient_id for ingredient_id in cluster
+                             if ingredient_id != canonical_id]
+            self.stdout.write(
+                f'{names[canonical_id]} ({canonical_id}) <- ' + ', '.join(
+                    f'{names[ingredient_id]} ({ingredient_id})'
+                    for ingredient_id in duplicate_ids))
+            if options['merge']:
+                recipes = merge_ingredients(canonical_id, duplicate_ids)
+                self.stdout.write(f'  объединено, рецептов: {recipes}')
+        self.stdout.write(f'Групп дублей: {len(clusters)}')
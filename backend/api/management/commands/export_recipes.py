@@ -0,0 +1,24 @@
+import sys
+
+from django.conf import settings
+from django.core.management import BaseCommand
+
+from api.ndjson import export_recipes
+from recipes.models import Recipe
+
+
+class Command(BaseCommand):
+    help = 'Выгрузить рецепты в NDJSON.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output', help='Файл (по умолчанию stdout).')
+        parser.add_argument('--chunk-size', type=int,
+                            default=settings.EXPORT_CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        lines = export_recipes(Recipe.objects.all(), options['chunk_size'])
+        if options['output'] is None:
+            sys.stdout.writelines(lines)
+            return
+        with open(options['output'], 'w', encoding='utf8') as out_f:
+            out_f.writelines(lines)
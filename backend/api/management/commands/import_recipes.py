@@ -0,0 +1,29 @@
+import sys
+
+from django.conf import settings
+from django.core.management import BaseCommand
+
+from api.ndjson import RecipeImporter
+
+
+class Command(BaseCommand):
+    help = 'Загрузить рецепты из NDJSON.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Файл (- для stdin).')
+        parser.add_argument('--batch-size', type=int,
+                            default=settings.IMPORT_BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        importer = RecipeImporter(options['batch_size'])
+        if options['path'] == '-':
+            importer.run(sys.stdin)
+        else:
+            with open(options['path'], 'r', encoding='utf8') as inp_f:
+                importer.run(inp_f)
+        for number, message in importer.errors:
+            self.stderr.write(f'Строка {number}: {message}')
+        self.stdout.write(
+            f'Загружено рецептов: {importer.imported}, '
+            f'пропущено неизвестных тэгов: {importer.skipped_tags}, '
+            f'пропущено строк с ошибками: {len(importer.errors)}')
@@ -1,7 +1,9 @@
 import csv
+from itertools import zip_longest
 
 from django.core.management import BaseCommand
 
+from api.nutrition import NUTRIENTS
 from recipes.models import Ingredient, Tag
 
 
@@ -16,7 +18,15 @@ class Command(BaseCommand):
     def handle(self, *args, **options):
         reader = iter_csv('data/ingredients.csv')
         for row in reader:
-            ingredient = Ingredient(name=row[0], measurement_unit=row[1])
+            # Необязательные колонки: ккал, белки, жиры, углеводы;
+            # пустые и отсутствующие - 0.
+            nutrients = {
+                name: float(value.strip() or 0)
+                for name, value in zip_longest(NUTRIENTS, row[2:6],
+                                               fillvalue='')
+            }
+            ingredient = Ingredient(name=row[0], measurement_unit=row[1],
+                                    **nutrients)
             ingredient.save()
 
         reader = iter_csv('data/tags.csv')
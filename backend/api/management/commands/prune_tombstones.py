@@ -0,0 +1,10 @@
+from django.core.management import BaseCommand
+
+from api.sync import prune_tombstones
+
+
+class Command(BaseCommand):
+    help = 'Удалить устаревшие записи об удалениях (запускать по cron).'
+
+    def handle(self, *args, **options):
+        self.stdout.write(f'Удалено записей: {prune_tombstones()}')
@@ -0,0 +1,21 @@
+import time
+
+from django.conf import settings
+from django.core.management import BaseCommand
+
+from api.nutrition import update_nutrition
+
+
+class Command(BaseCommand):
+    help = 'Пересчитать пищевую ценность всех рецептов.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int,
+                            default=settings.NUTRITION_BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        updated = update_nutrition(batch_size=options['batch_size'])
+        self.stdout.write(
+            f'Изменено рецептов: {updated} '
+            f'за {time.monotonic() - started:.2f} с')
@@ -0,0 +1,65 @@
+import multiprocessing
+import signal
+import threading
+
+from django.conf import settings
+from django.core.management import BaseCommand
+from django.db import connections
+
+from api.tasks import work
+
+
+def run_threads(queues, threads, burst):
+    stop = threading.Event()
+    if threading.current_thread() is threading.main_thread():
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            signal.signal(signum, lambda *args: stop.set())
+    workers = [
+        threading.Thread(target=work, args=(queues, stop, burst))
+        for _ in range(threads)
+    ]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+
+
+class Command(BaseCommand):
+    help = 'Запустить воркеры очереди задач.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--queues', default=settings.JOB_QUEUES,
+            help='Очереди через запятую.')
+        parser.add_argument(
+            '--threads', type=int, default=settings.BACKGROUND_WORKERS,
+            help='Потоков в каждом процессе.')
+        parser.add_argument(
+            '--processes', type=int, default=1,
+            help='Число процессов.')
+        parser.add_argument(
+            '--burst', action='store_true',
+            help='Выйти, когда очередь опустеет.')
+
+    def handle(self, *args, **options):
+        queues = options['queues'].split(',')
+        params = (queues, options['threads'], options['burst'])
+        if options['processes'] == 1:
+            run_threads(*params)
+            return
+        connections.close_all()
+        processes = [
+            multiprocessing.Process(target=run_threads, args=params)
+            for _ in range(options['processes'])
+        ]
+        for process in processes:
+            process.start()
+
+        def stop_processes(*args):
+            for process in processes:
+                process.terminate()
+
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            signal.signal(signum, stop_processes)
+        for process in processes:
+            process.join()
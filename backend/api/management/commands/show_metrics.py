@@ -0,0 +1,21 @@
+from django.conf import settings
+from django.core.management import BaseCommand
+
+from api.metrics import get_hit_rate, get_metrics
+
+
+class Command(BaseCommand):
+    help = 'Вывести накопленные счётчики из общего кэша.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('prefix', nargs='?', default='')
+
+    def handle(self, *args, **options):
+        if not settings.CACHE_IS_SHARED:
+            self.stderr.write('Кэш в памяти процесса: счётчиков воркеров '
+                              'здесь не видно, задайте MEMCACHED_LOCATION.')
+        for name, value in get_metrics(options['prefix']).items():
+            self.stdout.write(f'{name}: {value}')
+        for prefix in ('auth_token', 'recipe_fragment'):
+            self.stdout.write(
+                f'{prefix}.hit_rate: {get_hit_rate(prefix):.2%}')
@@ -0,0 +1,47 @@
+from django.core.cache import cache
+
+METRIC_KEY = 'metrics:{}'
+NAME_COUNT_KEY = 'metric_names:count'
+NAME_KEY = 'metric_names:{}'
+
+
+def register(name):
+    """Запоминает имя счётчика под своим номером: номера раздаёт
+    атомарный incr, поэтому одновременные регистрации не теряются."""
+    cache.add(NAME_COUNT_KEY, 0, timeout=None)
+    cache.set(NAME_KEY.format(cache.incr(NAME_COUNT_KEY)), name,
+              timeout=None)
+
+
+def increment(name, value=1):
+    """Увеличивает счётчик в общем кэше, чтобы его видели все воркеры.
+    Обычно это один incr, имя регистрирует процесс, создавший ключ."""
+    key = METRIC_KEY.format(name)
+    try:
+        return cache.incr(key, value)
+    except ValueError:
+        pass
+    if cache.add(key, value, timeout=None):
+        register(name)
+        return value
+    return cache.incr(key, value)
+
+
+def get_names():
+    count = cache.get(NAME_COUNT_KEY, 0)
+    return set(cache.get_many(
+        [NAME_KEY.format(number) for number in range(1, count + 1)]
+    ).values())
+
+
+def get_metrics(prefix=''):
+    names = sorted(name for name in get_names() if name.startswith(prefix))
+    values = cache.get_many([METRIC_KEY.format(name) for name in names])
+    return {name: values.get(METRIC_KEY.format(name), 0) for name in names}
+
+
+def get_hit_rate(prefix):
+    hits = cache.get(METRIC_KEY.format(f'{prefix}.hits'), 0)
+    misses = cache.get(METRIC_KEY.format(f'{prefix}.misses'), 0)
+    total = hits + misses
+    return hits / total if total else 0.0
@@ -0,0 +1,279 @@
+import hashlib
+import json
+import os
+import time
+from collections import defaultdict
+from types import SimpleNamespace
+
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.core.exceptions import ValidationError
+from django.db import connection, transaction
+from django.utils.datastructures import MultiValueDict
+
+from recipes.models import Ingredient, Recipe, RecipeIngredient, RecipeTag, Tag
+from users.models import User
+from .compression import invalidate_payload
+from .filters import RecipeFilter
+from .nutrition import update_nutrition
+from .similarity import invalidate_index
+from .trigrams import invalidate_ingredient_index
+from .utils import chunked, invalidate_tag_facets
+
+EXPORT_COLUMNS = ('id', 'author__email', 'name', 'image', 'text',
+                  'cooking_time', 'servings')
+RECIPE_FIELDS = tuple(
+    (Recipe, name) for name in ('name', 'text', 'cooking_time', 'servings'))
+INGREDIENT_FIELDS = ((Ingredient, 'name'), (Ingredient, 'measurement_unit'),
+                     (RecipeIngredient, 'amount'))
+WRITE_EXPORT_KEY = 'write_export:{0}'
+
+
+def export_recipes(queryset, chunk_size=1000):
+    """Строки NDJSON с рецептами. Рецепты читаются серверным курсором,
+    тэги и ингредиенты догружаются пачкой на каждый кусок."""
+    rows = queryset.order_by('id').values(*EXPORT_COLUMNS).iterator(
+        chunk_size=chunk_size)
+    for chunk in chunked(rows, chunk_size):
+        recipe_ids = [row['id'] for row in chunk]
+        tags = defaultdict(list)
+        for recipe_id, slug in RecipeTag.objects.filter(
+                recipe_id__in=recipe_ids, tag__isnull=False).values_list(
+                'recipe_id', 'tag__slug'):
+            tags[recipe_id].append(slug)
+        ingredients = defaultdict(list)
+        for item in RecipeIngredient.objects.filter(
+                recipe_id__in=recipe_ids, ingredient__isnull=False).values(
+                'recipe_id', 'ingredient__name',
+                'ingredient__measurement_unit', 'amount').order_by('id'):
+            ingredients[item['recipe_id']].append({
+                'name': item['ingredient__name'],
+                'measurement_unit': item['ingredient__measurement_unit'],
+                'amount': item['amount'],
+            })
+        for row in chunk:
+            yield json.dumps({
+                'id': row['id'],
+                'author': row['author__email'],
+                'name': row['name'],
+                'image': row['image'] or None,
+                'text': row['text'],
+                'cooking_time': row['cooking_time'],
+                'servings': row['servings'],
+                'tags': tags[row['id']],
+                'ingredients': ingredients[row['id']],
+            }, ensure_ascii=False) + '\n'
+
+
+def get_export_name(params, user_id):
+    """Имя файла выгрузки: одинаковые фильтры одного юзера дают один
+    файл, is_favorited и is_in_shopping_cart зависят от юзера."""
+    key = json.dumps([user_id, sorted(params.items())])
+    return hashlib.sha1(key.encode()).hexdigest() + '.ndjson'
+
+
+def get_export_path(name):
+    return os.path.join(settings.EXPORT_ROOT, name)
+
+
+def is_export_ready(name):
+    try:
+        modified = os.path.getmtime(get_export_path(name))
+    except OSError:
+        return False
+    return time.time() - modified < settings.EXPORT_MAX_AGE
+
+
+def remove_stale_exports():
+    """Удаляет устаревшие выгрузки и недописанные файлы упавших
+    воркеров."""
+    now = time.time()
+    for entry in os.scandir(settings.EXPORT_ROOT):
+        max_age = (settings.JOB_TIMEOUT if entry.name.endswith('.tmp')
+                   else settings.EXPORT_MAX_AGE)
+        try:
+            if now - entry.stat().st_mtime >= max_age:
+                os.remove(entry.path)
+        except FileNotFoundError:
+            pass
+
+
+def write_export(name, params, user_id):
+    """Задача очереди: выгрузка с фильтрами списка рецептов во временный
+    файл, который затем атомарно переименовывается - отдаётся только
+    готовый файл."""
+    os.makedirs(settings.EXPORT_ROOT, exist_ok=True)
+    remove_stale_exports()
+    user = User.objects.filter(pk=user_id).first() or AnonymousUser()
+    queryset = RecipeFilter(MultiValueDict(params),
+                            queryset=Recipe.objects.all(),
+                            request=SimpleNamespace(user=user)).qs
+    path = get_export_path(name)
+    temp_path = f'{path}.{os.getpid()}.tmp'
+    with open(temp_path, 'w', encoding='utf8') as out_f:
+        out_f.writelines(export_recipes(queryset,
+                                        settings.EXPORT_CHUNK_SIZE))
+    os.replace(temp_path, path)
+
+
+def clean_fields(model_fields, values, errors, prefix=''):
+    """Значения, проверенные полями моделей и их валидаторами, как при
+    full_clean, но без запросов к базе."""
+    cleaned = {}
+    for model, name in model_fields:
+        try:
+            cleaned[name] = model._meta.get_field(name).clean(
+                values.get(name), None)
+        except ValidationError as error:
+            errors[prefix + name] = error.messages
+    return cleaned
+
+
+def is_list_of(value, item_type):
+    return isinstance(value, list) and all(
+        isinstance(item, item_type) for item in value)
+
+
+def clean_record(record):
+    """Проверяет запись NDJSON: bulk_create валидаторы моделей
+    не вызывает. Возвращает очищенную запись, при ошибках бросает
+    ValidationError со словарём полей."""
+    if not isinstance(record, dict):
+        raise ValidationError('Ожидается объект JSON.')
+    errors = {}
+    cleaned = clean_fields(
+        RECIPE_FIELDS, {**record, 'servings': record.get('servings') or 1},
+        errors)
+    for name in ('author', 'image'):
+        cleaned[name] = record.get(name) or None
+        if not isinstance(cleaned[name], (str, type(None))):
+            errors[name] = ['Ожидается строка.']
+    cleaned['tags'] = record.get('tags') or []
+    if not is_list_of(cleaned['tags'], str):
+        errors['tags'] = ['Ожидается список слагов.']
+    ingredients = record.get('ingredients') or []
+    if not is_list_of(ingredients, dict):
+        errors['ingredients'] = ['Ожидается список объектов.']
+        ingredients = []
+    cleaned['ingredients'] = [
+        clean_fields(INGREDIENT_FIELDS, item, errors,
+                     f'ingredients[{number}].')
+        for number, item in enumerate(ingredients)
+    ]
+    if errors:
+        raise ValidationError(errors)
+    return cleaned
+
+
+def format_error(error):
+    if hasattr(error, 'error_dict'):
+        return '; '.join(f'{name}: {" ".join(messages)}'
+                         for name, messages in error.message_dict.items())
+    return ' '.join(error.messages)
+
+
+class RecipeImporter:
+    """Загрузка NDJSON пачками: ссылки на авторов, тэги и ингредиенты
+    разрешаются через словари в памяти, записи - через bulk_create."""
+
+    def __init__(self, batch_size=1000):
+        self.batch_size = batch_size
+        self.tags = dict(Tag.objects.values_list('slug', 'id'))
+        self.ingredients = {
+            (name, unit): ingredient_id
+            for ingredient_id, name, unit in Ingredient.objects.values_list(
+                'id', 'name', 'measurement_unit')
+        }
+        self.authors = {}
+        self.imported = 0
+        self.skipped_tags = 0
+        self.errors = []
+
+    def resolve_authors(self, records):
+        emails = {record['author'] for record in records} - {None}
+        missing = emails - self.authors.keys()
+        self.authors.update(User.objects.filter(
+            email__in=missing).values_list('email', 'id'))
+
+    def resolve_ingredients(self, records):
+        missing = {
+            (item['name'], item['measurement_unit'])
+            for record in records for item in record['ingredients']
+        } - self.ingredients.keys()
+        if not missing:
+            return
+        Ingredient.objects.bulk_create(
+            Ingredient(name=name, measurement_unit=unit)
+            for name, unit in missing)
+        # bulk_create не отправляет сигналов, индекс поиска сбрасывается
+        # здесь.
+        invalidate_ingredient_index()
+        for ingredient_id, name, unit in Ingredient.objects.filter(
+                name__in={name for name, _ in missing}).values_list(
+                'id', 'name', 'measurement_unit'):
+            self.ingredients.setdefault((name, unit), ingredient_id)
+
+    def create_recipes(self, recipes):
+        if connection.features.can_return_rows_from_bulk_insert:
+            return Recipe.objects.bulk_create(recipes)
+        for recipe in recipes:
+            recipe.save()
+        return recipes
+
+    def import_batch(self, records):
+        self.resolve_authors(records)
+        self.resolve_ingredients(records)
+        recipes = self.create_recipes([
+            Recipe(
+                author_id=self.authors.get(record['author']),
+                name=record['name'],
+                image=record['image'],
+                text=record['text'],
+                cooking_time=record['cooking_time'],
+                servings=record['servings'],
+            )
+            for record in records
+        ])
+        recipe_tags, recipe_ingredients = [], []
+        for recipe, record in zip(recipes, records):
+            for slug in record['tags']:
+                if slug in self.tags:
+                    recipe_tags.append(
+                        RecipeTag(recipe=recipe, tag_id=self.tags[slug]))
+                else:
+                    self.skipped_tags += 1
+            for item in record['ingredients']:
+                recipe_ingredients.append(RecipeIngredient(
+                    recipe=recipe,
+                    ingredient_id=self.ingredients[
+                        item['name'], item['measurement_unit']],
+                    amount=item['amount'],
+                ))
+        RecipeTag.objects.bulk_create(recipe_tags)
+        RecipeIngredient.objects.bulk_create(recipe_ingredients)
+        update_nutrition([recipe.id for recipe in recipes])
+        self.imported += len(recipes)
+
+    def parse(self, lines):
+        """Проверенные записи. Строки с ошибками пропускаются и попадают
+        в self.errors с номером строки, чтобы одна плохая запись
+        не обрывала загрузку после уже закоммиченных пачек."""
+        for number, line in enumerate(lines, 1):
+            if not line.strip():
+                continue
+            try:
+                yield clean_record(json.loads(line))
+            except ValueError as error:
+                self.errors.append((number, f'Некорректный JSON: {error}'))
+            except ValidationError as error:
+                self.errors.append((number, format_error(error)))
+
+    def run(self, lines):
+        records = self.parse(lines)
+        for batch in chunked(records, self.batch_size):
+            with transaction.atomic():
+                self.import_batch(batch)
+        invalidate_tag_facets()
+        invalidate_payload('ingredients')
+        invalidate_index()
+        return self.imported
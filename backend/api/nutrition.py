@@ -0,0 +1,77 @@
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+
+from recipes.models import Ingredient, Recipe, RecipeIngredient
+from .utils import chunked, touch_recipes
+
+NUTRIENTS = ('kcal', 'protein', 'fat', 'carbs')
+NUTRITION_KEY = 'nutrition:{}'
+INGREDIENT_NUTRITION_KEY = 'ingredient_nutrition:{}'
+
+
+def load_nutrient_matrix(ingredient_ids):
+    """Матрица ингредиенты x нутриенты в порядке ingredient_ids."""
+    matrix = np.zeros((len(ingredient_ids), len(NUTRIENTS)))
+    rows = np.array(Ingredient.objects.filter(
+        id__in=ingredient_ids.tolist()).values_list('id', *NUTRIENTS),
+        dtype=float).reshape(-1, len(NUTRIENTS) + 1)
+    positions = np.searchsorted(ingredient_ids, rows[:, 0].astype(np.int64))
+    matrix[positions] = rows[:, 1:]
+    return matrix
+
+
+def compute_nutrition(recipe_ids):
+    """Пищевая ценность рецептов как произведение разреженной матрицы
+    количеств (рецепты x ингредиенты, тройки COO из RecipeIngredient)
+    на матрицу ингредиенты x нутриенты. Возвращает {recipe_id: (ккал,
+    белки, жиры, углеводы)}."""
+    recipe_ids = np.unique(np.asarray(recipe_ids, dtype=np.int64))
+    triples = np.array(RecipeIngredient.objects.filter(
+        recipe_id__in=recipe_ids.tolist(), ingredient__isnull=False,
+    ).values_list('recipe_id', 'ingredient_id', 'amount'),
+        dtype=np.int64).reshape(-1, 3)
+    ingredient_ids, columns = np.unique(triples[:, 1], return_inverse=True)
+    matrix = load_nutrient_matrix(ingredient_ids)
+    totals = np.zeros((len(recipe_ids), len(NUTRIENTS)))
+    np.add.at(totals, np.searchsorted(recipe_ids, triples[:, 0]),
+              triples[:, 2, np.newaxis] * matrix[columns])
+    return dict(zip(recipe_ids.tolist(),
+                    map(tuple, np.round(totals, 2).tolist())))
+
+
+def update_nutrition(recipe_ids=None, batch_size=None):
+    """Пересчитывает и сохраняет пищевую ценность рецептов пачками.
+    Записываются и получают новую версию только изменившиеся рецепты.
+    Без recipe_ids пересчитываются все."""
+    batch_size = batch_size or settings.NUTRITION_BATCH_SIZE
+    if recipe_ids is None:
+        recipe_ids = Recipe.objects.order_by('id').values_list(
+            'id', flat=True).iterator(chunk_size=batch_size)
+    updated = 0
+    for chunk in chunked(recipe_ids, batch_size):
+        with transaction.atomic():
+            totals = compute_nutrition(chunk)
+            changed = [
+                Recipe(id=recipe_id, **dict(zip(NUTRIENTS, totals[
+                    recipe_id])))
+                for recipe_id, *current in Recipe.objects.filter(
+                    id__in=chunk).values_list('id', *NUTRIENTS)
+                if tuple(current) != totals[recipe_id]
+            ]
+            Recipe.objects.bulk_update(changed, NUTRIENTS)
+            touch_recipes(Recipe.objects.filter(
+                id__in=[recipe.id for recipe in changed]))
+        updated += len(changed)
+    return updated
+
+
+def update_recipe_nutrition(recipe_id):
+    update_nutrition([recipe_id])
+
+
+def update_ingredient_nutrition(ingredient_id):
+    """Пересчёт рецептов, в которых есть ингредиент."""
+    update_nutrition(list(RecipeIngredient.objects.filter(
+        ingredient_id=ingredient_id).order_by('recipe_id').values_list(
+        'recipe_id', flat=True).distinct()))
@@ -1,6 +1,47 @@
-from rest_framework.pagination import PageNumberPagination
+from django.conf import settings
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
 
 
 class CustomPagination(PageNumberPagination):
     page_size_query_param = 'limit'
     max_page_size = 20
+
+
+class KeysetPagination(BasePagination):
+    """Пагинация по курсору: id последнего рецепта на странице."""
+    cursor_query_param = 'cursor'
+    limit_query_param = 'limit'
+    max_limit = 20
+
+    def get_int_param(self, request, name):
+        try:
+            value = int(request.query_params[name])
+        except (KeyError, ValueError):
+            return None
+        return value if value > 0 else None
+
+    def get_limit(self, request):
+        limit = self.get_int_param(request, self.limit_query_param)
+        if limit is None:
+            return settings.REST_FRAMEWORK['PAGE_SIZE']
+        return min(limit, self.max_limit)
+
+    def paginate_ids(self, request, get_ids):
+        """get_ids(cursor, limit) возвращает id по убыванию."""
+        self.request = request
+        limit = self.get_limit(request)
+        ids = get_ids(self.get_int_param(request, self.cursor_query_param),
+                      limit)
+        self.next_cursor = ids[-1] if len(ids) == limit else None
+        return ids
+
+    def get_next_link(self):
+        if self.next_cursor is None:
+            return None
+        return replace_query_param(self.request.build_absolute_uri(),
+                                   self.cursor_query_param, self.next_cursor)
+
+    def get_paginated_response(self, data):
+        return Response({'next': self.get_next_link(), 'results': data})
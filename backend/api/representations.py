@@ -0,0 +1,266 @@
+import zlib
+from collections import defaultdict
+from functools import lru_cache
+from operator import itemgetter
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import F
+from rest_framework.exceptions import ValidationError
+from rest_framework.serializers import ALL_FIELDS
+
+from recipes.models import (Tag, Recipe, RecipeIngredient, ShoppingCart,
+                            Favorite)
+from users.models import User, Subscription
+from .metrics import increment
+from .nutrition import NUTRIENTS
+from .serializers import (CustomUserSerializer, TagSerializer,
+                          IngredientRecipeSerializer, RecipeSerializerGet,
+                          ShortRecipeSerializer)
+
+USER_COLUMNS = ('email', 'id', 'username', 'first_name', 'last_name')
+
+
+def get_field_names(serializer_class):
+    """Порядок полей в выдаче сериализатора."""
+    fields = serializer_class.Meta.fields
+    if fields == ALL_FIELDS:
+        model = serializer_class.Meta.model
+        return tuple(field.name for field in model._meta.concrete_fields)
+    return tuple(fields)
+
+
+def compile_representation(serializer_class, fields=None, **sources):
+    """Собирает функцию, которая строит словарь той же формы,
+    что и сериализатор, из готовой строки values()."""
+    names = get_field_names(serializer_class)
+    if fields is not None:
+        names = tuple(name for name in names if name in fields)
+    getter = itemgetter(*(sources.get(name, name) for name in names))
+
+    def represent(row):
+        return dict(zip(names, getter(row)))
+
+    return represent
+
+
+represent_tag = compile_representation(TagSerializer)
+represent_user = compile_representation(CustomUserSerializer)
+represent_recipe_ingredient = compile_representation(
+    IngredientRecipeSerializer,
+    id='ingredient_id',
+    name='ingredient__name',
+    measurement_unit='ingredient__measurement_unit',
+)
+RECIPE_FIELDS = get_field_names(RecipeSerializerGet)
+CARD_FIELDS = get_field_names(ShortRecipeSerializer)
+VIEWER_FIELDS = ('is_favorited', 'is_in_shopping_cart')
+FRAGMENT_FIELDS = tuple(name for name in RECIPE_FIELDS
+                        if name not in VIEWER_FIELDS)
+FRAGMENT_COLUMNS = ('id', 'version', 'author_id', 'name', 'image', 'text',
+                    'cooking_time', 'servings') + NUTRIENTS
+RELATED_FIELDS = ('tags', 'author', 'ingredients')
+FRAGMENT_KEY = 'recipe_fragment:{}:{}'
+
+
+@lru_cache(maxsize=None)
+def get_recipe_representation(fields):
+    return compile_representation(RecipeSerializerGet, fields)
+
+
+def split_param(request, name):
+    value = request.query_params.get(name)
+    if not value:
+        return None
+    names = set(value.split(','))
+    unknown = names - set(RECIPE_FIELDS)
+    if unknown:
+        raise ValidationError(
+            {name: f'Неизвестные поля: {", ".join(sorted(unknown))}'})
+    return names
+
+
+def get_recipe_fields(request):
+    """Поля рецепта из параметров fields=, omit= и view=card."""
+    fields = split_param(request, 'fields')
+    if fields is None and request.query_params.get('view') == 'card':
+        fields = set(CARD_FIELDS)
+    omit = split_param(request, 'omit') or set()
+    return tuple(name for name in RECIPE_FIELDS
+                 if (fields is None or name in fields) and name not in omit)
+
+
+def get_recipe_columns(fields):
+    """Колонки строки рецепта. Тэги, ингредиенты и автор берутся
+    из фрагмента; если они не нужны (например, view=card), выбираются
+    только запрошенные колонки самого рецепта, без связанных запросов."""
+    if set(fields) & set(RELATED_FIELDS):
+        return ('id', 'version')
+    return ('id',) + tuple(name for name in fields
+                           if name != 'id' and name in FRAGMENT_COLUMNS)
+
+
+def get_image_url(name, request):
+    if not name:
+        return None
+    url = Recipe._meta.get_field('image').storage.url(name)
+    if request is not None:
+        return request.build_absolute_uri(url)
+    return url
+
+
+def get_viewer_ids(model, field, user, **filters):
+    if user.is_anonymous:
+        return set()
+    return set(model.objects.filter(user=user, **filters).values_list(
+        field, flat=True))
+
+
+def build_fragments(recipe_ids):
+    """Части представлений рецептов, не зависящие от зрителя, - одним
+    запросом на каждую связь. Автор без is_subscribed, картинка - имя
+    файла."""
+    rows = list(Recipe.objects.filter(id__in=recipe_ids).values(
+        *FRAGMENT_COLUMNS))
+    found_ids = [row['id'] for row in rows]
+
+    tags = defaultdict(list)
+    for tag in Tag.objects.filter(tag__recipe_id__in=found_ids).values(
+            *get_field_names(TagSerializer), recipe_id=F('tag__recipe_id')):
+        tags[tag['recipe_id']].append(represent_tag(tag))
+
+    ingredients = defaultdict(list)
+    for ingredient in RecipeIngredient.objects.filter(
+            recipe_id__in=found_ids).values(
+            'recipe_id', 'ingredient_id', 'ingredient__name',
+            'ingredient__measurement_unit', 'amount').order_by('id'):
+        ingredients[ingredient['recipe_id']].append(
+            represent_recipe_ingredient(ingredient))
+
+    authors = dict(
+        (author['id'], author) for author in User.objects.filter(
+            id__in={row['author_id'] for row in rows} - {None}).values(
+            *USER_COLUMNS))
+
+    fragments = {}
+    for row in rows:
+        row['tags'] = tags[row['id']]
+        row['ingredients'] = ingredients[row['id']]
+        row['author'] = authors.get(row.pop('author_id'))
+        fragments[row['id']] = row
+    return fragments
+
+
+def get_fragments(rows):
+    """Фрагменты по id из общего кэша; промахи собираются пачкой.
+    Ключ включает версию рецепта, поэтому старые фрагменты не читаются."""
+    keys = {row['id']: FRAGMENT_KEY.format(row['id'], row['version'])
+            for row in rows}
+    cached = cache.get_many(keys.values()) if keys else {}
+    fragments = {recipe_id: cached[key] for recipe_id, key in keys.items()
+                 if key in cached}
+    missing = keys.keys() - fragments.keys()
+    if fragments:
+        increment('recipe_fragment.hits', len(fragments))
+    if missing:
+        increment('recipe_fragment.misses', len(missing))
+        built = build_fragments(missing)
+        fragments.update(built)
+        cache.set_many({
+            FRAGMENT_KEY.format(recipe_id, fragment['version']): fragment
+            for recipe_id, fragment in built.items()
+        }, settings.RECIPE_FRAGMENT_TIMEOUT)
+    return fragments
+
+
+def get_viewer_flags(recipe, user, fields):
+    """Флаги текущего юзера для одного рецепта - только проверки EXISTS."""
+    if user.is_anonymous:
+        return ()
+    checks = []
+    if 'is_favorited' in fields:
+        checks.append(Favorite.objects.filter(user=user, recipe_id=recipe.id))
+    if 'is_in_shopping_cart' in fields:
+        checks.append(ShoppingCart.objects.filter(user=user,
+                                                  recipe_id=recipe.id))
+    if 'author' in fields and recipe.author_id is not None:
+        checks.append(Subscription.objects.filter(
+            subscriber=user, subscribed_id=recipe.author_id))
+    return tuple(queryset.exists() for queryset in checks)
+
+
+def is_shared_representation(user, fields):
+    """Представление одинаково для всех зрителей."""
+    return user.is_anonymous or not set(fields) & set(
+        VIEWER_FIELDS + ('author',))
+
+
+def get_recipe_etag(recipe, request, fields):
+    """ETag по версии рецепта, набору полей и флагам зрителя - без
+    построения самого представления."""
+    flags = ''.join(str(int(flag)) for flag in get_viewer_flags(
+        recipe, request.user, fields))
+    fields_hash = zlib.crc32(','.join(fields).encode())
+    return f'"{recipe.id}-{recipe.version}-{fields_hash:x}-{flags}"'
+
+
+def represent_recipes(rows, request, fields=RECIPE_FIELDS):
+    """Быстрый путь чтения для RecipeSerializerGet: общие для всех части
+    рецептов берутся из кэша фрагментов, к ним добавляются флаги текущего
+    юзера. Всё, чего нет в fields, не запрашивается."""
+    rows = {row['id']: row for row in rows}
+    recipe_ids = list(rows)
+    user = request.user
+    use_fragments = 'version' in get_recipe_columns(fields)
+    fragments = get_fragments(rows.values()) if use_fragments else {}
+
+    flags = {}
+    if 'is_favorited' in fields:
+        flags['is_favorited'] = get_viewer_ids(
+            Favorite, 'recipe_id', user, recipe_id__in=recipe_ids)
+    if 'is_in_shopping_cart' in fields:
+        flags['is_in_shopping_cart'] = get_viewer_ids(
+            ShoppingCart, 'recipe_id', user, recipe_id__in=recipe_ids)
+
+    subscribed_ids = set()
+    if 'author' in fields and not user.is_anonymous:
+        subscribed_ids = set(Subscription.objects.filter(
+            subscriber=user,
+            subscribed_id__in={
+                fragment['author']['id'] for fragment in fragments.values()
+                if fragment['author'] is not None
+            },
+        ).values_list('subscribed_id', flat=True))
+
+    represent = get_recipe_representation(fields)
+    result = []
+    for recipe_id in recipe_ids:
+        if not use_fragments:
+            row = dict(rows[recipe_id])
+        elif recipe_id in fragments:
+            row = dict(fragments[recipe_id])
+        else:
+            # Рецепт удалён между запросами.
+            continue
+        for name, values in flags.items():
+            row[name] = recipe_id in values
+        if 'author' in fields and row['author'] is not None:
+            author = dict(row['author'])
+            author['is_subscribed'] = author['id'] in subscribed_ids
+            row['author'] = represent_user(author)
+        if 'image' in fields:
+            row['image'] = get_image_url(row['image'], request)
+        result.append(represent(row))
+    return result
+
+
+def represent_recipes_by_ids(recipe_ids, request, fields=RECIPE_FIELDS):
+    """Представления рецептов в порядке переданных id."""
+    positions = {recipe_id: number for number, recipe_id in
+                 enumerate(recipe_ids)}
+    rows = sorted(
+        Recipe.objects.filter(id__in=positions).values(
+            *get_recipe_columns(fields)),
+        key=lambda row: positions[row['id']],
+    )
+    return represent_recipes(rows, request, fields)
@@ -0,0 +1,111 @@
+import random
+import time
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, OperationalError, connections
+from rest_framework.permissions import SAFE_METHODS
+
+PRIMARY_PIN_KEY = 'primary_pin:{}'
+
+_read_alias = ContextVar('read_alias', default=None)
+_unavailable = {}
+_checked = {}
+
+
+def pin_to_primary(user):
+    """После записи юзер какое-то время читает с основной базы,
+    чтобы сразу видеть свои изменения."""
+    cache.set(PRIMARY_PIN_KEY.format(user.pk), True,
+              settings.REPLICA_PIN_SECONDS)
+
+
+def is_pinned_to_primary(user):
+    return cache.get(PRIMARY_PIN_KEY.format(user.pk), False)
+
+
+def mark_unavailable(alias):
+    _unavailable[alias] = time.monotonic() + settings.REPLICA_RETRY_SECONDS
+    _checked.pop(alias, None)
+
+
+def is_available(alias):
+    """Проверка соединения с репликой не чаще раза в
+    REPLICA_CHECK_SECONDS, после отказа реплика пропускается
+    REPLICA_RETRY_SECONDS."""
+    now = time.monotonic()
+    down_until = _unavailable.get(alias)
+    if down_until is not None and down_until > now:
+        return False
+    if _checked.get(alias, 0) > now:
+        return True
+    try:
+        connections[alias].ensure_connection()
+    except OperationalError:
+        mark_unavailable(alias)
+        return False
+    _unavailable.pop(alias, None)
+    _checked[alias] = now + settings.REPLICA_CHECK_SECONDS
+    return True
+
+
+def choose_replica():
+    replicas = list(settings.DATABASE_REPLICAS)
+    random.shuffle(replicas)
+    for alias in replicas:
+        if is_available(alias):
+            return alias
+    return DEFAULT_DB_ALIAS
+
+
+class ReplicaRouter:
+    """Чтение идёт на реплику, если её выбрал вьюсет для текущего запроса,
+    всё остальное - на основную базу."""
+
+    def db_for_read(self, model, **hints):
+        return _read_alias.get()
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == DEFAULT_DB_ALIAS
+
+
+class ReplicaRoutingMixin:
+    """Безопасные запросы читают с реплики, небезопасные
+    закрепляют юзера за основной базой."""
+
+    def dispatch(self, request, *args, **kwargs):
+        token = _read_alias.set(None)
+        try:
+            try:
+                return super().dispatch(request, *args, **kwargs)
+            except OperationalError:
+                alias = _read_alias.get()
+                if alias in (None, DEFAULT_DB_ALIAS):
+                    raise
+                # Реплика отказала посреди запроса: чтение повторяется,
+                # initial выберет другую реплику или основную базу.
+                mark_unavailable(alias)
+                _read_alias.set(None)
+                return super().dispatch(request, *args, **kwargs)
+        finally:
+            _read_alias.reset(token)
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        user = request.user
+        if request.method not in SAFE_METHODS:
+            if user.is_authenticated:
+                pin_to_primary(user)
+            return
+        if not settings.DATABASE_REPLICAS:
+            return
+        if user.is_authenticated and is_pinned_to_primary(user):
+            return
+        _read_alias.set(choose_replica())
@@ -1,15 +1,25 @@
 import base64
+import hashlib
 
+from django.conf import settings
 from django.core.exceptions import ValidationError
 from django.core.files.base import ContentFile
+from django.db import transaction
 from djoser.serializers import UserCreateSerializer
 from rest_framework import serializers
 from rest_framework.relations import StringRelatedField
 
 from recipes.models import (Tag, Ingredient, Recipe, ShoppingCart, Favorite,
-                            RecipeIngredient, RecipeTag)
+                            RecipeIngredient, RecipeTag, ShoppingListItem)
 from users.models import User, Subscription
-from .utils import get_ingredients_dict, get_recipe_ingredients
+from .deletion import raw_delete
+from .nutrition import NUTRIENTS, compute_nutrition, update_nutrition
+from .similarity import mark_recipe_changed
+from .tasks import enqueue
+from .utils import (delete_recipe_image, get_ingredients_dict,
+                    get_recipe_amounts, get_recipe_ingredients,
+                    invalidate_tag_facets, touch_recipes,
+                    update_shopping_lists)
 
 
 class CustomUserSerializer(serializers.ModelSerializer):
@@ -43,8 +53,11 @@ class Base64ImageField(serializers.ImageField):
         if isinstance(data, str) and data.startswith('data:image'):
             format, imgstr = data.split(';base64,')
             ext = format.split('/')[-1]
-
-            data = ContentFile(base64.b64decode(imgstr), name='temp.' + ext)
+            content = base64.b64decode(imgstr)
+            # Имя из хэша содержимого: по одному адресу всегда одна и та же
+            # картинка, nginx отдаёт её с вечным кэшированием.
+            name = hashlib.sha256(content).hexdigest()[:32]
+            data = ContentFile(content, name=f'{name}.{ext}')
 
         return super().to_internal_value(data)
 
@@ -107,7 +120,8 @@ class RecipeSerializerGet(serializers.ModelSerializer):
     class Meta:
         fields = ('id', 'tags', 'author', 'ingredients',
                   'is_favorited', 'is_in_shopping_cart', 'name',
-                  'image', 'text', 'cooking_time',)
+                  'image', 'text', 'cooking_time', 'servings',
+                  ) + NUTRIENTS
         model = Recipe
 
 
@@ -127,7 +141,7 @@ class RecipeSerializer(serializers.ModelSerializer):
         model = Recipe
         fields = ('id', 'name', 'author',
                   'tags', 'ingredients',
-                  'image', 'text', 'cooking_time',
+                  'image', 'text', 'cooking_time', 'servings',
                   )
 
     def create(self, validated_data):
@@ -141,11 +155,15 @@ class RecipeSerializer(serializers.ModelSerializer):
         ingredients_dict = get_ingredients_dict(ingredients)
         recipe_ingredients = get_recipe_ingredients(ingredients_dict, recipe)
         RecipeIngredient.objects.bulk_create(recipe_ingredients)
+        mark_recipe_changed(recipe.id)
 
         recipe_tags = []
         for tag in tags:
             recipe_tags.append(RecipeTag(tag=tag, recipe=recipe))
         RecipeTag.objects.bulk_create(recipe_tags)
+        invalidate_tag_facets()
+        update_nutrition([recipe.id])
+        touch_recipes(Recipe.objects.filter(pk=recipe.pk))
 
         return recipe
 
@@ -170,7 +188,8 @@ class RecipeSerializer(serializers.ModelSerializer):
         self.fields.pop('tags')
         representation = super().to_representation(instance)
         representation['ingredients'] = IngredientRecipeSerializer(
-            RecipeIngredient.objects.filter(recipe=instance), many=True).data
+            RecipeIngredient.objects.filter(recipe=instance).select_related(
+                'ingredient'), many=True).data
         representation['tags'] = TagSerializer(instance.tags, many=True).data
         return representation
 
@@ -181,18 +200,43 @@ class RecipeSerializer(serializers.ModelSerializer):
         instance.text = validated_data.get('text', instance.text)
         instance.cooking_time = validated_data.get('cooking_time',
                                                    instance.cooking_time)
-        if tags_data:
-            instance.tags.clear()
-            for tag in tags_data:
-                instance.tags.add(tag)
-        if ingredients_data:
-            ingredients_dict = get_ingredients_dict(ingredients_data)
-            RecipeIngredient.objects.filter(recipe=instance).delete()
-            recipe_ingredients = get_recipe_ingredients(ingredients_dict,
-                                                        instance)
-            RecipeIngredient.objects.bulk_create(recipe_ingredients)
+        instance.servings = validated_data.get('servings', instance.servings)
+        old_image = instance.image.name
+        instance.image = validated_data.get('image', instance.image)
+        with transaction.atomic():
+            if tags_data:
+                raw_delete(RecipeTag.objects.filter(recipe=instance))
+                RecipeTag.objects.bulk_create(
+                    RecipeTag(tag=tag, recipe=instance) for tag in tags_data)
+                invalidate_tag_facets()
+            if ingredients_data:
+                self.replace_ingredients(
+                    instance, get_ingredients_dict(ingredients_data))
+            # Единственное сохранение: сигналы пересчитывают списки
+            # покупок под новое число порций и поднимают версию один раз.
+            instance.save()
+            if old_image and instance.image.name != old_image:
+                enqueue(delete_recipe_image, old_image, queue='files')
         return instance
 
+    def replace_ingredients(self, instance, ingredients_dict):
+        """Заменяет строки ингредиентов без построчных сигналов: списки
+        покупок получают одну разницу старых и новых количеств,
+        пищевая ценность записывается вместе с рецептом."""
+        amounts = dict(ingredients_dict)
+        for ingredient_id, amount in get_recipe_amounts(instance.id).items():
+            amounts[ingredient_id] = amounts.get(ingredient_id, 0) - amount
+        raw_delete(RecipeIngredient.objects.filter(recipe=instance))
+        RecipeIngredient.objects.bulk_create(
+            get_recipe_ingredients(ingredients_dict, instance))
+        update_shopping_lists(instance.id, {
+            ingredient_id: amount for ingredient_id, amount in amounts.items()
+            if amount})
+        mark_recipe_changed(instance.id)
+        for name, value in zip(NUTRIENTS,
+                               compute_nutrition([instance.id])[instance.id]):
+            setattr(instance, name, value)
+
 
 class ShortRecipeSerializer(serializers.ModelSerializer):
     """Класс сериализатор для показания рецептов при выводе юзеров."""
@@ -203,6 +247,18 @@ class ShortRecipeSerializer(serializers.ModelSerializer):
         fields = ('id', 'name', 'image', 'cooking_time',)
 
 
+class IdsSerializer(serializers.Serializer):
+    """Класс сериализатор списка id для пакетных запросов."""
+    ids = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=settings.BATCH_MAX_SIZE,
+    )
+
+    def validate_ids(self, value):
+        return list(dict.fromkeys(value))
+
+
 class SubscriptionSerializer(serializers.ModelSerializer):
     """Класс сериализатор для подписок."""
     email = StringRelatedField(source='subscribed.email')
@@ -286,29 +342,27 @@ class ShoppingCartSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = ShoppingCart
-        fields = ('id', 'name', 'image', 'cooking_time')
+        fields = ('id', 'name', 'image', 'cooking_time', 'servings')
 
     def validate(self, data):
         """Проверка на повтор."""
         recipe_id = self.context.get('recipe_id')
         user_id = self.context.get('request').user.id
-        if ShoppingCart.objects.filter(
+        if self.instance is None and ShoppingCart.objects.filter(
                 user_id=user_id, recipe_id=recipe_id).exists():
             raise serializers.ValidationError(
                 'Рецепт уже добавлен в список покупок!')
         return data
 
 
-class DownloadShoppingCartSerializer(serializers.ModelSerializer):
-    """Класс сериализатор для скачивания списка покупок."""
-    ingredients = serializers.SerializerMethodField()
-
-    def get_ingredients(self, obj):
-        ingredient_recipe = RecipeIngredient.objects.filter(
-            recipe=obj.recipe.id)
-        result = IngredientRecipeSerializer(ingredient_recipe, many=True).data
-        return result
+class ShoppingListItemSerializer(serializers.ModelSerializer):
+    """Класс сериализатор для просмотра списка покупок."""
+    id = serializers.ReadOnlyField(source='ingredient.id')
+    name = serializers.ReadOnlyField(source='ingredient.name')
+    measurement_unit = serializers.ReadOnlyField(
+        source='ingredient.measurement_unit'
+    )
 
     class Meta:
-        fields = ('ingredients',)
-        model = ShoppingCart
+        model = ShoppingListItem
+        fields = ('id', 'name', 'measurement_unit', 'amount',)
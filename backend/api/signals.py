@@ -0,0 +1,298 @@
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.signals import request_started
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.db.models.signals import (m2m_changed, post_delete, post_save,
+                                      pre_delete, pre_save)
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+
+from recipes.models import (Favorite, FeedItem, Ingredient, Recipe,
+                            RecipeIngredient, RecipeTag, ShoppingCart, Tag,
+                            Tombstone)
+from users.models import Subscription, User
+from .authentication import invalidate_token
+from .compression import invalidate_payload
+from .nutrition import (INGREDIENT_NUTRITION_KEY, NUTRIENTS, NUTRITION_KEY,
+                        update_ingredient_nutrition, update_nutrition,
+                        update_recipe_nutrition)
+from .feed import (BACKFILL_FEED_KEY, FAN_OUT_KEY, backfill_feed,
+                   fan_out_recipe)
+from .representations import USER_COLUMNS
+from .similarity import mark_recipe_changed
+from .tasks import enqueue
+from .trigrams import invalidate_ingredient_index
+from .units import get_scale
+from .utils import (get_recipe_amounts, invalidate_tag_facets, touch_recipes,
+                    update_shopping_lists)
+
+
+@receiver(post_delete, sender=Token)
+def invalidate_deleted_token(sender, instance, **kwargs):
+    invalidate_token(instance.key)
+
+
+@receiver(post_save, sender=User)
+def invalidate_user_tokens(sender, instance, created, **kwargs):
+    if created:
+        return
+    for key in Token.objects.filter(user=instance).values_list(
+            'key', flat=True):
+        invalidate_token(key)
+
+
+@receiver(connection_created)
+def remember_connection_check(sender, connection, **kwargs):
+    connection.health_checked_at = time.monotonic()
+
+
+@receiver(request_started)
+def check_database_connections(**kwargs):
+    """Закрывает постоянные соединения, которые перестали отвечать.
+    Только что открытое соединение не проверяется, переиспользуемое -
+    не чаще раза в DB_CONN_HEALTH_CHECK_INTERVAL секунд: иначе каждый
+    запрос платит лишним SELECT 1."""
+    if not settings.DB_CONN_HEALTH_CHECKS:
+        return
+    now = time.monotonic()
+    for connection in connections.all():
+        if connection.connection is None or (
+                now - getattr(connection, 'health_checked_at', 0)
+                < settings.DB_CONN_HEALTH_CHECK_INTERVAL):
+            continue
+        connection.health_checked_at = now
+        if not connection.is_usable():
+            connection.close()
+
+
+def get_recipe_scale(recipe_id, servings):
+    recipe_servings = Recipe.objects.filter(pk=recipe_id).values_list(
+        'servings', flat=True).first()
+    return get_scale(servings, recipe_servings)
+
+
+@receiver(post_save, sender=ShoppingCart)
+def add_to_shopping_list(sender, instance, created, **kwargs):
+    if created:
+        update_shopping_lists(
+            instance.recipe_id, get_recipe_amounts(instance.recipe_id),
+            scales={instance.user_id: get_recipe_scale(instance.recipe_id,
+                                                       instance.servings)})
+
+
+@receiver(pre_save, sender=ShoppingCart)
+def change_shopping_list_servings(sender, instance, raw=False, **kwargs):
+    if raw or instance._state.adding:
+        return
+    old = ShoppingCart.objects.filter(pk=instance.pk).values_list(
+        'servings', flat=True).first()
+    if old == instance.servings:
+        return
+    scale = (get_recipe_scale(instance.recipe_id, instance.servings)
+             - get_recipe_scale(instance.recipe_id, old))
+    update_shopping_lists(instance.recipe_id,
+                          get_recipe_amounts(instance.recipe_id),
+                          scales={instance.user_id: scale})
+
+
+@receiver(post_delete, sender=ShoppingCart)
+def remove_from_shopping_list(sender, instance, **kwargs):
+    update_shopping_lists(
+        instance.recipe_id, get_recipe_amounts(instance.recipe_id), sign=-1,
+        scales={instance.user_id: get_recipe_scale(instance.recipe_id,
+                                                   instance.servings)})
+
+
+@receiver(pre_save, sender=Recipe)
+def change_recipe_servings(sender, instance, raw=False, **kwargs):
+    """Пересчитывает списки покупок юзеров, которые заказали своё число
+    порций: множитель зависит от числа порций рецепта."""
+    if raw or instance._state.adding:
+        return
+    old = Recipe.objects.filter(pk=instance.pk).values_list(
+        'servings', flat=True).first()
+    if old is None or old == instance.servings:
+        return
+    scales = {
+        user_id: (get_scale(servings, instance.servings)
+                  - get_scale(servings, old))
+        for user_id, servings in ShoppingCart.objects.filter(
+            recipe_id=instance.pk, servings__isnull=False).values_list(
+            'user_id', 'servings')
+    }
+    update_shopping_lists(instance.pk, get_recipe_amounts(instance.pk),
+                          scales=scales)
+
+
+@receiver(pre_save, sender=RecipeIngredient)
+def change_shopping_list_ingredient(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    amounts = defaultdict(int)
+    if not instance._state.adding:
+        old = RecipeIngredient.objects.filter(pk=instance.pk).values(
+            'ingredient_id', 'amount').first()
+        if old is not None:
+            amounts[old['ingredient_id']] -= old['amount']
+    amounts[instance.ingredient_id] += instance.amount
+    update_shopping_lists(instance.recipe_id, amounts)
+
+
+@receiver(pre_delete, sender=RecipeIngredient)
+def delete_shopping_list_ingredient(sender, instance, **kwargs):
+    update_shopping_lists(instance.recipe_id,
+                          {instance.ingredient_id: instance.amount}, sign=-1)
+
+
+@receiver(post_save, sender=Recipe)
+def add_recipe_to_feeds(sender, instance, created, **kwargs):
+    if created and instance.author_id is not None:
+        enqueue(fan_out_recipe, instance.id, instance.author_id,
+                queue='feed', key=FAN_OUT_KEY)
+
+
+@receiver(post_save, sender=Subscription)
+def fill_feed(sender, instance, created, **kwargs):
+    if created:
+        enqueue(backfill_feed, instance.subscriber_id,
+                instance.subscribed_id, queue='feed', key=BACKFILL_FEED_KEY)
+
+
+@receiver(post_delete, sender=Subscription)
+def clear_feed(sender, instance, **kwargs):
+    FeedItem.objects.filter(user_id=instance.subscriber_id,
+                            author_id=instance.subscribed_id).delete()
+
+
+@receiver(post_save, sender=RecipeIngredient)
+@receiver(post_delete, sender=RecipeIngredient)
+def update_similarity_index(sender, instance, **kwargs):
+    mark_recipe_changed(instance.recipe_id)
+
+
+@receiver(post_save, sender=RecipeTag)
+@receiver(post_delete, sender=RecipeTag)
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+@receiver(m2m_changed, sender=Recipe.tags.through)
+def update_tag_facets(sender, **kwargs):
+    invalidate_tag_facets()
+
+
+@receiver(post_delete, sender=Recipe)
+def add_recipe_tombstone(sender, instance, **kwargs):
+    Tombstone.objects.create(kind=Tombstone.RECIPE, object_id=instance.id,
+                             user_id=instance.author_id)
+
+
+@receiver(post_delete, sender=Favorite)
+@receiver(post_delete, sender=ShoppingCart)
+def add_relation_tombstone(sender, instance, **kwargs):
+    kind = (Tombstone.FAVORITE if sender is Favorite
+            else Tombstone.SHOPPING_CART)
+    Tombstone.objects.create(kind=kind, object_id=instance.recipe_id,
+                             user_id=instance.user_id)
+
+
+@receiver(post_delete, sender=Subscription)
+def add_subscription_tombstone(sender, instance, **kwargs):
+    Tombstone.objects.create(kind=Tombstone.SUBSCRIPTION,
+                             object_id=instance.subscribed_id,
+                             user_id=instance.subscriber_id)
+
+
+@receiver(post_save, sender=Recipe)
+def bump_recipe_version(sender, instance, created, raw=False, **kwargs):
+    if not created and not raw:
+        touch_recipes(Recipe.objects.filter(pk=instance.pk))
+
+
+@receiver(post_save, sender=RecipeIngredient)
+@receiver(post_delete, sender=RecipeIngredient)
+@receiver(post_save, sender=RecipeTag)
+@receiver(post_delete, sender=RecipeTag)
+def bump_related_recipe_version(sender, instance, raw=False, **kwargs):
+    if not raw:
+        touch_recipes(Recipe.objects.filter(pk=instance.recipe_id))
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+def bump_tagged_recipe_version(sender, instance, action, reverse, pk_set,
+                               **kwargs):
+    if not action.startswith('post_'):
+        return
+    if not reverse:
+        touch_recipes(Recipe.objects.filter(pk=instance.pk))
+    elif pk_set:
+        touch_recipes(Recipe.objects.filter(pk__in=pk_set))
+
+
+@receiver(post_save, sender=User)
+def bump_author_recipes_version(sender, instance, created,
+                                update_fields=None, **kwargs):
+    if created or (update_fields is not None
+                   and not set(update_fields) & set(USER_COLUMNS)):
+        return
+    touch_recipes(Recipe.objects.filter(author=instance))
+
+
+@receiver(post_save, sender=Ingredient)
+@receiver(pre_delete, sender=Ingredient)
+def bump_ingredient_recipes_version(sender, instance, created=False,
+                                    raw=False, **kwargs):
+    if not created and not raw:
+        touch_recipes(Recipe.objects.filter(
+            recipeingredient__ingredient=instance))
+
+
+@receiver(post_save, sender=Tag)
+@receiver(pre_delete, sender=Tag)
+def bump_tag_recipes_version(sender, instance, created=False, raw=False,
+                             **kwargs):
+    if not created and not raw:
+        touch_recipes(Recipe.objects.filter(recipetag__tag=instance))
+
+
+@receiver(post_save, sender=Ingredient)
+@receiver(post_delete, sender=Ingredient)
+def invalidate_ingredients_payload(sender, **kwargs):
+    invalidate_payload('ingredients')
+    invalidate_ingredient_index()
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+def invalidate_tags_payload(sender, **kwargs):
+    invalidate_payload('tags')
+
+
+@receiver(post_save, sender=RecipeIngredient)
+@receiver(post_delete, sender=RecipeIngredient)
+def recompute_recipe_nutrition(sender, instance, raw=False, **kwargs):
+    if not raw:
+        enqueue(update_recipe_nutrition, instance.recipe_id,
+                queue='nutrition', key=NUTRITION_KEY)
+
+
+@receiver(pre_save, sender=Ingredient)
+def recompute_ingredient_nutrition(sender, instance, raw=False, **kwargs):
+    if raw or instance._state.adding:
+        return
+    old = Ingredient.objects.filter(pk=instance.pk).values_list(
+        *NUTRIENTS).first()
+    if old is not None and old != tuple(
+            getattr(instance, name) for name in NUTRIENTS):
+        enqueue(update_ingredient_nutrition, instance.pk,
+                queue='nutrition', key=INGREDIENT_NUTRITION_KEY)
+
+
+@receiver(pre_delete, sender=Ingredient)
+def recompute_nutrition_without_ingredient(sender, instance, **kwargs):
+    recipe_ids = list(RecipeIngredient.objects.filter(
+        ingredient=instance).values_list('recipe_id', flat=True).distinct())
+    if recipe_ids:
+        # Задача выполнится после коммита, когда ссылки уже обнулены.
+        enqueue(update_nutrition, recipe_ids, queue='nutrition')
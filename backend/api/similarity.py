@@ -0,0 +1,272 @@
+import os
+import threading
+
+import numpy as np
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, transaction
+
+from recipes.models import RecipeIngredient
+
+PRIME = (1 << 31) - 1
+# Пар на кусок при хэшировании: кусок x перестановки x 8 байт, при 128
+# перестановках - 8 МБ.
+CHUNK_SIZE = 8192
+VERSION_KEY = 'similarity:version'
+CHANGE_KEY = 'similarity:change:{}'
+CHANGE_TIMEOUT = 60 * 60 * 24
+DIRTY_LIMIT = 1000
+
+
+def load_pairs(recipe_ids=None):
+    """Пары (рецепт, ингредиент), отсортированные по рецепту."""
+    queryset = RecipeIngredient.objects.filter(ingredient__isnull=False)
+    if recipe_ids is not None:
+        queryset = queryset.filter(recipe_id__in=recipe_ids)
+    pairs = np.array(
+        queryset.order_by('recipe_id').values_list('recipe_id',
+                                                   'ingredient_id'),
+        dtype=np.int64,
+    )
+    return pairs.reshape(-1, 2)
+
+
+class MinHashIndex:
+    """MinHash-сигнатуры наборов ингредиентов и LSH-корзины по полосам,
+    всё хранится в массивах NumPy. Корзина полосы - позиции рецептов,
+    отсортированные по ключу полосы: рецепты с тем же ключом находятся
+    двоичным поиском. Рецепты, изменённые после сортировки (dirty),
+    проверяются отдельно, пока фоновая перестройка не пересортирует
+    корзины."""
+
+    def __init__(self, num_perm, bands):
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows = num_perm // bands
+        rng = np.random.default_rng(0)
+        self.a = rng.integers(1, PRIME, num_perm, dtype=np.uint64)
+        self.b = rng.integers(0, PRIME, num_perm, dtype=np.uint64)
+        self.band_mult = rng.integers(1, 1 << 63, self.rows, dtype=np.uint64)
+        self.lock = threading.Lock()
+        self.version = None
+        self.building = False
+        self.set_arrays(np.empty(0, np.int64),
+                        np.empty((0, num_perm), np.uint32))
+
+    def get_state(self, recipe_ids, signatures):
+        band_keys = self.get_band_keys(signatures)
+        bucket_order = np.argsort(band_keys.T, axis=1, kind='stable')
+        return {
+            'recipe_ids': recipe_ids,
+            'signatures': signatures,
+            'band_keys': band_keys,
+            'alive': np.ones(len(recipe_ids), dtype=bool),
+            'positions': {
+                recipe_id: position
+                for position, recipe_id in enumerate(recipe_ids.tolist())
+            },
+            'bucket_order': bucket_order,
+            'bucket_keys': np.take_along_axis(band_keys.T, bucket_order,
+                                              axis=1),
+            'dirty': set(),
+        }
+
+    def set_arrays(self, recipe_ids, signatures):
+        self.__dict__.update(self.get_state(recipe_ids, signatures))
+
+    def get_signatures(self, pairs):
+        recipe_ids, starts = np.unique(pairs[:, 0], return_index=True)
+        signatures = np.empty((len(recipe_ids), self.num_perm), np.uint32)
+        bounds = np.append(starts, len(pairs))
+        first = 0
+        while first < len(recipe_ids):
+            # Рецепты целиком, не больше CHUNK_SIZE пар (кроме рецепта,
+            # который один больше куска).
+            last = max(first + 1, np.searchsorted(
+                bounds, bounds[first] + CHUNK_SIZE, 'right') - 1)
+            chunk = pairs[bounds[first]:bounds[last], 1].astype(np.uint64)
+            hashes = np.multiply.outer(chunk, self.a)
+            hashes += self.b
+            hashes %= PRIME
+            signatures[first:last] = np.minimum.reduceat(
+                hashes, starts[first:last] - bounds[first], axis=0)
+            first = last
+        return recipe_ids, signatures
+
+    def get_band_keys(self, signatures):
+        shaped = signatures.reshape(
+            len(signatures), self.bands, self.rows).astype(np.uint64)
+        return (shaped * self.band_mult).sum(axis=2)
+
+    def build(self):
+        self.set_arrays(*self.get_signatures(load_pairs()))
+
+    def save(self, path):
+        np.savez(path, recipe_ids=self.recipe_ids,
+                 signatures=self.signatures, version=self.version)
+
+    def load_state(self, path):
+        data = np.load(path)
+        if data['signatures'].shape[1] != self.num_perm:
+            return None
+        state = self.get_state(data['recipe_ids'], data['signatures'])
+        state['version'] = int(data['version'])
+        return state
+
+    def load(self, path):
+        state = self.load_state(path)
+        if state is None:
+            return False
+        self.__dict__.update(state)
+        return True
+
+    def get_updates(self, recipe_ids):
+        """Новые сигнатуры изменённых рецептов {id: сигнатура}, без
+        блокировки: запрос к базе и хэширование."""
+        updated_ids, signatures = self.get_signatures(load_pairs(recipe_ids))
+        return dict(zip(updated_ids.tolist(), signatures))
+
+    def update(self, recipe_ids, updated=None):
+        """Применяет сигнатуры изменённых рецептов."""
+        if updated is None:
+            updated = self.get_updates(recipe_ids)
+        new_ids, new_signatures = [], []
+        for recipe_id in recipe_ids:
+            position = self.positions.get(recipe_id)
+            signature = updated.get(recipe_id)
+            if signature is None:
+                if position is not None:
+                    self.alive[position] = False
+            elif position is None:
+                new_ids.append(recipe_id)
+                new_signatures.append(signature)
+            else:
+                self.signatures[position] = signature
+                self.band_keys[position] = self.get_band_keys(
+                    signature[np.newaxis])[0]
+                self.alive[position] = True
+                self.dirty.add(position)
+        if new_ids:
+            first = len(self.recipe_ids)
+            new_signatures = np.stack(new_signatures)
+            self.recipe_ids = np.append(self.recipe_ids, new_ids)
+            self.signatures = np.concatenate((self.signatures,
+                                              new_signatures))
+            self.band_keys = np.concatenate(
+                (self.band_keys, self.get_band_keys(new_signatures)))
+            self.alive = np.append(self.alive, np.ones(len(new_ids), bool))
+            for position, recipe_id in enumerate(new_ids, first):
+                self.positions[recipe_id] = position
+                self.dirty.add(position)
+
+    def refresh(self, wait=False):
+        """Приводит индекс к версии из кэша. Чтение кэша, файла и базы
+        и хэширование идут без блокировки, под ней только подменяются
+        массивы; если другой поток успел обновить индекс раньше, его
+        результат остаётся. Изменённые рецепты пересчитываются на месте,
+        полная перестройка идёт в фоновом потоке (wait - сразу, для
+        прогрева)."""
+        if self.building:
+            return
+        version = cache.get(VERSION_KEY, 0)
+        if self.version is None:
+            path = settings.SIMILARITY_INDEX_PATH
+            state = self.load_state(path) if os.path.exists(path) else None
+            if state is None:
+                return self.rebuild(version, wait)
+            with self.lock:
+                if self.version is None:
+                    self.__dict__.update(state)
+        current = self.version
+        if version > current:
+            keys = [CHANGE_KEY.format(number)
+                    for number in range(current + 1, version + 1)]
+            changes = cache.get_many(keys)
+            if len(changes) == len(keys):
+                recipe_ids = set(changes.values())
+                updated = self.get_updates(recipe_ids)
+                with self.lock:
+                    if self.version != current:
+                        return
+                    self.update(recipe_ids, updated)
+                    self.version = version
+        if version != self.version or len(self.dirty) > DIRTY_LIMIT:
+            self.rebuild(version, wait)
+
+    def rebuild(self, version, wait=False):
+        if wait:
+            self.build()
+            self.version = version
+            return
+        with self.lock:
+            if self.building:
+                return
+            self.building = True
+        threading.Thread(target=self.build_in_background, args=(version,),
+                         daemon=True).start()
+
+    def build_in_background(self, version):
+        """Массивы строятся без блокировки, запросы тем временем
+        отвечают по прежним; изменения после version применятся при
+        следующем refresh."""
+        try:
+            state = self.get_state(*self.get_signatures(load_pairs()))
+            with self.lock:
+                self.__dict__.update(state)
+                self.version = version
+        finally:
+            self.building = False
+            connection.close()
+
+    def get_candidates(self, position):
+        """Позиции рецептов, совпадающих с рецептом хотя бы в одной
+        полосе."""
+        keys = self.band_keys[position]
+        found = [
+            self.bucket_order[band, np.searchsorted(bucket, key):
+                              np.searchsorted(bucket, key, 'right')]
+            for band, (bucket, key) in enumerate(zip(self.bucket_keys, keys))
+        ]
+        candidates = np.unique(np.concatenate(found))
+        if self.dirty:
+            dirty = np.fromiter(self.dirty, np.int64, len(self.dirty))
+            candidates = np.union1d(
+                np.setdiff1d(candidates, dirty),
+                dirty[(self.band_keys[dirty] == keys).any(axis=1)])
+        candidates = candidates[self.alive[candidates]]
+        return candidates[candidates != position]
+
+    def similar(self, recipe_id, limit):
+        """Рецепты с наибольшей оценкой коэффициента Жаккара."""
+        self.refresh()
+        with self.lock:
+            position = self.positions.get(recipe_id)
+            if position is None or not self.alive[position]:
+                return []
+            candidates = self.get_candidates(position)
+            scores = (self.signatures[candidates]
+                      == self.signatures[position]).mean(axis=1)
+            best = np.argsort(-scores, kind='stable')[:limit]
+            return list(zip(self.recipe_ids[candidates[best]].tolist(),
+                            scores[best].tolist()))
+
+
+index = MinHashIndex(settings.SIMILARITY_NUM_PERM, settings.SIMILARITY_BANDS)
+
+
+def publish_change(recipe_id):
+    cache.add(VERSION_KEY, 0, timeout=None)
+    version = cache.incr(VERSION_KEY)
+    cache.set(CHANGE_KEY.format(version), recipe_id, CHANGE_TIMEOUT)
+
+
+def invalidate_index():
+    """Версия без записи об изменении: воркеры перестроят индекс целиком."""
+    cache.add(VERSION_KEY, 0, timeout=None)
+    cache.incr(VERSION_KEY)
+
+
+def mark_recipe_changed(recipe_id):
+    """После коммита сообщает всем воркерам, что набор ингредиентов
+    рецепта изменился."""
+    transaction.on_commit(lambda: publish_change(recipe_id))
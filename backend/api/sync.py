@@ -0,0 +1,147 @@
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+from rest_framework.exceptions import ValidationError
+
+from recipes.models import Favorite, Recipe, ShoppingCart, Tombstone
+from users.models import Subscription
+from .representations import (get_recipe_columns, get_recipe_fields,
+                              represent_recipes)
+
+
+def encode_moment(moment):
+    return str(int(moment.timestamp() * 1000000))
+
+
+def decode_moment(value):
+    return datetime(1970, 1, 1, tzinfo=dt_timezone.utc) + timedelta(
+        microseconds=int(value))
+
+
+def encode_token(moment, since=None, after=None):
+    """Курсор - время снимка. Посреди постраничной выдачи к нему
+    добавляются начало окна (пусто для полного снимка) и последний
+    отданный id рецепта."""
+    token = encode_moment(moment)
+    if after is None:
+        return token
+    return '_'.join((token, encode_moment(since) if since else '',
+                     str(after)))
+
+
+def decode_token(token):
+    """(since, конец окна, after); конец окна и after заданы только
+    у продолжения постраничной выдачи."""
+    try:
+        if '_' not in token:
+            return decode_moment(token), None, None
+        end, since, after = token.split('_')
+        return (decode_moment(since) if since else None,
+                decode_moment(end), int(after))
+    except (ValueError, OverflowError):
+        raise ValidationError({'since': 'Некорректный курсор.'})
+
+
+def get_deleted_ids(kind, start, user=None):
+    return set(Tombstone.objects.filter(
+        kind=kind, user=user, deleted_at__gt=start).values_list(
+        'object_id', flat=True))
+
+
+def get_deleted_recipe_ids(data, user, start):
+    """Удалённые рецепты, которые могли быть у юзера: свои, авторов
+    из подписок (и отменённых в окне) и из избранного или корзины -
+    удаление рецепта оставляет и записи об удалении этих связей.
+    Записи без автора (рецепты без автора и записи, сделанные до учёта
+    авторов) отдаются всем."""
+    subscriptions = Subscription.objects.filter(
+        subscriber=user).values('subscribed_id')
+    return set(Tombstone.objects.filter(
+        Q(user=user)
+        | Q(user__isnull=True)
+        | Q(user__in=subscriptions)
+        | Q(user__in=data['subscriptions']['deleted'])
+        | Q(object_id__in=data['favorites']['deleted'])
+        | Q(object_id__in=data['shopping_cart']['deleted']),
+        kind=Tombstone.RECIPE, deleted_at__gt=start,
+    ).values_list('object_id', flat=True))
+
+
+def get_changes(queryset, field, start):
+    """id изменённых и удалённых связей юзера с начала окна."""
+    if start is not None:
+        queryset = queryset.filter(updated_at__gt=start)
+    return set(queryset.filter(**{f'{field}__isnull': False}).values_list(
+        field, flat=True))
+
+
+def get_sync_data(request, token=None):
+    """Изменения для юзера с момента в курсоре: связи целиком, рецепты -
+    в представлении RecipeSerializerGet, по SYNC_PAGE_SIZE за запрос.
+    Без курсора или со слишком старым курсором отдаётся полный снимок.
+    Пока more, клиент запрашивает следующую страницу с курсором next:
+    конец окна у всех страниц один, изменения после него придут
+    в следующей синхронизации. Связи и удаления повторяются на каждой
+    странице, применять их можно повторно."""
+    user = request.user
+    since, end, after = (decode_token(token) if token
+                         else (None, None, None))
+    now = end or timezone.now()
+    full = since is None or since < now - timedelta(
+        days=settings.SYNC_TOMBSTONE_DAYS)
+    # Окно с запасом: транзакции, закоммиченные после прошлого чтения,
+    # могли записать более раннее время изменения.
+    start = None if full else since - timedelta(
+        seconds=settings.SYNC_OVERLAP_SECONDS)
+
+    relations = {
+        'favorites': (Favorite.objects.filter(user=user), 'recipe_id',
+                      Tombstone.FAVORITE),
+        'shopping_cart': (ShoppingCart.objects.filter(user=user),
+                          'recipe_id', Tombstone.SHOPPING_CART),
+        'subscriptions': (Subscription.objects.filter(subscriber=user),
+                          'subscribed_id', Tombstone.SUBSCRIPTION),
+    }
+    data = {'next': encode_token(now), 'full': full, 'more': False}
+    for name, (queryset, field, kind) in relations.items():
+        updated = get_changes(queryset, field, start)
+        deleted = set() if full else get_deleted_ids(kind, start, user)
+        data[name] = {'updated': sorted(updated),
+                      'deleted': sorted(deleted - updated)}
+
+    recipes = Recipe.objects.filter(
+        Q(author=user)
+        | Q(author__in=Subscription.objects.filter(
+            subscriber=user).values('subscribed_id'))
+        | Q(id__in=Favorite.objects.filter(user=user).values('recipe_id'))
+        | Q(id__in=ShoppingCart.objects.filter(user=user).values(
+            'recipe_id'))
+    )
+    if not full:
+        recipes = recipes.filter(
+            Q(updated_at__gt=start)
+            | Q(id__in=data['favorites']['updated'])
+            | Q(id__in=data['shopping_cart']['updated'])
+            | Q(author__in=data['subscriptions']['updated'])
+        )
+    if after is not None:
+        recipes = recipes.filter(id__gt=after)
+    fields = get_recipe_fields(request)
+    rows = list(recipes.order_by('id').values(
+        *get_recipe_columns(fields))[:settings.SYNC_PAGE_SIZE + 1])
+    if len(rows) > settings.SYNC_PAGE_SIZE:
+        rows = rows[:settings.SYNC_PAGE_SIZE]
+        data['next'] = encode_token(now, since, rows[-1]['id'])
+        data['more'] = True
+    updated = represent_recipes(rows, request, fields)
+    deleted = (set() if full
+               else get_deleted_recipe_ids(data, user, start))
+    data['recipes'] = {'updated': updated, 'deleted': sorted(deleted)}
+    return data
+
+
+def prune_tombstones():
+    return Tombstone.objects.filter(deleted_at__lt=timezone.now() - timedelta(
+        days=settings.SYNC_TOMBSTONE_DAYS)).delete()[0]
@@ -0,0 +1,122 @@
+import logging
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import (DatabaseError, IntegrityError, connection,
+                       transaction)
+from django.db.models import F
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .metrics import increment
+from .models import Job
+
+logger = logging.getLogger(__name__)
+
+
+def get_task_path(func):
+    return f'{func.__module__}.{func.__qualname__}'
+
+
+def enqueue_many(func, args_list, queue='default', key=None, delay=0):
+    """Ставит задачи в очередь в текущей транзакции: воркеры увидят их
+    только после коммита. key - шаблон ключа по аргументам, пока такая
+    задача ждёт в очереди, повторы отбрасываются."""
+    run_at = timezone.now() + timedelta(seconds=delay)
+    Job.objects.bulk_create(
+        [Job(queue=queue, task=get_task_path(func), args=list(args),
+             key=key.format(*args) if key is not None else None,
+             run_at=run_at)
+         for args in args_list],
+        ignore_conflicts=True,
+    )
+
+
+def enqueue(func, *args, queue='default', key=None, delay=0):
+    enqueue_many(func, [args], queue=queue, key=key, delay=delay)
+
+
+def claim_job(queues):
+    """Берёт одну готовую задачу, параллельные воркеры пропускают
+    заблокированные строки (SELECT ... FOR UPDATE SKIP LOCKED)."""
+    now = timezone.now()
+    with transaction.atomic():
+        job = Job.objects.select_for_update(skip_locked=True).filter(
+            queue__in=queues, status=Job.PENDING, run_at__lte=now,
+        ).order_by('run_at', 'id').first()
+        if job is None:
+            return None
+        Job.objects.filter(pk=job.pk).update(
+            status=Job.RUNNING, locked_at=now, attempts=F('attempts') + 1)
+    job.attempts += 1
+    return job
+
+
+def retry_job(job, error):
+    if job.attempts >= settings.JOB_MAX_ATTEMPTS:
+        Job.objects.filter(pk=job.pk).update(status=Job.FAILED,
+                                             last_error=error)
+        increment(f'jobs.{job.queue}.failed')
+        return
+    delay = settings.JOB_RETRY_DELAY * 2 ** (job.attempts - 1)
+    try:
+        with transaction.atomic():
+            Job.objects.filter(pk=job.pk).update(
+                status=Job.PENDING, last_error=error,
+                run_at=timezone.now() + timedelta(seconds=delay))
+    except IntegrityError:
+        # Такая же задача уже ждёт в очереди и сделает ту же работу.
+        Job.objects.filter(pk=job.pk).delete()
+    increment(f'jobs.{job.queue}.retried')
+
+
+def run_job(job):
+    started = time.monotonic()
+    try:
+        import_string(job.task)(*job.args)
+    except Exception as error:
+        logger.exception('Задача %s завершилась с ошибкой', job)
+        retry_job(job, repr(error))
+    else:
+        Job.objects.filter(pk=job.pk).delete()
+        increment(f'jobs.{job.queue}.done')
+    increment(f'jobs.{job.queue}.ms',
+              int((time.monotonic() - started) * 1000))
+
+
+def release_stale_jobs(queues):
+    """Возвращает в очередь задачи упавших воркеров."""
+    stale = Job.objects.filter(
+        queue__in=queues,
+        status=Job.RUNNING,
+        locked_at__lt=timezone.now() - timedelta(
+            seconds=settings.JOB_TIMEOUT),
+    )
+    stale.filter(key__in=Job.objects.filter(
+        status=Job.PENDING, key__isnull=False).values('key')).delete()
+    try:
+        with transaction.atomic():
+            stale.update(status=Job.PENDING)
+    except IntegrityError:
+        pass
+
+
+def work(queues, stop, burst=False):
+    """Цикл одного потока воркера."""
+    try:
+        while not stop.is_set():
+            try:
+                job = claim_job(queues)
+                if job is not None:
+                    run_job(job)
+                    continue
+                if burst:
+                    return
+                release_stale_jobs(queues)
+            except DatabaseError:
+                logger.exception('Ошибка базы в воркере очереди')
+                connection.close()
+            stop.wait(settings.JOB_POLL_INTERVAL)
+    finally:
+        connection.close()
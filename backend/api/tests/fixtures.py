@@ -0,0 +1,47 @@
+import time
+
+from django.core.cache import cache
+
+from recipes.models import Ingredient, Recipe, RecipeIngredient, RecipeTag
+from users.models import User
+
+
+class SlowCache:
+    """Кэш с задержкой сети: без атомарных операций гонки проявляются
+    сразу."""
+
+    def __getattr__(self, name):
+        method = getattr(cache, name)
+
+        def call(*args, **kwargs):
+            time.sleep(0.002)
+            return method(*args, **kwargs)
+
+        return call
+
+
+def create_user(username):
+    return User.objects.create_user(
+        username=username, email=f'{username}@example.com', password='pass',
+        first_name=username, last_name=username)
+
+
+def create_ingredients(count, unit='г'):
+    return [
+        Ingredient.objects.create(name=f'ингредиент {number}',
+                                  measurement_unit=unit)
+        for number in range(count)
+    ]
+
+
+def create_recipe(author, name, amounts=None, tags=(), **fields):
+    """Рецепт с ингредиентами {ingredient: amount} и тэгами."""
+    fields.setdefault('cooking_time', 10)
+    recipe = Recipe.objects.create(author=author, name=name, text=name,
+                                   **fields)
+    RecipeIngredient.objects.bulk_create(
+        RecipeIngredient(recipe=recipe, ingredient=ingredient, amount=amount)
+        for ingredient, amount in (amounts or {}).items())
+    RecipeTag.objects.bulk_create(
+        RecipeTag(recipe=recipe, tag=tag) for tag in tags)
+    return recipe
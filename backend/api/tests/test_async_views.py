@@ -0,0 +1,62 @@
+from asgiref.sync import async_to_sync
+from django.core.cache import cache
+from django.test import TransactionTestCase
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from recipes.models import Favorite, Tag
+from ..async_views import async_view
+from ..views import IngredientViewSet, RecipeViewSet, TagViewSet
+from .fixtures import create_ingredients, create_recipe, create_user
+
+
+class AsyncViewTest(TransactionTestCase):
+    """Асинхронные маршруты отдают те же байты, что и синхронные;
+    чтения идут в другом потоке, поэтому данные должны быть закоммичены."""
+
+    def setUp(self):
+        cache.clear()
+        self.user = create_user('user')
+        self.tag = Tag.objects.create(name='Завтрак', color='#E26C2D',
+                                      slug='breakfast')
+        self.ingredient = create_ingredients(1)[0]
+        self.recipe = create_recipe(self.user, 'Каша',
+                                    {self.ingredient: 100}, [self.tag])
+        Favorite.objects.create(user=self.user, recipe=self.recipe)
+        self.factory = APIRequestFactory()
+
+    def get(self, view, path, **kwargs):
+        request = self.factory.get(path)
+        force_authenticate(request, user=self.user)
+        response = view(request, **kwargs)
+        if hasattr(response, 'render'):
+            response.render()
+        return response
+
+    def assertSamePayload(self, viewset, actions, path, **kwargs):
+        sync = self.get(viewset.as_view(actions), path, **kwargs)
+        cache.clear()
+        asynchronous = self.get(
+            async_to_sync(async_view(viewset, actions)), path, **kwargs)
+        self.assertEqual(asynchronous.status_code, sync.status_code)
+        self.assertEqual(asynchronous.content, sync.content)
+
+    def test_recipes(self):
+        self.assertSamePayload(RecipeViewSet, {'get': 'list'},
+                               '/api/recipes/?is_favorited=1')
+        self.assertSamePayload(RecipeViewSet, {'get': 'retrieve'},
+                               f'/api/recipes/{self.recipe.id}/',
+                               pk=self.recipe.id)
+
+    def test_ingredients_and_tags(self):
+        self.assertSamePayload(IngredientViewSet, {'get': 'list'},
+                               '/api/ingredients/?name=ингр')
+        self.assertSamePayload(IngredientViewSet, {'get': 'retrieve'},
+                               f'/api/ingredients/{self.ingredient.id}/',
+                               pk=self.ingredient.id)
+        self.assertSamePayload(TagViewSet, {'get': 'list'}, '/api/tags/')
+        self.assertSamePayload(TagViewSet, {'get': 'retrieve'},
+                               f'/api/tags/{self.tag.id}/', pk=self.tag.id)
+
+    def test_missing_object(self):
+        self.assertSamePayload(RecipeViewSet, {'get': 'retrieve'},
+                               '/api/recipes/0/', pk=0)
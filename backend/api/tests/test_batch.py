@@ -0,0 +1,89 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+
+from recipes.models import (Favorite, RecipeScore, ShoppingCart,
+                            ShoppingListItem, Tombstone)
+from users.models import Subscription
+from .fixtures import create_ingredients, create_recipe, create_user
+
+
+class BatchEndpointsTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = create_user('author')
+        cls.user = create_user('user')
+        salt, sugar = create_ingredients(2)
+        cls.recipes = [
+            create_recipe(cls.author, f'Рецепт {number}',
+                          {salt: 10, sugar: number + 1})
+            for number in range(3)
+        ]
+        cls.ids = [recipe.id for recipe in cls.recipes]
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def get_scores(self):
+        return dict(RecipeScore.objects.values_list('recipe_id', 'score'))
+
+    def get_shopping_list(self):
+        return dict(ShoppingListItem.objects.filter(
+            user=self.user).values_list('ingredient__name', 'amount'))
+
+    def test_repeated_add_counts_once(self):
+        for _ in range(2):
+            response = self.client.post('/api/recipes/shopping_cart/',
+                                        {'ids': self.ids}, format='json')
+            self.assertEqual(response.status_code, 201)
+        self.assertEqual(ShoppingCart.objects.filter(user=self.user).count(),
+                         3)
+        self.assertEqual(self.get_shopping_list(),
+                         {'ингредиент 0': 30, 'ингредиент 1': 6})
+        self.assertEqual(self.get_scores(), dict.fromkeys(
+            self.ids, settings.TRENDING_CART_WEIGHT))
+
+    def test_remove(self):
+        self.client.post('/api/recipes/shopping_cart/', {'ids': self.ids},
+                         format='json')
+        self.client.post('/api/recipes/favorite/', {'ids': self.ids},
+                         format='json')
+        response = self.client.delete('/api/recipes/shopping_cart/',
+                                      {'ids': self.ids[:2]}, format='json')
+        self.assertEqual(response.status_code, 204)
+        self.assertEqual(self.get_shopping_list(),
+                         {'ингредиент 0': 10, 'ингредиент 1': 3})
+        self.client.delete('/api/recipes/favorite/', {'ids': self.ids},
+                           format='json')
+        self.assertFalse(Favorite.objects.filter(user=self.user).exists())
+        self.assertEqual(self.get_scores(), {
+            self.ids[0]: 0, self.ids[1]: 0,
+            self.ids[2]: settings.TRENDING_CART_WEIGHT,
+        })
+        self.assertEqual(
+            Tombstone.objects.filter(user_id=self.user.id).count(), 5)
+
+    def test_repeated_subscribe(self):
+        for expected in ([self.author.id], []):
+            response = self.client.post('/api/users/subscribe/',
+                                        {'ids': [self.author.id]},
+                                        format='json')
+            self.assertEqual(response.json(), {'ids': expected})
+        self.assertEqual(Subscription.objects.count(), 1)
+
+    def test_lookup_by_ids_is_not_paginated(self):
+        ids = ','.join(map(str, self.ids))
+        response = self.client.get(f'/api/recipes/?ids={ids}&limit=1')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(sorted(item['id'] for item in response.json()),
+                         self.ids)
+
+    @override_settings(BATCH_MAX_SIZE=2)
+    def test_lookup_by_ids_is_capped(self):
+        ids = ','.join(map(str, self.ids))
+        response = self.client.get(f'/api/recipes/?ids={ids}')
+        self.assertEqual(response.status_code, 400)
@@ -0,0 +1,85 @@
+from unittest import mock
+
+from django.core.signals import request_started
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, override_settings
+from psycopg2 import OperationalError
+from psycopg2.extensions import (TRANSACTION_STATUS_IDLE,
+                                 TRANSACTION_STATUS_INERROR)
+
+from backend.postgresql_pool.base import ConnectionPool
+
+
+class FakeConnection:
+    def __init__(self):
+        self.closed = False
+        self.status = TRANSACTION_STATUS_IDLE
+        self.rollback_fails = False
+
+    def get_transaction_status(self):
+        return self.status
+
+    def rollback(self):
+        if self.rollback_fails:
+            raise OperationalError('server closed the connection')
+        self.status = TRANSACTION_STATUS_IDLE
+
+    def close(self):
+        self.closed = True
+
+
+class ConnectionPoolTest(SimpleTestCase):
+    """Пул из одного соединения: любая утечка слота видна сразу
+    по таймауту следующего acquire."""
+
+    def setUp(self):
+        self.pool = ConnectionPool(size=1, timeout=0.05)
+
+    def test_failed_transaction_is_rolled_back_and_reused(self):
+        first = self.pool.acquire(FakeConnection)
+        first.status = TRANSACTION_STATUS_INERROR
+        self.pool.release(first)
+        self.assertEqual(first.status, TRANSACTION_STATUS_IDLE)
+        self.assertIs(self.pool.acquire(FakeConnection), first)
+
+    def test_broken_connection_is_dropped(self):
+        first = self.pool.acquire(FakeConnection)
+        first.status = TRANSACTION_STATUS_INERROR
+        first.rollback_fails = True
+        self.pool.release(first)
+        self.assertTrue(first.closed)
+        self.assertIsNot(self.pool.acquire(FakeConnection), first)
+
+    def test_failed_connect_frees_the_slot(self):
+        def connect():
+            raise OperationalError('could not connect')
+
+        with self.assertRaises(OperationalError):
+            self.pool.acquire(connect)
+        self.assertIsInstance(self.pool.acquire(FakeConnection),
+                              FakeConnection)
+
+    def test_exhausted_pool_times_out(self):
+        self.pool.acquire(FakeConnection)
+        with self.assertRaises(OperationalError):
+            self.pool.acquire(FakeConnection)
+
+
+class HealthCheckTest(TestCase):
+
+    def test_checks_reused_connection_once_per_interval(self):
+        connection.ensure_connection()
+        with mock.patch.object(connection, 'is_usable',
+                               return_value=True) as is_usable:
+            connection.health_checked_at = 0
+            for _ in range(3):
+                request_started.send(sender=None)
+        is_usable.assert_called_once()
+
+    @override_settings(DB_CONN_HEALTH_CHECK_INTERVAL=60)
+    def test_skips_fresh_connection(self):
+        connection.close()
+        connection.ensure_connection()
+        with mock.patch.object(connection, 'is_usable') as is_usable:
+            request_started.send(sender=None)
+        is_usable.assert_not_called()
@@ -0,0 +1,76 @@
+import json
+import tempfile
+import threading
+
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+
+from recipes.models import Favorite
+from ..models import Job
+from ..ndjson import write_export
+from ..tasks import get_task_path, work
+from .fixtures import create_recipe, create_user
+
+
+class ExportTest(TestCase):
+    """Выгрузку пишет воркер очереди, запрос к API не держит воркер
+    gunicorn."""
+
+    def setUp(self):
+        cache.clear()
+        self.export_root = tempfile.TemporaryDirectory()
+        self.addCleanup(self.export_root.cleanup)
+        settings_override = override_settings(
+            EXPORT_ROOT=self.export_root.name, EXPORT_ACCEL_REDIRECT='')
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.admin = create_user('admin')
+        self.admin.is_staff = True
+        self.admin.save()
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+        self.soup = create_recipe(self.admin, 'Суп')
+        create_recipe(self.admin, 'Каша')
+        Favorite.objects.create(user=self.admin, recipe=self.soup)
+
+    def export_jobs(self):
+        return Job.objects.filter(task=get_task_path(write_export))
+
+    def run_jobs(self):
+        work(['default'], threading.Event(), burst=True)
+
+    def test_export_is_written_in_background(self):
+        url = '/api/recipes/export/?is_favorited=1'
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 202)
+        self.assertIn('Retry-After', response)
+        self.client.get(url)
+        self.assertEqual(self.export_jobs().count(), 1)
+
+        self.run_jobs()
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        lines = b''.join(response.streaming_content).splitlines()
+        self.assertEqual([json.loads(line)['name'] for line in lines],
+                         ['Суп'])
+
+    def test_accel_redirect(self):
+        url = '/api/recipes/export/'
+        self.client.get(url)
+        self.run_jobs()
+        with override_settings(EXPORT_ACCEL_REDIRECT='/exports/'):
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertRegex(response['X-Accel-Redirect'],
+                         r'^/exports/[0-9a-f]{40}\.ndjson$')
+
+    def test_invalid_filter(self):
+        response = self.client.get('/api/recipes/export/?tags=missing')
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(self.export_jobs().exists())
+
+    def test_admin_only(self):
+        self.client.force_authenticate(create_user('user'))
+        response = self.client.get('/api/recipes/export/')
+        self.assertEqual(response.status_code, 403)
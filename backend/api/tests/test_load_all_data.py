@@ -0,0 +1,37 @@
+import os
+import tempfile
+
+from django.core.management import call_command
+from django.test import TestCase
+
+from recipes.models import Ingredient, Tag
+
+
+class LoadAllDataTest(TestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        os.mkdir(os.path.join(directory.name, 'data'))
+        files = {
+            'ingredients.csv': ('мука,г,364,10.3,1.1,70\n'
+                                'соль,г\n'
+                                'сахар,г,399,,,99.8\n'
+                                'масло,г,748, \n'),
+            'tags.csv': 'Завтрак,#ffff00,breakfast\n',
+        }
+        for name, content in files.items():
+            with open(os.path.join(directory.name, 'data', name), 'w',
+                      encoding='utf8') as out_f:
+                out_f.write(content)
+        self.addCleanup(os.chdir, os.getcwd())
+        os.chdir(directory.name)
+
+    def test_blank_and_missing_nutrients_are_zero(self):
+        call_command('load_all_data')
+        self.assertEqual(
+            list(Ingredient.objects.order_by('id').values_list(
+                'name', 'kcal', 'protein', 'fat', 'carbs')),
+            [('мука', 364, 10.3, 1.1, 70), ('соль', 0, 0, 0, 0),
+             ('сахар', 399, 0, 0, 99.8), ('масло', 748, 0, 0, 0)])
+        self.assertTrue(Tag.objects.filter(slug='breakfast').exists())
@@ -0,0 +1,46 @@
+import threading
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import SimpleTestCase
+
+from ..metrics import get_metrics, increment
+from .fixtures import SlowCache
+
+
+class MetricsTest(SimpleTestCase):
+
+    def setUp(self):
+        cache.clear()
+
+    def test_increment(self):
+        self.assertEqual(increment('jobs.done'), 1)
+        self.assertEqual(increment('jobs.done', 5), 6)
+        increment('jobs.failed')
+        self.assertEqual(get_metrics('jobs.'),
+                         {'jobs.done': 6, 'jobs.failed': 1})
+
+    def test_existing_counter_costs_one_incr(self):
+        increment('jobs.done')
+        with mock.patch('api.metrics.cache') as mocked:
+            mocked.incr.return_value = 2
+            increment('jobs.done')
+        self.assertEqual(mocked.method_calls,
+                         [mock.call.incr('metrics:jobs.done', 1)])
+
+    def test_parallel_registration_keeps_all_names(self):
+        names = [f'test.{number}' for number in range(10)]
+        barrier = threading.Barrier(len(names) * 2)
+
+        def hit(name):
+            barrier.wait()
+            increment(name)
+
+        threads = [threading.Thread(target=hit, args=(name,))
+                   for name in names * 2]
+        with mock.patch('api.metrics.cache', SlowCache()):
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        self.assertEqual(get_metrics('test.'), dict.fromkeys(names, 2))
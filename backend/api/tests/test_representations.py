@@ -0,0 +1,116 @@
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.test import TestCase
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.test import APIClient, APIRequestFactory
+
+from recipes.models import (Favorite, Ingredient, Recipe, RecipeIngredient,
+                            RecipeTag, ShoppingCart, Tag)
+from users.models import Subscription, User
+from ..representations import (CARD_FIELDS, RECIPE_FIELDS,
+                               get_recipe_columns, represent_recipes)
+from ..serializers import RecipeSerializerGet
+
+
+class RecipeRepresentationContractTest(TestCase):
+    """Быстрый путь чтения отдаёт те же байты, что и RecipeSerializerGet."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(
+            username='author', email='author@example.com', password='pass',
+            first_name='Автор', last_name='Рецептов')
+        cls.viewer = User.objects.create_user(
+            username='viewer', email='viewer@example.com', password='pass',
+            first_name='Читатель', last_name='Рецептов')
+        Subscription.objects.create(subscriber=cls.viewer,
+                                    subscribed=cls.author)
+        breakfast = Tag.objects.create(name='Завтрак', color='#E26C2D',
+                                       slug='breakfast')
+        dinner = Tag.objects.create(name='Ужин', color='#49B64E',
+                                    slug='dinner')
+        flour = Ingredient.objects.create(
+            name='мука', measurement_unit='г', kcal=3.64, protein=0.1)
+        egg = Ingredient.objects.create(name='яйцо', measurement_unit='шт')
+        milk = Ingredient.objects.create(name='молоко', measurement_unit='мл')
+        pancakes = Recipe.objects.create(
+            author=cls.author, name='Блины', text='Смешать и пожарить.',
+            cooking_time=30, servings=4, image='images/pancakes.png')
+        omelette = Recipe.objects.create(
+            author=cls.author, name='Омлет', text='Взбить и запечь.',
+            cooking_time=15)
+        Recipe.objects.create(author=None, name='Без автора', text=None,
+                              cooking_time=1)
+        RecipeTag.objects.bulk_create([
+            RecipeTag(recipe=pancakes, tag=breakfast),
+            RecipeTag(recipe=pancakes, tag=dinner),
+            RecipeTag(recipe=omelette, tag=breakfast),
+        ])
+        RecipeIngredient.objects.bulk_create([
+            RecipeIngredient(recipe=pancakes, ingredient=flour, amount=200),
+            RecipeIngredient(recipe=pancakes, ingredient=egg, amount=2),
+            RecipeIngredient(recipe=pancakes, ingredient=milk, amount=500),
+            RecipeIngredient(recipe=omelette, ingredient=egg, amount=3),
+        ])
+        Favorite.objects.create(user=cls.viewer, recipe=pancakes)
+        ShoppingCart.objects.create(user=cls.viewer, recipe=omelette)
+
+    def setUp(self):
+        cache.clear()
+
+    def get_request(self, user):
+        request = Request(APIRequestFactory().get('/api/recipes/'))
+        request.user = user
+        return request
+
+    def assert_same_bytes(self, request, fields=RECIPE_FIELDS):
+        recipes = Recipe.objects.all()
+        expected = [
+            {name: value for name, value in item.items() if name in fields}
+            for item in RecipeSerializerGet(
+                recipes, many=True, context={'request': request}).data
+        ]
+        rows = recipes.values(*get_recipe_columns(fields))
+        renderer = JSONRenderer()
+        self.assertEqual(
+            renderer.render(represent_recipes(rows, request, fields)),
+            renderer.render(expected))
+
+    def test_anonymous(self):
+        self.assert_same_bytes(self.get_request(AnonymousUser()))
+
+    def test_viewer_flags(self):
+        self.assert_same_bytes(self.get_request(self.viewer))
+
+    def test_cached_fragments(self):
+        request = self.get_request(self.viewer)
+        self.assert_same_bytes(request)
+        self.assert_same_bytes(request)
+
+    def test_changed_recipe(self):
+        request = self.get_request(self.viewer)
+        self.assert_same_bytes(request)
+        recipe = Recipe.objects.get(name='Омлет')
+        recipe.name = 'Омлет с молоком'
+        recipe.save()
+        RecipeIngredient.objects.create(
+            recipe=recipe, ingredient=Ingredient.objects.get(name='молоко'),
+            amount=50)
+        self.assert_same_bytes(request)
+
+    def test_fields(self):
+        request = self.get_request(self.viewer)
+        for fields in (CARD_FIELDS, ('id', 'author', 'is_favorited'),
+                       ('name', 'kcal')):
+            with self.subTest(fields=fields):
+                self.assert_same_bytes(request, fields)
+
+    def test_detail_endpoint(self):
+        client = APIClient()
+        client.force_authenticate(self.viewer)
+        recipe = Recipe.objects.get(name='Блины')
+        response = client.get(f'/api/recipes/{recipe.id}/')
+        expected = RecipeSerializerGet(
+            recipe, context={'request': self.get_request(self.viewer)}).data
+        self.assertEqual(response.content, JSONRenderer().render(expected))
@@ -0,0 +1,89 @@
+from unittest import mock
+
+from django.core.cache import cache
+from django.db import OperationalError, connections
+from django.test import TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from .. import routing
+from .fixtures import create_recipe, create_user
+
+REPLICA = 'replica_test'
+BROKEN_REPLICA = 'replica_broken'
+
+
+class ReplicaRoutingTest(TransactionTestCase):
+    """Реплика - второе соединение с той же тестовой базой, недоступная
+    реплика - SQLite-файл в несуществующем каталоге."""
+    databases = {'default'}
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        default = connections['default'].settings_dict
+        connections.databases[REPLICA] = dict(default)
+        connections.databases[BROKEN_REPLICA] = dict(
+            default, NAME='/nonexistent/replica.sqlite3')
+
+    @classmethod
+    def tearDownClass(cls):
+        for alias in (REPLICA, BROKEN_REPLICA):
+            connections[alias].close()
+            del connections.databases[alias]
+        super().tearDownClass()
+
+    def setUp(self):
+        cache.clear()
+        routing._unavailable.clear()
+        routing._checked.clear()
+        self.user = create_user('user')
+        self.recipe = create_recipe(create_user('author'), 'Рецепт')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def count_queries(self, alias, method, path, **kwargs):
+        with CaptureQueriesContext(connections[alias]) as queries:
+            response = getattr(self.client, method)(path, **kwargs)
+        self.assertLess(response.status_code, 300, response.content)
+        return len(queries)
+
+    @override_settings(DATABASE_REPLICAS=[REPLICA])
+    def test_reads_go_to_replica(self):
+        self.assertGreater(
+            self.count_queries(REPLICA, 'get', '/api/recipes/'), 0)
+
+    @override_settings(DATABASE_REPLICAS=[REPLICA])
+    def test_write_pins_reads_to_primary(self):
+        self.count_queries('default', 'post', '/api/recipes/favorite/',
+                           data={'ids': [self.recipe.id]}, format='json')
+        self.assertEqual(
+            self.count_queries(REPLICA, 'get', '/api/recipes/'), 0)
+        with override_settings(REPLICA_PIN_SECONDS=0):
+            cache.clear()
+            self.assertGreater(
+                self.count_queries(REPLICA, 'get', '/api/recipes/'), 0)
+
+    @override_settings(DATABASE_REPLICAS=[BROKEN_REPLICA])
+    def test_unavailable_replica_falls_back_to_primary(self):
+        self.assertGreater(
+            self.count_queries('default', 'get', '/api/recipes/'), 0)
+        self.assertIn(BROKEN_REPLICA, routing._unavailable)
+
+    @override_settings(DATABASE_REPLICAS=[REPLICA])
+    def test_replica_failing_mid_query_retries_on_primary(self):
+        with mock.patch.object(
+                connections[REPLICA], 'create_cursor',
+                side_effect=OperationalError('replica went away')):
+            response = self.client.get(f'/api/recipes/{self.recipe.id}/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['name'], 'Рецепт')
+        self.assertIn(REPLICA, routing._unavailable)
+
+    @override_settings(DATABASE_REPLICAS=[REPLICA])
+    def test_health_check_is_cached(self):
+        with mock.patch.object(connections[REPLICA],
+                               'ensure_connection') as ensure_connection:
+            for _ in range(3):
+                self.assertTrue(routing.is_available(REPLICA))
+        ensure_connection.assert_called_once()
@@ -0,0 +1,98 @@
+from collections import defaultdict
+
+from django.core.cache import cache
+from django.test import TestCase
+from rest_framework.test import APIClient
+
+from recipes.models import (Ingredient, RecipeIngredient, ShoppingCart,
+                            ShoppingListItem, Tag)
+from ..trigrams import merge_ingredients
+from .fixtures import create_recipe, create_user
+
+
+class ShoppingListTest(TestCase):
+    """Сохранённый список покупок совпадает с пересчётом по корзине."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = create_user('author')
+        cls.user = create_user('user')
+        cls.tag = Tag.objects.create(name='Обед', color='#49B64E',
+                                     slug='lunch')
+        cls.flour = Ingredient.objects.create(name='мука',
+                                              measurement_unit='г')
+        cls.milk = Ingredient.objects.create(name='молоко',
+                                             measurement_unit='мл')
+        cls.salt = Ingredient.objects.create(name='соль',
+                                             measurement_unit='г')
+        cls.pancakes = create_recipe(
+            cls.author, 'Блины', {cls.flour: 200, cls.milk: 300},
+            servings=2)
+        cls.bread = create_recipe(
+            cls.author, 'Хлеб', {cls.flour: 100, cls.salt: 5})
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def assert_list_matches_cart(self):
+        expected = defaultdict(float)
+        for cart in ShoppingCart.objects.filter(
+                user=self.user).select_related('recipe'):
+            scale = (cart.servings or cart.recipe.servings) / (
+                cart.recipe.servings)
+            for row in RecipeIngredient.objects.filter(recipe=cart.recipe):
+                expected[row.ingredient_id] += row.amount * scale
+        self.assertEqual(
+            dict(ShoppingListItem.objects.filter(user=self.user).values_list(
+                'ingredient_id', 'amount')),
+            {key: value for key, value in expected.items() if value})
+
+    def test_follows_cart_and_recipe_changes(self):
+        self.client.post(f'/api/recipes/{self.pancakes.id}/shopping_cart/',
+                         {'servings': 4}, format='json')
+        self.assert_list_matches_cart()
+        self.client.post(f'/api/recipes/{self.bread.id}/shopping_cart/')
+        self.assert_list_matches_cart()
+        self.client.patch(f'/api/recipes/{self.pancakes.id}/shopping_cart/',
+                          {'servings': 3}, format='json')
+        self.assert_list_matches_cart()
+
+        author = APIClient()
+        author.force_authenticate(self.author)
+        response = author.patch(f'/api/recipes/{self.bread.id}/', {
+            'tags': [self.tag.id],
+            'ingredients': [{'id': self.flour.id, 'amount': 50},
+                            {'id': self.milk.id, 'amount': 20}],
+            'name': 'Хлеб на молоке', 'text': 'Хлеб', 'cooking_time': 5,
+        }, format='json')
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assert_list_matches_cart()
+
+        self.client.delete(f'/api/recipes/{self.pancakes.id}/shopping_cart/')
+        self.assert_list_matches_cart()
+        author.delete(f'/api/recipes/{self.bread.id}/')
+        self.assertFalse(
+            ShoppingListItem.objects.filter(user=self.user).exists())
+
+    def test_download(self):
+        self.client.post('/api/recipes/shopping_cart/',
+                         {'ids': [self.pancakes.id, self.bread.id]},
+                         format='json')
+        response = self.client.get('/api/recipes/download_shopping_cart/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            sorted(response.content.decode().splitlines()),
+            ['молоко(мл)-300', 'мука(г)-300', 'соль(г)-5'])
+
+    def test_merge_keeps_totals(self):
+        typo = Ingredient.objects.create(name='мукa', measurement_unit='г')
+        pie = create_recipe(self.author, 'Пирог', {typo: 70})
+        self.client.post('/api/recipes/shopping_cart/',
+                         {'ids': [self.bread.id, pie.id]}, format='json')
+        merge_ingredients(self.flour.id, [typo.id])
+        self.assertEqual(
+            ShoppingListItem.objects.get(user=self.user,
+                                         ingredient=self.flour).amount, 170)
+        self.assert_list_matches_cart()
@@ -0,0 +1,62 @@
+import os
+import tempfile
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+
+from recipes.models import RecipeIngredient
+from .. import similarity
+from .fixtures import create_ingredients, create_recipe, create_user
+
+
+class SimilarityIndexTest(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        settings_override = override_settings(
+            SIMILARITY_INDEX_PATH=os.path.join(directory.name, 'index.npz'))
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        author = create_user('author')
+        ingredients = create_ingredients(12)
+        self.soup = create_recipe(author, 'Суп', dict.fromkeys(
+            ingredients[:6], 1))
+        self.borscht = create_recipe(author, 'Борщ', dict.fromkeys(
+            ingredients[:5], 1))
+        self.cake = create_recipe(author, 'Торт', dict.fromkeys(
+            ingredients[6:], 1))
+        self.ingredients = ingredients
+        self.index = similarity.MinHashIndex(128, 32)
+        self.index.refresh(wait=True)
+
+    def get_similar_ids(self, recipe):
+        return [recipe_id for recipe_id, _ in
+                self.index.similar(recipe.id, 10)]
+
+    def test_similar(self):
+        self.assertEqual(self.get_similar_ids(self.soup),
+                         [self.borscht.id])
+        self.assertEqual(self.get_similar_ids(self.cake), [])
+
+    def test_refresh_reads_database_outside_lock(self):
+        RecipeIngredient.objects.filter(recipe=self.cake).delete()
+        RecipeIngredient.objects.bulk_create(
+            RecipeIngredient(recipe=self.cake, ingredient=ingredient,
+                             amount=1)
+            for ingredient in self.ingredients[:6])
+        similarity.publish_change(self.cake.id)
+        load_pairs = similarity.load_pairs
+        locked = []
+
+        def checked_load_pairs(*args, **kwargs):
+            locked.append(self.index.lock.locked())
+            return load_pairs(*args, **kwargs)
+
+        with mock.patch.object(similarity, 'load_pairs', checked_load_pairs):
+            similar_ids = self.get_similar_ids(self.soup)
+        self.assertEqual(locked, [False])
+        self.assertEqual(set(similar_ids), {self.borscht.id, self.cake.id})
+        self.assertFalse(self.index.building)
@@ -0,0 +1,93 @@
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+
+from recipes.models import Favorite
+from users.models import Subscription
+from ..deletion import delete_recipes
+from .fixtures import create_recipe, create_user
+
+
+@override_settings(SYNC_PAGE_SIZE=2, SYNC_OVERLAP_SECONDS=0)
+class SyncTest(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.user = create_user('user')
+        self.author = create_user('author')
+        self.stranger = create_user('stranger')
+        Subscription.objects.create(subscriber=self.user,
+                                    subscribed=self.author)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def sync(self, since=None):
+        url = '/api/sync/?view=card'
+        if since is not None:
+            url += f'&since={since}'
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def sync_all(self, since=None):
+        """Все страницы одной синхронизации: id рецептов по страницам
+        и последний ответ."""
+        pages = []
+        while True:
+            data = self.sync(since)
+            pages.append([recipe['id'] for recipe in data['recipes'][
+                'updated']])
+            since = data['next']
+            if not data['more']:
+                return pages, data
+
+    def test_full_snapshot_is_paged(self):
+        ids = [create_recipe(self.user, f'Свой {number}').id
+               for number in range(3)]
+        ids += [create_recipe(self.author, f'Автора {number}').id
+                for number in range(2)]
+        create_recipe(self.stranger, 'Чужой')
+        pages, last = self.sync_all()
+        self.assertEqual(pages, [ids[:2], ids[2:4], ids[4:]])
+        self.assertTrue(last['full'])
+        self.assertNotIn('_', last['next'])
+
+        pages, last = self.sync_all(last['next'])
+        self.assertEqual(pages, [[]])
+        self.assertFalse(last['full'])
+
+    def test_page_keeps_window(self):
+        first = create_recipe(self.user, 'Первый')
+        create_recipe(self.user, 'Второй')
+        create_recipe(self.user, 'Третий')
+        page = self.sync()
+        self.assertTrue(page['more'])
+        # Изменение уже отданного рецепта приходит следующей
+        # синхронизацией, а не теряется между страницами.
+        first.save()
+        last = self.sync(page['next'])
+        self.assertFalse(last['more'])
+        pages, _ = self.sync_all(last['next'])
+        self.assertIn(first.id, sum(pages, []))
+
+    def test_deleted_recipes_are_scoped_to_user(self):
+        own = create_recipe(self.user, 'Свой')
+        followed = create_recipe(self.author, 'Автора')
+        favorite = create_recipe(self.stranger, 'В избранном')
+        unrelated = create_recipe(self.stranger, 'Чужой')
+        signal_deleted = create_recipe(self.author, 'Удалён сигналом')
+        Favorite.objects.create(user=self.user, recipe=favorite)
+        expected = sorted([own.id, followed.id, favorite.id,
+                           signal_deleted.id])
+        _, snapshot = self.sync_all()
+
+        delete_recipes([own.id, followed.id, favorite.id, unrelated.id])
+        signal_deleted.delete()
+        _, delta = self.sync_all(snapshot['next'])
+        self.assertEqual(delta['recipes']['deleted'], expected)
+        self.assertEqual(delta['favorites']['deleted'], [favorite.id])
+
+    def test_invalid_cursor(self):
+        for since in ('abc', '1_x_2', '1_2'):
+            response = self.client.get(f'/api/sync/?since={since}')
+            self.assertEqual(response.status_code, 400)
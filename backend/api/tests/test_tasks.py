@@ -0,0 +1,88 @@
+import threading
+from datetime import timedelta
+
+from django.core.cache import cache
+from django.db import transaction
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from ..metrics import get_metrics
+from ..models import Job
+from ..tasks import enqueue, release_stale_jobs, work
+
+calls = []
+
+
+def record(value):
+    calls.append(value)
+
+
+def fail(value):
+    raise RuntimeError(value)
+
+
+@override_settings(JOB_MAX_ATTEMPTS=2, JOB_RETRY_DELAY=60)
+class JobQueueTest(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        calls.clear()
+
+    def run_jobs(self):
+        work(['test'], threading.Event(), burst=True)
+
+    def test_job_runs_and_is_deleted(self):
+        enqueue(record, 1, queue='test')
+        self.run_jobs()
+        self.assertEqual(calls, [1])
+        self.assertFalse(Job.objects.exists())
+        self.assertEqual(get_metrics('jobs.test.done'),
+                         {'jobs.test.done': 1})
+
+    def test_pending_duplicates_are_dropped(self):
+        for value in (1, 1, 2):
+            enqueue(record, value, queue='test', key='record:{0}')
+        self.assertEqual(Job.objects.count(), 2)
+        self.run_jobs()
+        self.assertEqual(sorted(calls), [1, 2])
+
+    def test_delayed_job_waits(self):
+        enqueue(record, 1, queue='test', delay=60)
+        self.run_jobs()
+        self.assertEqual(calls, [])
+
+    def test_rolled_back_job_is_not_queued(self):
+        with self.assertRaises(RuntimeError):
+            with transaction.atomic():
+                enqueue(record, 1, queue='test')
+                raise RuntimeError
+        self.assertFalse(Job.objects.exists())
+
+    def test_failed_job_is_retried_then_kept(self):
+        enqueue(fail, 'ошибка', queue='test')
+        with self.assertLogs('api.tasks', 'ERROR'):
+            self.run_jobs()
+        job = Job.objects.get()
+        self.assertEqual((job.status, job.attempts), (Job.PENDING, 1))
+        self.assertIn('ошибка', job.last_error)
+        self.assertGreater(job.run_at, timezone.now())
+
+        Job.objects.update(run_at=timezone.now())
+        with self.assertLogs('api.tasks', 'ERROR'):
+            self.run_jobs()
+        job = Job.objects.get()
+        self.assertEqual((job.status, job.attempts), (Job.FAILED, 2))
+        metrics = get_metrics('jobs.test.')
+        self.assertEqual(metrics['jobs.test.retried'], 1)
+        self.assertEqual(metrics['jobs.test.failed'], 1)
+
+    @override_settings(JOB_TIMEOUT=60)
+    def test_stale_job_is_released(self):
+        enqueue(record, 1, queue='test')
+        Job.objects.update(status=Job.RUNNING, attempts=1,
+                           locked_at=timezone.now() - timedelta(minutes=5))
+        self.run_jobs()
+        self.assertEqual(calls, [])
+        release_stale_jobs(['test'])
+        self.run_jobs()
+        self.assertEqual(calls, [1])
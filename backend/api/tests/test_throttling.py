@@ -0,0 +1,76 @@
+import threading
+
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.test import SimpleTestCase
+from rest_framework.test import APIRequestFactory
+
+from ..throttling import BUCKET_LOCK_KEY, TokenBucketThrottle
+from .fixtures import SlowCache
+
+PROXY_ADDR = '172.18.0.5'
+
+
+class TestThrottle(TokenBucketThrottle):
+    THROTTLE_RATES = {'test': '3/min'}
+
+    def get_scope(self, request, view):
+        return 'test'
+
+
+class TokenBucketThrottleTest(SimpleTestCase):
+
+    def setUp(self):
+        cache.clear()
+
+    def get_request(self, client_addr):
+        """Запрос, прошедший через nginx: адрес клиента только
+        в X-Forwarded-For."""
+        request = APIRequestFactory().get(
+            '/api/recipes/', REMOTE_ADDR=PROXY_ADDR,
+            HTTP_X_FORWARDED_FOR=client_addr)
+        request.user = AnonymousUser()
+        return request
+
+    def allow(self, request, throttle_class=TestThrottle):
+        return throttle_class().allow_request(request, None)
+
+    def test_clients_behind_proxy_get_own_buckets(self):
+        first = self.get_request('203.0.113.1')
+        self.assertEqual([self.allow(first) for _ in range(4)],
+                         [True, True, True, False])
+        self.assertTrue(self.allow(self.get_request('203.0.113.2')))
+
+    def test_client_cannot_pick_forwarded_address(self):
+        for number in range(3):
+            self.assertTrue(self.allow(self.get_request(
+                f'10.0.0.{number}, 203.0.113.1')))
+        self.assertFalse(self.allow(self.get_request(
+            '10.0.0.99, 203.0.113.1')))
+
+    def test_parallel_requests_take_separate_tokens(self):
+        class SlowThrottle(TestThrottle):
+            cache = SlowCache()
+
+        request = self.get_request('203.0.113.1')
+        barrier = threading.Barrier(10)
+        allowed = []
+
+        def hit():
+            barrier.wait()
+            allowed.append(self.allow(request, SlowThrottle))
+
+        threads = [threading.Thread(target=hit) for _ in range(10)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(sum(allowed), 3)
+
+    def test_busy_lock_does_not_reject(self):
+        request = self.get_request('203.0.113.1')
+        throttle = TestThrottle()
+        throttle.scope = 'test'
+        cache.add(BUCKET_LOCK_KEY.format(throttle.get_cache_key(
+            request, None)), 1, 60)
+        self.assertTrue(throttle.allow_request(request, None))
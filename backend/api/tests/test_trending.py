@@ -0,0 +1,72 @@
+import importlib
+from datetime import timedelta
+
+from django.apps import apps
+from django.conf import settings
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from recipes.models import Favorite, RecipeScore, ScoreDecay, ShoppingCart
+from ..trending import decay_scores
+from .fixtures import create_recipe, create_user
+
+backfill = importlib.import_module(
+    'recipes.migrations.0013_backfill_recipe_scores')
+
+
+@override_settings(TRENDING_HALF_LIFE_HOURS=1, TRENDING_FAVORITE_WEIGHT=2,
+                   TRENDING_CART_WEIGHT=1)
+class TrendingTest(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.user = create_user('user')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.soup = create_recipe(self.user, 'Суп')
+        self.porridge = create_recipe(self.user, 'Каша')
+
+    def get_trending(self):
+        cache.clear()
+        response = self.client.get('/api/recipes/trending/?view=card')
+        self.assertEqual(response.status_code, 200)
+        return [recipe['id'] for recipe in response.json()]
+
+    def get_score(self, recipe):
+        return RecipeScore.objects.get(recipe=recipe).score
+
+    def test_favorite_and_cart_add_and_remove_score(self):
+        self.client.post(f'/api/recipes/{self.porridge.id}/shopping_cart/')
+        self.client.post(f'/api/recipes/{self.soup.id}/favorite/')
+        self.assertEqual(self.get_trending(),
+                         [self.soup.id, self.porridge.id])
+        self.assertAlmostEqual(self.get_score(self.soup), 2)
+
+        self.client.delete(f'/api/recipes/{self.soup.id}/favorite/')
+        self.assertAlmostEqual(self.get_score(self.soup), 0)
+        self.assertEqual(self.get_trending()[0], self.porridge.id)
+
+    def test_decay(self):
+        self.client.post(f'/api/recipes/{self.soup.id}/favorite/')
+        ScoreDecay.objects.update_or_create(pk=1, defaults={
+            'decayed_at': timezone.now() - timedelta(
+                hours=settings.TRENDING_HALF_LIFE_HOURS)})
+        decay_scores()
+        self.assertAlmostEqual(self.get_score(self.soup), 1, places=3)
+
+    def test_migration_backfills_existing_relations(self):
+        favorite = Favorite.objects.create(user=self.user, recipe=self.soup)
+        ShoppingCart.objects.create(user=self.user, recipe=self.porridge)
+        Favorite.objects.filter(pk=favorite.pk).update(
+            created=timezone.now() - timedelta(
+                hours=settings.TRENDING_HALF_LIFE_HOURS))
+        RecipeScore.objects.all().delete()
+        self.assertEqual(self.get_trending(), [])
+
+        backfill.backfill_recipe_scores(apps, None)
+        self.assertAlmostEqual(self.get_score(self.soup), 1, places=3)
+        self.assertAlmostEqual(self.get_score(self.porridge), 1, places=3)
+        self.assertEqual(set(self.get_trending()),
+                         {self.soup.id, self.porridge.id})
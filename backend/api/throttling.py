@@ -0,0 +1,142 @@
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework import status
+from rest_framework.exceptions import APIException
+from rest_framework.throttling import SimpleRateThrottle
+
+from .metrics import increment
+
+SLOT_KEY = 'concurrency:{}'
+BUCKET_LOCK_KEY = '{}:lock'
+BUCKET_LOCK_TIMEOUT = 1
+BUCKET_LOCK_ATTEMPTS = 20
+BUCKET_LOCK_WAIT = 0.005
+
+
+class TokenBucketThrottle(SimpleRateThrottle):
+    """Ведро токенов в общем кэше: ёмкость - число запросов из ставки,
+    за период ставки ведро наполняется целиком. В отличие от окна
+    с историей запросов, хранит два числа и допускает короткие
+    всплески. Юзеры различаются по id, анонимы - по IP клиента
+    из X-Forwarded-For, который выставляет nginx (NUM_PROXIES). Чтение
+    и запись ведра идут под блокировкой через атомарный cache.add,
+    иначе параллельные запросы одного юзера тратят один токен."""
+    cache = cache
+
+    def get_scope(self, request, view):
+        raise NotImplementedError
+
+    def get_rate(self):
+        return self.THROTTLE_RATES.get(self.scope)
+
+    def get_cache_key(self, request, view):
+        if request.user.is_authenticated:
+            ident = request.user.pk
+        else:
+            ident = self.get_ident(request)
+        return self.cache_format % {'scope': self.scope, 'ident': ident}
+
+    def allow_request(self, request, view):
+        self.scope = self.get_scope(request, view)
+        self.rate = self.get_rate()
+        if self.rate is None:
+            return True
+        self.num_requests, self.duration = self.parse_rate(self.rate)
+        self.key = self.get_cache_key(request, view)
+        lock = BUCKET_LOCK_KEY.format(self.key)
+        if not self.acquire(lock):
+            # Ведро долго занято (или ключ остался от упавшего воркера):
+            # лимит не повод отказывать, токен берётся без блокировки.
+            increment(f'throttle.{self.scope}.lock_timeouts')
+            return self.take_token()
+        try:
+            return self.take_token()
+        finally:
+            self.cache.delete(lock)
+
+    def acquire(self, lock):
+        """Блокировка ведра; ключ упавшего воркера истекает через
+        BUCKET_LOCK_TIMEOUT секунд."""
+        for _ in range(BUCKET_LOCK_ATTEMPTS):
+            if self.cache.add(lock, 1, BUCKET_LOCK_TIMEOUT):
+                return True
+            time.sleep(BUCKET_LOCK_WAIT)
+        return False
+
+    def take_token(self):
+        self.now = self.timer()
+        tokens, updated = self.cache.get(self.key, (self.num_requests,
+                                                    self.now))
+        self.tokens = min(self.num_requests, tokens + (
+            self.now - updated) * self.num_requests / self.duration)
+        if self.tokens < 1:
+            increment(f'throttle.{self.scope}.rejected')
+            return False
+        self.cache.set(self.key, (self.tokens - 1, self.now), self.duration)
+        return True
+
+    def wait(self):
+        return (1 - self.tokens) * self.duration / self.num_requests
+
+
+class UserTokenBucketThrottle(TokenBucketThrottle):
+    """Общий лимит на все запросы API: ставки user и anon."""
+
+    def get_scope(self, request, view):
+        return 'user' if request.user.is_authenticated else 'anon'
+
+
+class ScopedTokenBucketThrottle(TokenBucketThrottle):
+    """Отдельный лимит юзера на дорогой эндпоинт: ставка по
+    throttle_scope вьюхи."""
+
+    def get_scope(self, request, view):
+        return getattr(view, 'throttle_scope', None)
+
+
+class Overloaded(APIException):
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = 'Сервер перегружен, повторите запрос позже.'
+    default_code = 'overloaded'
+
+    def __init__(self, wait):
+        super().__init__()
+        self.wait = wait
+
+
+def acquire_slot():
+    """Занимает один из CONCURRENCY_LIMIT слотов в общем кэше. cache.add
+    атомарен, слот упавшего воркера освобождается по таймауту."""
+    for number in range(settings.CONCURRENCY_LIMIT):
+        key = SLOT_KEY.format(number)
+        if cache.add(key, 1, settings.CONCURRENCY_SLOT_TIMEOUT):
+            return key
+    return None
+
+
+class ConcurrencyLimitMixin:
+    """Не больше CONCURRENCY_LIMIT одновременных дорогих запросов на все
+    воркеры, остальным сразу 503 с Retry-After. Какие запросы дорогие,
+    решает is_expensive."""
+
+    def is_expensive(self, request):
+        return True
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        if not self.is_expensive(request):
+            return
+        self.concurrency_slot = acquire_slot()
+        if self.concurrency_slot is None:
+            increment('concurrency.rejected')
+            raise Overloaded(settings.CONCURRENCY_RETRY_AFTER)
+
+    def dispatch(self, request, *args, **kwargs):
+        self.concurrency_slot = None
+        try:
+            return super().dispatch(request, *args, **kwargs)
+        finally:
+            if self.concurrency_slot is not None:
+                cache.delete(self.concurrency_slot)
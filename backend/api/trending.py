@@ -0,0 +1,110 @@
+import math
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Case, F, FloatField, Value, When
+from django.db.models.functions import Greatest
+from django.utils import timezone
+
+from recipes.models import Favorite, RecipeScore, ScoreDecay, ShoppingCart
+
+TOP_KEY = 'trending:top'
+MIN_SCORE = 1e-3
+
+
+def get_decay(seconds):
+    half_life = settings.TRENDING_HALF_LIFE_HOURS * 60 * 60
+    return math.exp(-math.log(2) * max(seconds, 0) / half_life)
+
+
+def get_decayed_at():
+    return ScoreDecay.objects.values_list('decayed_at', flat=True).first()
+
+
+def set_decayed_at(moment):
+    ScoreDecay.objects.update_or_create(pk=1, defaults={'decayed_at': moment})
+
+
+def add_score(recipe_id, delta):
+    # Вычитание вклада, затухшего неточно (пересчёт шёл параллельно),
+    # не уводит оценку ниже нуля.
+    score = Greatest(F('score') + delta, Value(0.0))
+    scores = RecipeScore.objects.filter(recipe_id=recipe_id)
+    if not scores.update(score=score):
+        RecipeScore.objects.bulk_create(
+            [RecipeScore(recipe_id=recipe_id)], ignore_conflicts=True)
+        scores.update(score=score)
+
+
+def get_stored_weight(weight, created, decayed_at):
+    """Вклад записи в том виде, в каком он сейчас хранится: затухшим
+    до момента последнего пересчёта."""
+    if decayed_at is None or created >= decayed_at:
+        return weight
+    return weight * get_decay((decayed_at - created).total_seconds())
+
+
+def remove_score(recipe_id, weight, created):
+    add_score(recipe_id, -get_stored_weight(weight, created,
+                                            get_decayed_at()))
+
+
+def remove_scores(entries, weight):
+    """Вычитает вклады записей [(recipe_id, created)] одним UPDATE."""
+    decayed_at = get_decayed_at()
+    deltas = defaultdict(float)
+    for recipe_id, created in entries:
+        deltas[recipe_id] += get_stored_weight(weight, created, decayed_at)
+    if not deltas:
+        return
+    RecipeScore.objects.filter(recipe_id__in=deltas).update(
+        score=Greatest(F('score') - Case(
+            *(When(recipe_id=recipe_id, then=Value(delta))
+              for recipe_id, delta in deltas.items()),
+            output_field=FloatField()), Value(0.0)))
+
+
+def decay_scores():
+    """Момент затухания хранится в базе и меняется в одной транзакции
+    с оценками: команда по cron работает в отдельном процессе."""
+    with transaction.atomic():
+        state = ScoreDecay.objects.select_for_update().filter(pk=1).first()
+        now = timezone.now()
+        if state is not None:
+            RecipeScore.objects.update(score=F('score') * get_decay(
+                (now - state.decayed_at).total_seconds()))
+            RecipeScore.objects.filter(score__lt=MIN_SCORE).delete()
+        set_decayed_at(now)
+    cache.delete(TOP_KEY)
+
+
+def rebuild_scores():
+    """Полный пересчёт по датам добавления в избранное и список покупок."""
+    now = timezone.now()
+    scores = defaultdict(float)
+    for model, weight in ((Favorite, settings.TRENDING_FAVORITE_WEIGHT),
+                          (ShoppingCart, settings.TRENDING_CART_WEIGHT)):
+        for recipe_id, created in model.objects.values_list(
+                'recipe_id', 'created').iterator():
+            scores[recipe_id] += weight * get_decay(
+                (now - created).total_seconds())
+    with transaction.atomic():
+        RecipeScore.objects.all().delete()
+        RecipeScore.objects.bulk_create(
+            (RecipeScore(recipe_id=recipe_id, score=score)
+             for recipe_id, score in scores.items() if score >= MIN_SCORE),
+            batch_size=1000,
+        )
+        set_decayed_at(now)
+    cache.delete(TOP_KEY)
+
+
+def get_top_recipe_ids(limit):
+    top = cache.get(TOP_KEY)
+    if top is None:
+        top = list(RecipeScore.objects.order_by('-score').values_list(
+            'recipe_id', flat=True)[:settings.TRENDING_TOP_SIZE])
+        cache.set(TOP_KEY, top, settings.TRENDING_CACHE_TIMEOUT)
+    return top[:limit]
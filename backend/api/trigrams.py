@@ -0,0 +1,199 @@
+import threading
+from collections import defaultdict
+
+import numpy as np
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count
+
+from recipes.models import (Ingredient, Recipe, RecipeIngredient,
+                            ShoppingListItem)
+from .nutrition import update_nutrition
+from .similarity import invalidate_index
+from .utils import lock_users, touch_recipes
+
+VERSION_KEY = 'ingredient_index:version'
+
+
+def normalize(text):
+    return ' '.join(text.lower().replace('ё', 'е').split())
+
+
+def get_trigrams(text):
+    """Уникальные триграммы строки с отступами по краям, каждая упакована
+    в одно число: по 21 бит на символ."""
+    codes = np.array([ord(char) for char in f'  {text} '], dtype=np.int64)
+    return np.unique((codes[:-2] << 42) | (codes[1:-1] << 21) | codes[2:])
+
+
+class TrigramIndex:
+    """Инвертированный индекс триграмм названий ингредиентов в массивах
+    NumPy: отсортированные триграммы, смещения их списков и позиции
+    названий (CSR)."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.version = None
+        self.build([])
+
+    def build(self, rows):
+        """rows - тройки (id, название, единица измерения)."""
+        self.ids = np.array([row[0] for row in rows], dtype=np.int64)
+        self.names = np.array([normalize(row[1]) for row in rows], dtype=str)
+        self.units = np.array([row[2] for row in rows], dtype=str)
+        grams = [get_trigrams(name) for name in self.names.tolist()]
+        self.counts = np.array([len(item) for item in grams], dtype=np.int64)
+        keys = np.concatenate(grams) if grams else np.empty(0, np.int64)
+        positions = np.repeat(np.arange(len(grams), dtype=np.int32),
+                              self.counts)
+        order = np.argsort(keys, kind='stable')
+        self.keys, starts = np.unique(keys[order], return_index=True)
+        self.offsets = np.append(starts, len(keys))
+        self.postings = positions[order]
+
+    def load(self):
+        self.build(list(Ingredient.objects.order_by('id').values_list(
+            'id', 'name', 'measurement_unit')))
+
+    def get_shared(self, grams):
+        """Сколько триграмм из grams есть в каждом названии."""
+        found = np.searchsorted(self.keys, grams)
+        found = found[found < len(self.keys)]
+        found = found[np.isin(self.keys[found], grams)]
+        return np.bincount(
+            np.concatenate([self.postings[self.offsets[position]:
+                                          self.offsets[position + 1]]
+                            for position in found.tolist()]
+                           or [np.empty(0, np.int32)]),
+            minlength=len(self.ids),
+        )
+
+    def get_similarities(self, grams):
+        """Коэффициент Жаккара наборов триграмм и каждого названия."""
+        shared = self.get_shared(grams)
+        return shared / (len(grams) + self.counts - shared)
+
+    def search(self, query, limit, threshold):
+        """id ингредиентов: сначала совпадения по началу названия, затем
+        названия, в которых есть достаточная доля триграмм запроса, -
+        так находятся и слова с опечатками."""
+        query = normalize(query)
+        if not query or not len(self.ids):
+            return []
+        grams = get_trigrams(query)
+        shared = self.get_shared(grams)
+        coverage = shared / len(grams)
+        similarities = shared / (len(grams) + self.counts - shared)
+        prefix = np.char.startswith(self.names, query)
+        candidates = np.flatnonzero(prefix | (coverage >= threshold))
+        order = np.lexsort((
+            np.char.str_len(self.names[candidates]),
+            -similarities[candidates],
+            -coverage[candidates],
+            ~prefix[candidates],
+        ))
+        return self.ids[candidates[order][:limit]].tolist()
+
+    def get_clusters(self, threshold):
+        """Группы вероятных дублей: названия с похожими триграммами
+        и одинаковой единицей измерения, объединённые транзитивно."""
+        parents = np.arange(len(self.ids))
+
+        def find(position):
+            while parents[position] != position:
+                parents[position] = parents[parents[position]]
+                position = parents[position]
+            return position
+
+        for position, name in enumerate(self.names.tolist()):
+            similarities = self.get_similarities(get_trigrams(name))
+            similar = (similarities >= threshold) & (
+                self.units == self.units[position])
+            for other in np.flatnonzero(similar).tolist():
+                parents[find(other)] = find(position)
+        roots = np.array([find(position) for position in range(len(parents))],
+                         dtype=np.int64)
+        order = np.argsort(roots, kind='stable')
+        bounds = np.flatnonzero(np.diff(roots[order])) + 1
+        return [cluster.tolist() for cluster in np.split(self.ids[order],
+                                                         bounds)
+                if len(cluster) > 1]
+
+    def refresh(self):
+        version = cache.get(VERSION_KEY, 0)
+        if version != self.version:
+            self.load()
+            self.version = version
+
+
+index = TrigramIndex()
+
+
+def search_ingredients(query, limit, threshold):
+    with index.lock:
+        index.refresh()
+        return index.search(query, limit, threshold)
+
+
+def publish_change():
+    cache.add(VERSION_KEY, 0, timeout=None)
+    cache.incr(VERSION_KEY)
+
+
+def invalidate_ingredient_index():
+    """После коммита все воркеры перестроят индекс при следующем поиске."""
+    transaction.on_commit(publish_change)
+
+
+def choose_canonical(ingredient_ids):
+    """Основной ингредиент группы - тот, что чаще встречается в рецептах."""
+    usage = dict(RecipeIngredient.objects.filter(
+        ingredient_id__in=ingredient_ids).values('ingredient_id').annotate(
+        total=Count('id')).order_by().values_list('ingredient_id', 'total'))
+    return min(ingredient_ids,
+               key=lambda ingredient_id: (-usage.get(ingredient_id, 0),
+                                          ingredient_id))
+
+
+def merge_ingredients(canonical_id, duplicate_ids):
+    """Переносит ссылки с дублей на основной ингредиент и удаляет дубли.
+    Строки одного рецепта складываются в одну, списки покупок
+    сохраняют прежние суммы."""
+    group = [canonical_id, *duplicate_ids]
+    with transaction.atomic():
+        lock_users(ShoppingListItem.objects.filter(
+            ingredient_id__in=group).values('user_id'))
+        items = defaultdict(float)
+        for user_id, amount in ShoppingListItem.objects.select_for_update(
+        ).filter(ingredient_id__in=group).values_list('user_id', 'amount'):
+            items[user_id] += amount
+
+        rows = defaultdict(list)
+        for row in RecipeIngredient.objects.filter(
+                ingredient_id__in=group).order_by('id'):
+            rows[row.recipe_id].append(row)
+        kept, extra_ids = [], []
+        for recipe_rows in rows.values():
+            row = next((row for row in recipe_rows
+                        if row.ingredient_id == canonical_id), recipe_rows[0])
+            row.amount = sum(item.amount for item in recipe_rows)
+            row.ingredient_id = canonical_id
+            kept.append(row)
+            extra_ids += [item.id for item in recipe_rows if item is not row]
+        RecipeIngredient.objects.bulk_update(kept, ('ingredient', 'amount'))
+        RecipeIngredient.objects.filter(id__in=extra_ids).delete()
+
+        # Сигналы удаления строк успели вычесть их из списков покупок,
+        # поэтому суммы записываются заново.
+        ShoppingListItem.objects.filter(ingredient_id__in=group).delete()
+        ShoppingListItem.objects.bulk_create(
+            ShoppingListItem(user_id=user_id, ingredient_id=canonical_id,
+                             amount=round(amount, 6))
+            for user_id, amount in items.items())
+        Ingredient.objects.filter(id__in=duplicate_ids).delete()
+
+        recipe_ids = list(rows)
+        touch_recipes(Recipe.objects.filter(id__in=recipe_ids))
+        update_nutrition(recipe_ids)
+    invalidate_index()
+    return len(recipe_ids)
@@ -0,0 +1,72 @@
+import numpy as np
+
+# Разделитель названия и единицы в ключе группировки; '\0' не подходит:
+# NumPy отбрасывает концевые нулевые символы строк.
+SEPARATOR = '\x1f'
+
+# Единица -> (базовая единица, сколько базовых в одной).
+CONVERSIONS = {
+    'г': ('г', 1),
+    'кг': ('г', 1000),
+    'мл': ('мл', 1),
+    'л': ('мл', 1000),
+    'ч. л.': ('ч. л.', 1),
+    'ст. л.': ('ч. л.', 3),
+}
+# Базовая единица -> единицы для вывода, от крупной к мелкой.
+DISPLAY_UNITS = {
+    'г': (('кг', 1000), ('г', 1)),
+    'мл': (('л', 1000), ('мл', 1)),
+    'ч. л.': (('ст. л.', 3), ('ч. л.', 1)),
+}
+
+
+def get_scale(servings, recipe_servings):
+    """Во сколько раз умножить количества рецепта; без желаемого числа
+    порций - как в рецепте."""
+    if not servings or not recipe_servings:
+        return 1
+    return servings / recipe_servings
+
+
+def aggregate_amounts(names, units, amounts):
+    """Суммы по ингредиентам с приведением совместимых единиц.
+    Вся арифметика - операциями над массивами; таблица переводов
+    применяется к уникальным единицам, а не к каждой строке.
+    Возвращает [(название, единица, количество)] по названию."""
+    if not names:
+        return []
+    unique_units, unit_index = np.unique(
+        np.array(units, dtype=object), return_inverse=True)
+    conversions = [CONVERSIONS.get(unit, (unit, 1)) for unit in unique_units]
+    base_units = np.array([base for base, _ in conversions],
+                          dtype=object)[unit_index]
+    factors = np.array([factor for _, factor in conversions],
+                       dtype=float)[unit_index]
+    base_amounts = np.asarray(amounts, dtype=float) * factors
+
+    keys = np.array(names, dtype=object) + SEPARATOR + base_units
+    unique_keys, key_index = np.unique(keys, return_inverse=True)
+    totals = np.bincount(key_index, weights=base_amounts)
+    group_units = base_units[np.unique(key_index, return_index=True)[1]]
+
+    display_units = group_units.copy()
+    divisors = np.ones(len(totals))
+    for base, variants in DISPLAY_UNITS.items():
+        family = group_units == base
+        # Идём от мелкой единицы к крупной: побеждает крупнейшая,
+        # в которой получается хотя бы одна штука.
+        for unit, factor in reversed(variants):
+            chosen = family & (totals >= factor)
+            display_units[chosen] = unit
+            divisors[chosen] = factor
+    values = totals / divisors
+    return [
+        (key.split(SEPARATOR, 1)[0], unit, value)
+        for key, unit, value in zip(unique_keys.tolist(),
+                                    display_units.tolist(), values.tolist())
+    ]
+
+
+def format_amount(value):
+    return f'{value:.2f}'.rstrip('0').rstrip('.')
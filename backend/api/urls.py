@@ -1,16 +1,24 @@
-from django.urls import include, path
+from django.conf import settings
+from django.urls import include, path, re_path
 from rest_framework import routers
 
 from .views import (TagViewSet, IngredientViewSet, UsersViewSet,
                     FavoriteViewSet, RecipeViewSet, SubscribeViewSet,
                     SubscriptionViewSet, ShoppingCartViewSet,
-                    DownloadShoppingCartViewSet)
+                    DownloadShoppingCartViewSet, ShoppingListViewSet,
+                    FeedViewSet, BatchFavoriteViewSet,
+                    BatchShoppingCartViewSet, BatchSubscribeViewSet,
+                    SyncViewSet)
+from .async_views import async_view
 
 v1_router = routers.DefaultRouter()
 v1_router.register('tags', TagViewSet, basename='tags')
 v1_router.register('ingredients', IngredientViewSet, basename='ingredients')
 v1_router.register('recipes/download_shopping_cart',
                    DownloadShoppingCartViewSet, basename='download')
+v1_router.register('recipes/shopping_list', ShoppingListViewSet,
+                   basename='shopping_list')
+v1_router.register('recipes/feed', FeedViewSet, basename='feed')
 v1_router.register('recipes', RecipeViewSet, basename='recipes')
 v1_router.register('users/subscriptions', SubscriptionViewSet,
                    basename='subscriptions')
@@ -20,9 +28,45 @@ v1_router.register(r'recipes/(?P<recipe_id>\d+)/favorite',
                    FavoriteViewSet, basename='favorite')
 v1_router.register(r'recipes/(?P<recipe_id>\d+)/shopping_cart',
                    ShoppingCartViewSet, basename='shopping_cart')
+v1_router.register('sync', SyncViewSet, basename='sync')
 v1_router.register('users', UsersViewSet, basename='users')
 
+batch_actions = {'post': 'create', 'delete': 'destroy_many'}
+
 urlpatterns = [
     path(r'auth/', include('djoser.urls.authtoken')),
+    path('recipes/favorite/', BatchFavoriteViewSet.as_view(batch_actions),
+         name='favorite-batch'),
+    path('recipes/shopping_cart/',
+         BatchShoppingCartViewSet.as_view(batch_actions),
+         name='shopping_cart-batch'),
+    path('users/subscribe/', BatchSubscribeViewSet.as_view(batch_actions),
+         name='subscribe-batch'),
+]
+
+if settings.ASYNC_READ_VIEWS:
+    list_actions = {'get': 'list', 'post': 'create'}
+    detail_actions = {'get': 'retrieve', 'put': 'update',
+                      'patch': 'partial_update', 'delete': 'destroy'}
+    urlpatterns += [
+        re_path(r'^recipes/$', async_view(RecipeViewSet, list_actions),
+                name='recipes-list'),
+        re_path(r'^recipes/(?P<pk>\d+)/$',
+                async_view(RecipeViewSet, detail_actions),
+                name='recipes-detail'),
+        re_path(r'^ingredients/$',
+                async_view(IngredientViewSet, {'get': 'list'}),
+                name='ingredients-list'),
+        re_path(r'^ingredients/(?P<pk>\d+)/$',
+                async_view(IngredientViewSet, {'get': 'retrieve'}),
+                name='ingredients-detail'),
+        re_path(r'^tags/$', async_view(TagViewSet, {'get': 'list'}),
+                name='tags-list'),
+        re_path(r'^tags/(?P<pk>\d+)/$',
+                async_view(TagViewSet, {'get': 'retrieve'}),
+                name='tags-detail'),
+    ]
+
+urlpatterns += [
     path('', include(v1_router.urls)),
 ]
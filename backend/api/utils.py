@@ -1,10 +1,36 @@
+from collections import defaultdict
+from itertools import islice
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, F, Q, Sum
 from django.shortcuts import get_object_or_404
+from django.utils import timezone
 from rest_framework.mixins import DestroyModelMixin, CreateModelMixin
 from rest_framework.viewsets import GenericViewSet
 from rest_framework.permissions import IsAuthenticated
-from recipes.models import Recipe, Ingredient, RecipeIngredient
+from recipes.models import (Recipe, Ingredient, RecipeIngredient,
+                            ShoppingCart, ShoppingListItem, Tag)
 from rest_framework import status, viewsets
 from rest_framework.response import Response
+from users.models import User
+
+from .compression import get_payload, payload_response
+from .routing import ReplicaRoutingMixin
+from .trending import add_score, remove_score
+from .units import aggregate_amounts, format_amount, get_scale
+
+TAG_FACETS_KEY = 'tag_facets'
+AMOUNT_PRECISION = 1e-6
+
+
+def lock_users(user_ids):
+    """Блокирует строки юзеров до конца транзакции. Порядок по id:
+    транзакции, которым нужны несколько юзеров, не ждут друг друга
+    по кругу."""
+    list(User.objects.select_for_update().filter(
+        id__in=user_ids).order_by('id').values_list('id', flat=True))
 
 
 class CreateDestroyViewSet(CreateModelMixin, DestroyModelMixin,
@@ -12,29 +38,51 @@ class CreateDestroyViewSet(CreateModelMixin, DestroyModelMixin,
     pass
 
 
-class TagIngredientViewSet(viewsets.ReadOnlyModelViewSet):
+class TagIngredientViewSet(ReplicaRoutingMixin,
+                           viewsets.ReadOnlyModelViewSet):
     pagination_class = None
+    payload_name = None
 
+    def list(self, request, *args, **kwargs):
+        """Полный список отдаётся из кэша уже сжатым."""
+        if request.query_params or request.accepted_renderer.format != 'json':
+            return super().list(request, *args, **kwargs)
+        return payload_response(
+            request, self.get_reference_payload(request.accepted_renderer))
 
-class FavoriteShoppingViewSet(CreateDestroyViewSet):
+    def get_reference_payload(self, renderer):
+        return get_payload(
+            self.payload_name,
+            lambda: renderer.render(self.get_serializer(
+                self.get_queryset(), many=True).data),
+            settings.REFERENCE_PAYLOAD_TIMEOUT,
+        )
+
+
+class FavoriteShoppingViewSet(ReplicaRoutingMixin, CreateDestroyViewSet):
     permission_classes = (IsAuthenticated,)
     model = None
+    score_weight = 0
 
     def get_recipe(self):
         return get_object_or_404(Recipe, pk=self.kwargs.get('recipe_id'))
 
     def perform_create(self, serializer):
+        recipe = self.get_recipe()
         serializer.save(
             user=self.request.user,
-            recipe=self.get_recipe(), )
+            recipe=recipe, )
+        add_score(recipe.id, self.score_weight)
 
     def delete(self, request, recipe_id):
+        recipe = self.get_recipe()
         favorite = get_object_or_404(
             self.model,
             user=self.request.user,
-            recipe=self.get_recipe(),
+            recipe=recipe,
         )
         favorite.delete()
+        remove_score(recipe.id, self.score_weight, favorite.created)
         return Response(status=status.HTTP_204_NO_CONTENT)
 
     def get_serializer_context(self):
@@ -43,6 +91,15 @@ class FavoriteShoppingViewSet(CreateDestroyViewSet):
         return context
 
 
+def chunked(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
 def get_ingredients_dict(ingredients_data):
     ingredients_dict = {}
     for ingredient in ingredients_data:
@@ -56,12 +113,164 @@ def get_ingredients_dict(ingredients_data):
 
 
 def get_recipe_ingredients(ingredients_dict, recipe):
+    ingredients = Ingredient.objects.in_bulk(list(ingredients_dict))
     recipe_ingredients = []
     for ingredient_id, amount in ingredients_dict.items():
-        current_ingredient, status = Ingredient.objects.get_or_create(
-            pk=ingredient_id)
+        current_ingredient = ingredients.get(ingredient_id)
+        if current_ingredient is None:
+            current_ingredient, status = Ingredient.objects.get_or_create(
+                pk=ingredient_id)
         recipe_ingredients.append(RecipeIngredient(
             ingredient=current_ingredient,
             recipe=recipe,
             amount=amount))
     return recipe_ingredients
+
+
+def get_recipe_amounts(recipe_id):
+    amounts = defaultdict(int)
+    for ingredient_id, amount in RecipeIngredient.objects.filter(
+            recipe_id=recipe_id, ingredient__isnull=False).values_list(
+            'ingredient_id', 'amount'):
+        amounts[ingredient_id] += amount
+    return amounts
+
+
+def add_recipes_to_shopping_list(user, recipe_ids):
+    amounts = dict(RecipeIngredient.objects.filter(
+        recipe_id__in=recipe_ids, ingredient__isnull=False
+    ).values('ingredient_id').annotate(
+        total=Sum('amount')).order_by().values_list('ingredient_id', 'total'))
+    update_shopping_lists(None, amounts, scales={user.id: 1})
+
+
+def get_cart_scales(recipe_id):
+    """Множители количеств рецепта для каждого юзера, у которого он
+    лежит в корзине."""
+    return {
+        user_id: get_scale(servings, recipe_servings)
+        for user_id, servings, recipe_servings in ShoppingCart.objects.filter(
+            recipe_id=recipe_id).values_list(
+            'user_id', 'servings', 'recipe__servings')
+    }
+
+
+def update_shopping_lists(recipe_id, amounts, sign=1, scales=None):
+    """Прибавляет (sign=1) или вычитает (sign=-1) количества ингредиентов
+    {ingredient_id: amount} в списках покупок юзеров, у которых рецепт
+    лежит в корзине, с учётом желаемого числа порций. scales -
+    {user_id: множитель}, по умолчанию из корзин."""
+    if scales is None:
+        scales = get_cart_scales(recipe_id)
+    deltas = defaultdict(float)
+    for user_id, scale in scales.items():
+        for ingredient_id, amount in amounts.items():
+            if ingredient_id is not None:
+                deltas[user_id, ingredient_id] += sign * scale * amount
+    apply_shopping_list_deltas(deltas)
+
+
+def remove_recipes_from_shopping_lists(recipe_ids, user_id=None):
+    """Вычитает рецепты из списков покупок всех юзеров (или одного
+    user_id), у которых они лежат в корзине: два запроса на любое число
+    рецептов и корзин."""
+    carts = ShoppingCart.objects.filter(recipe_id__in=recipe_ids)
+    if user_id is not None:
+        carts = carts.filter(user_id=user_id)
+    amounts = defaultdict(list)
+    for recipe_id, ingredient_id, total in RecipeIngredient.objects.filter(
+            recipe_id__in=recipe_ids, ingredient__isnull=False).values(
+            'recipe_id', 'ingredient_id').annotate(
+            total=Sum('amount')).order_by().values_list(
+            'recipe_id', 'ingredient_id', 'total'):
+        amounts[recipe_id].append((ingredient_id, total))
+    deltas = defaultdict(float)
+    for cart_user_id, recipe_id, servings, recipe_servings in (
+            carts.values_list('user_id', 'recipe_id', 'servings',
+                              'recipe__servings')):
+        scale = get_scale(servings, recipe_servings)
+        for ingredient_id, total in amounts[recipe_id]:
+            deltas[cart_user_id, ingredient_id] -= scale * total
+    apply_shopping_list_deltas(deltas)
+
+
+def apply_shopping_list_deltas(deltas):
+    """Применяет изменения {(user_id, ingredient_id): delta} к спискам
+    покупок, пустые позиции удаляются. Строки юзеров блокируются:
+    select_for_update по позициям не мешает двум транзакциям создать
+    одну и ту же новую позицию."""
+    if not deltas:
+        return
+    users = {user_id for user_id, _ in deltas}
+    ingredients = {ingredient_id for _, ingredient_id in deltas}
+    with transaction.atomic():
+        lock_users(users)
+        items = {
+            (item.user_id, item.ingredient_id): item
+            for item in ShoppingListItem.objects.select_for_update().filter(
+                user_id__in=users, ingredient_id__in=ingredients)
+        }
+        new_items, changed_items, empty_ids = [], [], []
+        for (user_id, ingredient_id), delta in deltas.items():
+            item = items.get((user_id, ingredient_id))
+            if item is None:
+                if delta > AMOUNT_PRECISION:
+                    new_items.append(ShoppingListItem(
+                        user_id=user_id, ingredient_id=ingredient_id,
+                        amount=round(delta, 6)))
+                continue
+            # Округление не даёт накапливаться ошибке дробных множителей.
+            item.amount = round(item.amount + delta, 6)
+            if item.amount > AMOUNT_PRECISION:
+                changed_items.append(item)
+            else:
+                empty_ids.append(item.id)
+        ShoppingListItem.objects.bulk_create(new_items)
+        ShoppingListItem.objects.bulk_update(changed_items, ('amount',))
+        ShoppingListItem.objects.filter(id__in=empty_ids).delete()
+
+
+def render_shopping_list(user_id):
+    """Текст списка покупок для скачивания по сохранённым суммам - один
+    запрос по индексу юзера. Количества в совместимых единицах (г и кг,
+    мл и л, ложки) складываются."""
+    rows = list(ShoppingListItem.objects.filter(user_id=user_id).values_list(
+        'ingredient__name', 'ingredient__measurement_unit', 'amount'))
+    names, units, amounts = zip(*rows) if rows else ((), (), ())
+    return ''.join(
+        f'{name}({unit})-{format_amount(amount)}\n'
+        for name, unit, amount in aggregate_amounts(names, units, amounts)
+    )
+
+
+def delete_recipe_image(name):
+    """Удаляет файл картинки, если на него больше не ссылается ни один
+    рецепт (после загрузки NDJSON файл может быть общим)."""
+    if not Recipe.objects.filter(image=name).exists():
+        Recipe._meta.get_field('image').storage.delete(name)
+
+
+def get_tag_facets(recipes=None):
+    """Число рецептов по каждому тэгу одним агрегирующим запросом,
+    без фильтров результат берётся из кэша."""
+    if recipes is None:
+        facets = cache.get(TAG_FACETS_KEY)
+        if facets is None:
+            facets = get_tag_facets(Recipe.objects.all())
+            cache.set(TAG_FACETS_KEY, facets, timeout=None)
+        return facets
+    return list(Tag.objects.annotate(count=Count(
+        'tag__recipe',
+        filter=Q(tag__recipe__in=recipes.order_by().values('id')),
+        distinct=True,
+    )).values('id', 'name', 'slug', 'count'))
+
+
+def invalidate_tag_facets():
+    cache.delete(TAG_FACETS_KEY)
+
+
+def touch_recipes(recipes):
+    """Новая версия представления рецептов (и отметка для синхронизации)
+    одним UPDATE."""
+    recipes.update(version=F('version') + 1, updated_at=timezone.now())
@@ -1,26 +1,57 @@
-from collections import defaultdict
-
-from django.http import HttpResponse
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.http import FileResponse, HttpResponse
 from django.shortcuts import get_object_or_404
+from django.utils.cache import (get_conditional_response,
+                                patch_cache_control, patch_vary_headers)
+from django.utils.http import http_date
 from django_filters.rest_framework import DjangoFilterBackend
 from djoser.views import UserViewSet
 from rest_framework import viewsets, status
-from rest_framework.permissions import (IsAuthenticatedOrReadOnly,
-                                        IsAuthenticated)
+from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
+from rest_framework.permissions import (SAFE_METHODS,
+                                        IsAuthenticatedOrReadOnly,
+                                        IsAuthenticated, IsAdminUser)
 from rest_framework.response import Response
+from rest_framework.viewsets import GenericViewSet
 
+from .compression import get_payload, payload_response
+from .deletion import (DELETE_USER_KEY, delete_recipes, delete_user,
+                       raw_delete)
 from .filters import RecipeFilter, IngredientSearchFilter
-from recipes.models import Tag, Ingredient, Recipe, ShoppingCart, Favorite
+from recipes.models import (Tag, Ingredient, Recipe, ShoppingCart, Favorite,
+                            ShoppingListItem, Tombstone)
 from users.models import User, Subscription
-from .pagination import CustomPagination
+from .feed import get_feed_recipe_ids
+from .ndjson import (WRITE_EXPORT_KEY, get_export_name, get_export_path,
+                     is_export_ready, write_export)
+from .pagination import CustomPagination, KeysetPagination
 from .permissions import IsOwnerOrReadOnly
-from .serializers import (DownloadShoppingCartSerializer, TagSerializer,
-                          IngredientSerializer, RecipeSerializer,
-                          SubscriptionSerializer, RecipeSerializerGet,
-                          FavoriteSerializer, ShoppingCartSerializer,)
+from .representations import (get_recipe_columns, get_recipe_etag,
+                              get_recipe_fields, is_shared_representation,
+                              represent_recipes, represent_recipes_by_ids)
+from .routing import ReplicaRoutingMixin
+from .similarity import index as similarity_index
+from .sync import get_sync_data
+from .throttling import ConcurrencyLimitMixin
+from .tasks import enqueue, enqueue_many
+from .feed import BACKFILL_FEED_KEY, backfill_feed
+from .trending import add_score, get_top_recipe_ids, remove_scores
+from .serializers import (TagSerializer, IngredientSerializer,
+                          RecipeSerializer, SubscriptionSerializer,
+                          RecipeSerializerGet, FavoriteSerializer,
+                          ShoppingCartSerializer, ShoppingListItemSerializer,
+                          IdsSerializer, ShortRecipeSerializer)
 from .utils import (CreateDestroyViewSet,
                     FavoriteShoppingViewSet,
-                    TagIngredientViewSet)
+                    TagIngredientViewSet,
+                    add_recipes_to_shopping_list,
+                    lock_users,
+                    remove_recipes_from_shopping_lists,
+                    render_shopping_list,
+                    get_tag_facets)
 
 
 class UsersViewSet(UserViewSet):
@@ -28,22 +59,30 @@ class UsersViewSet(UserViewSet):
     permission_classes = (IsAuthenticatedOrReadOnly,)
     pagination_class = CustomPagination
 
+    def perform_destroy(self, instance):
+        """Юзер сразу теряет доступ, а рецепты и связи удаляются в фоне."""
+        instance.is_active = False
+        instance.save(update_fields=('is_active',))
+        enqueue(delete_user, instance.id, key=DELETE_USER_KEY)
+
 
 class TagViewSet(TagIngredientViewSet):
     """Получения тэгов."""
     queryset = Tag.objects.all()
     serializer_class = TagSerializer
+    payload_name = 'tags'
 
 
 class IngredientViewSet(TagIngredientViewSet):
     """Получение списка ингредиентов, фильтрация по полю name."""
     queryset = Ingredient.objects.all()
     serializer_class = IngredientSerializer
+    payload_name = 'ingredients'
     filter_backends = (IngredientSearchFilter,)
-    search_fields = ('^name',)
 
 
-class RecipeViewSet(viewsets.ModelViewSet):
+class RecipeViewSet(ConcurrencyLimitMixin, ReplicaRoutingMixin,
+                    viewsets.ModelViewSet):
     """Получение и создание рецептов."""
     queryset = Recipe.objects.all()
     permission_classes = (IsAuthenticatedOrReadOnly, IsOwnerOrReadOnly)
@@ -51,17 +90,181 @@ class RecipeViewSet(viewsets.ModelViewSet):
     filter_backends = (DjangoFilterBackend,)
     filterset_class = RecipeFilter
 
+    @property
+    def throttle_scope(self):
+        if self.request.method not in SAFE_METHODS:
+            return 'recipe_write'
+        return None
+
+    def is_expensive(self, request):
+        # Запись декодирует и сохраняет картинку из base64.
+        return request.method not in SAFE_METHODS
+
     def get_serializer_class(self):
         if self.request.method in ('GET', 'HEAD', 'OPTIONS'):
             return RecipeSerializerGet
         return RecipeSerializer
 
+    def get_queryset(self):
+        if self.action == 'retrieve':
+            return self.queryset.only(
+                'version', 'updated_at', 'author_id',
+                *get_recipe_columns(get_recipe_fields(self.request)))
+        if self.action == 'similar':
+            return self.queryset.only('id')
+        return self.queryset.all()
+
+    def list(self, request, *args, **kwargs):
+        if (request.user.is_anonymous
+                and request.accepted_renderer.format == 'json'):
+            # Анонимные страницы общие для всех, хранятся уже сжатыми.
+            payload = get_payload(
+                'recipes',
+                lambda: request.accepted_renderer.render(
+                    self.get_list_response(request).data),
+                settings.ANONYMOUS_PAGE_TIMEOUT,
+                url=request.build_absolute_uri(),
+            )
+            return payload_response(request, payload)
+        return self.get_list_response(request)
+
+    def get_list_response(self, request):
+        fields = get_recipe_fields(request)
+        queryset = self.filter_queryset(self.get_queryset())
+        if request.query_params.get('ordering') == 'trending':
+            queryset = queryset.order_by(
+                F('score__score').desc(nulls_last=True), '-id')
+        queryset = queryset.values(*get_recipe_columns(fields))
+        if 'ids' in request.query_params:
+            # Пакетная выборка по id - одним ответом, без страниц.
+            if len(request.query_params['ids'].split(',')) > (
+                    settings.BATCH_MAX_SIZE):
+                raise ValidationError(
+                    {'ids': f'Не больше {settings.BATCH_MAX_SIZE} id.'})
+            return Response(represent_recipes(queryset, request, fields))
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            return self.get_paginated_response(
+                represent_recipes(page, request, fields))
+        return Response(represent_recipes(queryset, request, fields))
+
+    def retrieve(self, request, *args, **kwargs):
+        fields = get_recipe_fields(request)
+        instance = self.get_object()
+        headers = {'ETag': get_recipe_etag(instance, request, fields)}
+        last_modified = None
+        if is_shared_representation(request.user, fields):
+            last_modified = int(instance.updated_at.timestamp())
+            headers['Last-Modified'] = http_date(last_modified)
+        response = get_conditional_response(
+            request, etag=headers['ETag'], last_modified=last_modified)
+        if response is None:
+            row = {column: getattr(instance, column)
+                   for column in get_recipe_columns(fields)}
+            if 'image' in row:
+                row['image'] = instance.image.name
+            response = Response(represent_recipes([row], request, fields)[0])
+        for name, value in headers.items():
+            response[name] = value
+        if request.user.is_anonymous:
+            patch_cache_control(response, no_cache=True)
+        else:
+            patch_cache_control(response, no_cache=True, private=True)
+        patch_vary_headers(response, ('Authorization',))
+        return response
+
+    @action(detail=False, pagination_class=None)
+    def facets(self, request):
+        params = {
+            name: request.query_params[name]
+            for name in ('author', 'is_favorited', 'is_in_shopping_cart')
+            if name in request.query_params
+        }
+        if not params:
+            return Response(get_tag_facets())
+        filterset = RecipeFilter(params, queryset=Recipe.objects.all(),
+                                 request=request)
+        return Response(get_tag_facets(filterset.qs))
+
+    @action(detail=True, pagination_class=None)
+    def similar(self, request, pk=None):
+        recipe = self.get_object()
+        limit = CustomPagination().get_page_size(request)
+        recipe_ids = [recipe_id for recipe_id, _ in
+                      similarity_index.similar(recipe.id, limit)]
+        return Response(represent_recipes_by_ids(
+            recipe_ids, request, get_recipe_fields(request)))
+
+    @action(detail=False, pagination_class=None)
+    def trending(self, request):
+        limit = CustomPagination().get_page_size(request)
+        return Response(represent_recipes_by_ids(
+            get_top_recipe_ids(limit), request, get_recipe_fields(request)))
+
+    @action(detail=False, pagination_class=None,
+            permission_classes=(IsAdminUser,))
+    def export(self, request):
+        """Выгрузка рецептов в NDJSON с учётом фильтров. Файл пишет воркер
+        очереди: синхронный воркер gunicorn убивается по timeout посреди
+        длинного потока. Пока файл готовится - 202 с Retry-After, готовый
+        отдаёт nginx по X-Accel-Redirect или Django как файл."""
+        filterset = RecipeFilter(request.query_params,
+                                 queryset=Recipe.objects.all(),
+                                 request=request)
+        if not filterset.is_valid():
+            raise ValidationError(filterset.errors)
+        params = {name: request.query_params.getlist(name)
+                  for name in RecipeFilter.base_filters
+                  if name in request.query_params}
+        name = get_export_name(params, request.user.id)
+        if not is_export_ready(name):
+            enqueue(write_export, name, params, request.user.id,
+                    key=WRITE_EXPORT_KEY)
+            return Response(
+                {'detail': 'Выгрузка готовится, повторите запрос позже.'},
+                status=status.HTTP_202_ACCEPTED,
+                headers={'Retry-After': str(settings.EXPORT_RETRY_AFTER)})
+        if settings.EXPORT_ACCEL_REDIRECT:
+            response = HttpResponse(content_type='application/x-ndjson')
+            response['X-Accel-Redirect'] = (
+                settings.EXPORT_ACCEL_REDIRECT + name)
+        else:
+            response = FileResponse(open(get_export_path(name), 'rb'),
+                                    content_type='application/x-ndjson')
+        response['Content-Disposition'] = (
+            'attachment; filename="recipes.ndjson"')
+        return response
+
     def perform_destroy(self, instance):
-        instance.image.delete()
-        instance.delete()
+        delete_recipes([instance.id])
+
+
+class FeedViewSet(viewsets.GenericViewSet):
+    """Лента рецептов авторов, на которых подписан юзер."""
+    permission_classes = (IsAuthenticated,)
+    pagination_class = KeysetPagination
+
+    def list(self, request):
+        recipe_ids = self.paginator.paginate_ids(
+            request,
+            lambda cursor, limit: get_feed_recipe_ids(
+                request.user, cursor, limit),
+        )
+        return self.get_paginated_response(represent_recipes_by_ids(
+            recipe_ids, request, get_recipe_fields(request)))
 
 
-class SubscribeViewSet(CreateDestroyViewSet):
+class SyncViewSet(viewsets.GenericViewSet):
+    """Дельта-синхронизация для офлайн-клиентов. Читает только с основной
+    базы: отставание реплики сдвинуло бы курсор мимо изменений."""
+    permission_classes = (IsAuthenticated,)
+
+    def list(self, request):
+        return Response(get_sync_data(
+            request, request.query_params.get('since')))
+
+
+class SubscribeViewSet(ReplicaRoutingMixin, CreateDestroyViewSet):
     """Создание и удаление подписок."""
     serializer_class = SubscriptionSerializer
     permission_classes = (IsAuthenticated,)
@@ -90,7 +293,8 @@ class SubscribeViewSet(CreateDestroyViewSet):
         return context
 
 
-class SubscriptionViewSet(viewsets.ReadOnlyModelViewSet):
+class SubscriptionViewSet(ReplicaRoutingMixin,
+                          viewsets.ReadOnlyModelViewSet):
     """Вывод всех подписок пользователя."""
     pagination_class = CustomPagination
     permission_classes = (IsAuthenticated,)
@@ -110,32 +314,167 @@ class FavoriteViewSet(FavoriteShoppingViewSet):
     """Добавление и удаление рецепта в избранное."""
     serializer_class = FavoriteSerializer
     model = Favorite
+    score_weight = settings.TRENDING_FAVORITE_WEIGHT
 
 
 class ShoppingCartViewSet(FavoriteShoppingViewSet):
     """Добавление и удаление рецепта в список покупок."""
     serializer_class = ShoppingCartSerializer
     model = ShoppingCart
+    score_weight = settings.TRENDING_CART_WEIGHT
+
+    def patch(self, request, recipe_id):
+        """Изменить желаемое число порций."""
+        entry = get_object_or_404(ShoppingCart, user=request.user,
+                                  recipe=self.get_recipe())
+        serializer = self.get_serializer(entry, data=request.data,
+                                         partial=True)
+        serializer.is_valid(raise_exception=True)
+        serializer.save()
+        return Response(serializer.data)
+
+
+class BatchFavoriteShoppingViewSet(ReplicaRoutingMixin, GenericViewSet):
+    """Пакетное добавление и удаление рецептов: ids в теле запроса."""
+    permission_classes = (IsAuthenticated,)
+    model = None
+    score_weight = 0
+    tombstone_kind = None
+
+    def get_ids(self, request):
+        serializer = IdsSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        return serializer.validated_data['ids']
+
+    def on_added(self, user, recipe_ids):
+        pass
+
+    def on_removed(self, user, recipe_ids):
+        pass
+
+    def create(self, request):
+        recipes = Recipe.objects.filter(id__in=self.get_ids(request))
+        with transaction.atomic():
+            # Пакеты одного юзера идут по очереди: иначе два параллельных
+            # запроса оба сочтут рецепт новым и дважды учтут его в оценке
+            # и списке покупок.
+            lock_users([request.user.id])
+            existing = set(self.model.objects.filter(
+                user=request.user, recipe__in=recipes).values_list(
+                'recipe_id', flat=True))
+            added = [recipe.id for recipe in recipes.only('id')
+                     if recipe.id not in existing]
+            self.model.objects.bulk_create(
+                (self.model(user=request.user, recipe_id=recipe_id)
+                 for recipe_id in added),
+                ignore_conflicts=True,
+            )
+            for recipe_id in added:
+                add_score(recipe_id, self.score_weight)
+            self.on_added(request.user, added)
+        return Response(
+            ShortRecipeSerializer(recipes, many=True,
+                                  context={'request': request}).data,
+            status=status.HTTP_201_CREATED,
+        )
+
+    def destroy_many(self, request):
+        """Удаление без сигналов на каждую строку: оценки, списки покупок
+        и записи об удалениях обновляются пачкой, как в deletion."""
+        entries = self.model.objects.filter(
+            user=request.user, recipe_id__in=self.get_ids(request))
+        with transaction.atomic():
+            rows = list(entries.select_for_update().values_list(
+                'recipe_id', 'created'))
+            recipe_ids = [recipe_id for recipe_id, _ in rows]
+            remove_scores(rows, self.score_weight)
+            self.on_removed(request.user, recipe_ids)
+            raw_delete(self.model.objects.filter(
+                user=request.user, recipe_id__in=recipe_ids))
+            Tombstone.objects.bulk_create(
+                Tombstone(kind=self.tombstone_kind, object_id=recipe_id,
+                          user_id=request.user.id)
+                for recipe_id in recipe_ids)
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+class BatchFavoriteViewSet(BatchFavoriteShoppingViewSet):
+    """Пакетное добавление и удаление рецептов в избранное."""
+    model = Favorite
+    score_weight = settings.TRENDING_FAVORITE_WEIGHT
+    tombstone_kind = Tombstone.FAVORITE
+
+
+class BatchShoppingCartViewSet(BatchFavoriteShoppingViewSet):
+    """Пакетное добавление и удаление рецептов в список покупок."""
+    model = ShoppingCart
+    score_weight = settings.TRENDING_CART_WEIGHT
+    tombstone_kind = Tombstone.SHOPPING_CART
 
+    def on_added(self, user, recipe_ids):
+        add_recipes_to_shopping_list(user, recipe_ids)
 
-class DownloadShoppingCartViewSet(viewsets.ReadOnlyModelViewSet):
+    def on_removed(self, user, recipe_ids):
+        remove_recipes_from_shopping_lists(recipe_ids, user.id)
+
+
+class BatchSubscribeViewSet(ReplicaRoutingMixin, GenericViewSet):
+    """Пакетная подписка и отписка: ids авторов в теле запроса."""
+    permission_classes = (IsAuthenticated,)
+
+    def get_ids(self, request):
+        serializer = IdsSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        return serializer.validated_data['ids']
+
+    def create(self, request):
+        authors = User.objects.filter(
+            id__in=self.get_ids(request)).exclude(id=request.user.id)
+        with transaction.atomic():
+            lock_users([request.user.id])
+            existing = set(Subscription.objects.filter(
+                subscriber=request.user, subscribed__in=authors).values_list(
+                'subscribed_id', flat=True))
+            added = [author.id for author in authors.only('id')
+                     if author.id not in existing]
+            Subscription.objects.bulk_create(
+                (Subscription(subscriber=request.user, subscribed_id=author_id)
+                 for author_id in added),
+                ignore_conflicts=True,
+            )
+            enqueue_many(backfill_feed,
+                         [(request.user.id, author_id) for author_id in added],
+                         queue='feed', key=BACKFILL_FEED_KEY)
+        return Response({'ids': added}, status=status.HTTP_201_CREATED)
+
+    def destroy_many(self, request):
+        Subscription.objects.filter(
+            subscriber=request.user,
+            subscribed_id__in=self.get_ids(request),
+        ).delete()
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+class DownloadShoppingCartViewSet(ConcurrencyLimitMixin,
+                                  viewsets.ReadOnlyModelViewSet):
     """Скачать список продуктов."""
+    permission_classes = (IsAuthenticated,)
+    throttle_scope = 'download_shopping_cart'
 
     def list(self, request):
-        queryset = ShoppingCart.objects.filter(
-            user=request.user).prefetch_related('recipe')
-        serializer = DownloadShoppingCartSerializer(
-            queryset, many=True, context={'request': request})
-        data = serializer.data
-        result = defaultdict(int)
-        for item in data:
-            for ingredient in item['ingredients']:
-                result[ingredient['name'], ingredient[
-                    'measurement_unit']] += ingredient['amount']
-        response_data = ''
-        for key, value in result.items():
-            response_data += f'{key[0]}({key[1]})-{value}\n'
-        response = HttpResponse(response_data, content_type='text/plain')
+        response = HttpResponse(render_shopping_list(request.user.id),
+                                content_type='text/plain')
         response[
             'Content-Disposition'] = 'attachment; filename="shopping_list.txt"'
         return response
+
+
+class ShoppingListViewSet(viewsets.ReadOnlyModelViewSet):
+    """Просмотр списка покупок."""
+    serializer_class = ShoppingListItemSerializer
+    permission_classes = (IsAuthenticated,)
+    pagination_class = None
+
+    def get_queryset(self):
+        return ShoppingListItem.objects.filter(
+            user=self.request.user).select_related('ingredient')
@@ -0,0 +1,60 @@
+import logging
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import DatabaseError, connections
+from django.urls import get_resolver
+from rest_framework.renderers import JSONRenderer
+
+logger = logging.getLogger(__name__)
+
+
+def warm_up():
+    """Всё, что иначе делал бы первый запрос воркера: импорт URLconf со
+    вьюхами, DRF и djoser, сжатые списки тэгов и ингредиентов, фасеты
+    тэгов и индексы в памяти. Возвращает время шагов в секундах."""
+    timings = {}
+    started = time.monotonic()
+    get_resolver().url_patterns
+    timings['urls'] = time.monotonic() - started
+
+    from .similarity import index as similarity_index
+    from .trigrams import index as ingredient_index
+    from .utils import get_tag_facets
+    from .views import IngredientViewSet, TagViewSet
+
+    started = time.monotonic()
+    for viewset in (TagViewSet, IngredientViewSet):
+        viewset(request=None, format_kwarg=None).get_reference_payload(
+            JSONRenderer())
+    get_tag_facets()
+    timings['payloads'] = time.monotonic() - started
+
+    started = time.monotonic()
+    with ingredient_index.lock:
+        ingredient_index.refresh()
+    with similarity_index.lock:
+        similarity_index.refresh(wait=True)
+    timings['indexes'] = time.monotonic() - started
+    return timings
+
+
+def open_connections():
+    """Соединения с базами до приёма запросов."""
+    for alias in settings.DATABASES:
+        try:
+            connections[alias].ensure_connection()
+        except DatabaseError:
+            logger.warning('База %s недоступна при старте воркера', alias)
+
+
+def close_connections():
+    """Закрывает соединения и пулы мастера перед fork воркеров."""
+    connections.close_all()
+    for cache in caches.all():
+        cache.close()
+    if any(database['ENGINE'] == 'backend.postgresql_pool'
+           for database in settings.DATABASES.values()):
+        from backend.postgresql_pool.base import close_pools
+        close_pools()
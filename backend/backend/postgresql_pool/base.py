@@ -0,0 +1,99 @@
+import threading
+import time
+from queue import Empty, LifoQueue
+
+from django.db.backends.postgresql import base
+from psycopg2.extensions import TRANSACTION_STATUS_IDLE
+
+from api.metrics import increment
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+class ConnectionPool:
+    """Ограниченный пул соединений, общий для потоков одного процесса."""
+
+    def __init__(self, size, timeout):
+        self.idle = LifoQueue()
+        self.slots = threading.BoundedSemaphore(size)
+        self.timeout = timeout
+
+    def acquire(self, connect):
+        started = time.monotonic()
+        if not self.slots.acquire(timeout=self.timeout):
+            increment('db_pool.timeouts')
+            raise base.Database.OperationalError(
+                'Нет свободных соединений в пуле')
+        increment('db_pool.acquired')
+        increment('db_pool.wait_ms', int((time.monotonic() - started) * 1000))
+        try:
+            while True:
+                connection = self.idle.get_nowait()
+                if not connection.closed:
+                    return connection
+        except Empty:
+            pass
+        try:
+            connection = connect()
+        except Exception:
+            self.slots.release()
+            raise
+        increment('db_pool.created')
+        return connection
+
+    def release(self, connection):
+        try:
+            if connection.closed:
+                return
+            try:
+                if (connection.get_transaction_status()
+                        != TRANSACTION_STATUS_IDLE):
+                    connection.rollback()
+            except base.Database.Error:
+                connection.close()
+                return
+            self.idle.put(connection)
+        finally:
+            self.slots.release()
+
+
+def get_pool(alias, settings_dict):
+    with _pools_lock:
+        if alias not in _pools:
+            options = settings_dict.get('POOL', {})
+            _pools[alias] = ConnectionPool(
+                size=options.get('SIZE', 10),
+                timeout=options.get('TIMEOUT', 10),
+            )
+        return _pools[alias]
+
+
+def close_pools():
+    """Закрывает свободные соединения всех пулов процесса. Нужно в мастере
+    gunicorn перед fork: иначе воркеры унаследуют общие сокеты."""
+    with _pools_lock:
+        for pool in _pools.values():
+            try:
+                while True:
+                    pool.idle.get_nowait().close()
+            except Empty:
+                pass
+        _pools.clear()
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    """PostgreSQL, который берёт соединения из пула процесса
+    и возвращает их туда вместо закрытия."""
+
+    def get_new_connection(self, conn_params):
+        pool = get_pool(self.alias, self.settings_dict)
+        return pool.acquire(
+            lambda: super(DatabaseWrapper, self).get_new_connection(
+                conn_params))
+
+    def _close(self):
+        if self.connection is not None:
+            with self.wrap_database_errors:
+                get_pool(self.alias, self.settings_dict).release(
+                    self.connection)
@@ -33,6 +33,7 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'api.compression.CompressionMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -61,6 +62,8 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'backend.wsgi.application'
 
+ASYNC_READ_VIEWS = os.getenv('SERVER_MODE', default='sync') == 'async'
+
 DATABASES = {
     'default': {
         'ENGINE': os.getenv('DB_ENGINE',
@@ -69,10 +72,152 @@ DATABASES = {
         'USER': os.getenv('POSTGRES_USER', default='postgres'),
         'PASSWORD': os.getenv('POSTGRES_PASSWORD', default='postgres'),
         'HOST': os.getenv('DB_HOST', default='localhost'),
-        'PORT': os.getenv('DB_PORT', default='5432')
+        'PORT': os.getenv('DB_PORT', default='5432'),
+        'CONN_MAX_AGE': int(os.getenv('DB_CONN_MAX_AGE', default=60)),
+        'POOL': {
+            'SIZE': int(os.getenv('DB_POOL_SIZE', default=10)),
+            'TIMEOUT': float(os.getenv('DB_POOL_TIMEOUT', default=10)),
+        },
     }
 }
 
+DATABASE_REPLICAS = []
+for number, host in enumerate(
+        filter(None, os.getenv('DB_REPLICA_HOSTS', default='').split(','))):
+    alias = f'replica_{number}'
+    DATABASES[alias] = dict(DATABASES['default'], HOST=host.strip(),
+                            TEST={'MIRROR': 'default'})
+    DATABASE_REPLICAS.append(alias)
+
+DATABASE_ROUTERS = ['api.routing.ReplicaRouter']
+
+REPLICA_PIN_SECONDS = int(os.getenv('REPLICA_PIN_SECONDS', default=10))
+
+REPLICA_RETRY_SECONDS = int(os.getenv('REPLICA_RETRY_SECONDS', default=30))
+
+REPLICA_CHECK_SECONDS = int(os.getenv('REPLICA_CHECK_SECONDS', default=5))
+
+DB_CONN_HEALTH_CHECKS = os.getenv(
+    'DB_CONN_HEALTH_CHECKS', default='True') == 'True'
+
+DB_CONN_HEALTH_CHECK_INTERVAL = int(
+    os.getenv('DB_CONN_HEALTH_CHECK_INTERVAL', default=10))
+
+MEMCACHED_LOCATION = os.getenv('MEMCACHED_LOCATION', default='')
+
+# Без адреса memcached (локальная разработка, тесты) - кэш в памяти
+# процесса, pymemcache при этом не нужен.
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv('CACHE_BACKEND', default=(
+            'django.core.cache.backends.memcached.PyMemcacheCache'
+            if MEMCACHED_LOCATION
+            else 'django.core.cache.backends.locmem.LocMemCache')),
+        'LOCATION': MEMCACHED_LOCATION,
+    }
+}
+
+# Кэш в памяти процесса не виден другим воркерам, воркеру очереди
+# и командам: сброс ключа в одном процессе не доходит до остальных.
+CACHE_IS_SHARED = CACHES['default']['BACKEND'] not in (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+TOKEN_CACHE_TIMEOUT = int(os.getenv('TOKEN_CACHE_TIMEOUT', default=60))
+
+BACKGROUND_WORKERS = int(os.getenv('BACKGROUND_WORKERS', default=2))
+
+JOB_QUEUES = os.getenv('JOB_QUEUES',
+                       default='default,feed,files,nutrition')
+
+JOB_MAX_ATTEMPTS = int(os.getenv('JOB_MAX_ATTEMPTS', default=5))
+
+JOB_RETRY_DELAY = int(os.getenv('JOB_RETRY_DELAY', default=10))
+
+JOB_TIMEOUT = int(os.getenv('JOB_TIMEOUT', default=10 * 60))
+
+JOB_POLL_INTERVAL = float(os.getenv('JOB_POLL_INTERVAL', default=1))
+
+FEED_FANOUT_BATCH_SIZE = int(os.getenv('FEED_FANOUT_BATCH_SIZE', default=1000))
+
+FEED_FANOUT_MAX_SUBSCRIBERS = int(
+    os.getenv('FEED_FANOUT_MAX_SUBSCRIBERS', default=10000))
+
+FEED_BACKFILL_SIZE = int(os.getenv('FEED_BACKFILL_SIZE', default=50))
+
+SIMILARITY_INDEX_PATH = os.getenv(
+    'SIMILARITY_INDEX_PATH',
+    default=os.path.join(BASE_DIR, 'similarity_index.npz'))
+
+SIMILARITY_NUM_PERM = int(os.getenv('SIMILARITY_NUM_PERM', default=128))
+
+SIMILARITY_BANDS = int(os.getenv('SIMILARITY_BANDS', default=32))
+
+TRENDING_HALF_LIFE_HOURS = float(
+    os.getenv('TRENDING_HALF_LIFE_HOURS', default=72))
+
+TRENDING_FAVORITE_WEIGHT = float(
+    os.getenv('TRENDING_FAVORITE_WEIGHT', default=2))
+
+TRENDING_CART_WEIGHT = float(os.getenv('TRENDING_CART_WEIGHT', default=1))
+
+TRENDING_TOP_SIZE = int(os.getenv('TRENDING_TOP_SIZE', default=100))
+
+TRENDING_CACHE_TIMEOUT = int(os.getenv('TRENDING_CACHE_TIMEOUT', default=60))
+
+BATCH_MAX_SIZE = int(os.getenv('BATCH_MAX_SIZE', default=100))
+
+EXPORT_CHUNK_SIZE = int(os.getenv('EXPORT_CHUNK_SIZE', default=1000))
+
+EXPORT_ROOT = os.getenv('EXPORT_ROOT',
+                        default=os.path.join(BASE_DIR, 'exports'))
+
+EXPORT_MAX_AGE = int(os.getenv('EXPORT_MAX_AGE', default=300))
+
+EXPORT_RETRY_AFTER = int(os.getenv('EXPORT_RETRY_AFTER', default=5))
+
+EXPORT_ACCEL_REDIRECT = os.getenv('EXPORT_ACCEL_REDIRECT', default='')
+
+IMPORT_BATCH_SIZE = int(os.getenv('IMPORT_BATCH_SIZE', default=1000))
+
+NUTRITION_BATCH_SIZE = int(os.getenv('NUTRITION_BATCH_SIZE', default=1000))
+
+DELETE_BATCH_SIZE = int(os.getenv('DELETE_BATCH_SIZE', default=1000))
+
+INGREDIENT_SEARCH_LIMIT = int(os.getenv('INGREDIENT_SEARCH_LIMIT',
+                                        default=50))
+
+INGREDIENT_SEARCH_THRESHOLD = float(os.getenv('INGREDIENT_SEARCH_THRESHOLD',
+                                              default=0.5))
+
+CONCURRENCY_LIMIT = int(os.getenv('CONCURRENCY_LIMIT', default=8))
+
+CONCURRENCY_SLOT_TIMEOUT = int(os.getenv('CONCURRENCY_SLOT_TIMEOUT',
+                                         default=60))
+
+CONCURRENCY_RETRY_AFTER = int(os.getenv('CONCURRENCY_RETRY_AFTER', default=2))
+
+SYNC_TOMBSTONE_DAYS = int(os.getenv('SYNC_TOMBSTONE_DAYS', default=30))
+
+SYNC_OVERLAP_SECONDS = int(os.getenv('SYNC_OVERLAP_SECONDS', default=5))
+
+SYNC_PAGE_SIZE = int(os.getenv('SYNC_PAGE_SIZE', default=500))
+
+RECIPE_FRAGMENT_TIMEOUT = int(
+    os.getenv('RECIPE_FRAGMENT_TIMEOUT', default=60 * 60))
+
+COMPRESSION_MIN_SIZE = int(os.getenv('COMPRESSION_MIN_SIZE', default=1024))
+
+GZIP_LEVEL = int(os.getenv('GZIP_LEVEL', default=6))
+
+BROTLI_QUALITY = int(os.getenv('BROTLI_QUALITY', default=5))
+
+REFERENCE_PAYLOAD_TIMEOUT = int(
+    os.getenv('REFERENCE_PAYLOAD_TIMEOUT', default=60 * 60 * 24))
+
+ANONYMOUS_PAGE_TIMEOUT = int(os.getenv('ANONYMOUS_PAGE_TIMEOUT', default=30))
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',
@@ -94,10 +239,24 @@ REST_FRAMEWORK = {
         'rest_framework.permissions.IsAuthenticatedOrReadOnly',
     ],
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.TokenAuthentication',
+        'api.authentication.CachedTokenAuthentication',
     ],
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.LimitOffsetPagination',
     'PAGE_SIZE': 6,
+    'DEFAULT_THROTTLE_CLASSES': [
+        'api.throttling.UserTokenBucketThrottle',
+        'api.throttling.ScopedTokenBucketThrottle',
+    ],
+    'DEFAULT_THROTTLE_RATES': {
+        'anon': os.getenv('THROTTLE_ANON_RATE', default='60/min'),
+        'user': os.getenv('THROTTLE_USER_RATE', default='300/min'),
+        'recipe_write': os.getenv('THROTTLE_RECIPE_WRITE_RATE',
+                                  default='20/min'),
+        'download_shopping_cart': os.getenv(
+            'THROTTLE_DOWNLOAD_SHOPPING_CART_RATE', default='10/min'),
+    },
+    # Перед бэкендом один nginx, он пишет адрес клиента в X-Forwarded-For.
+    'NUM_PROXIES': int(os.getenv('NUM_PROXIES', default=1)),
 }
 
 DJOSER = {
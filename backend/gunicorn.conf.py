@@ -0,0 +1,57 @@
+import multiprocessing
+import os
+
+bind = '0:8000'
+
+if os.getenv('SERVER_MODE', 'sync') == 'async':
+    wsgi_app = 'backend.asgi:application'
+    worker_class = 'uvicorn.workers.UvicornWorker'
+    workers = int(os.getenv('GUNICORN_WORKERS', multiprocessing.cpu_count()))
+else:
+    wsgi_app = 'backend.wsgi:application'
+    threads = int(os.getenv('GUNICORN_THREADS', 1))
+    worker_class = 'gthread' if threads > 1 else 'sync'
+    workers = int(os.getenv('GUNICORN_WORKERS',
+                            multiprocessing.cpu_count() * 2 + 1))
+
+# Приложение импортируется один раз в мастере, воркеры получают модули,
+# реестр приложений и прогретые индексы копированием при записи.
+preload_app = os.getenv('GUNICORN_PRELOAD', 'True') == 'True'
+timeout = int(os.getenv('GUNICORN_TIMEOUT', 30))
+graceful_timeout = int(os.getenv('GUNICORN_GRACEFUL_TIMEOUT', 30))
+max_requests = int(os.getenv('GUNICORN_MAX_REQUESTS', 0))
+max_requests_jitter = max_requests // 10
+
+
+def on_starting(server):
+    """Воркеры согласуют сбросы кэшей, версии индексов, лимиты запросов
+    и привязку к основной базе только через общий кэш: с кэшем в памяти
+    процесса несколько воркеров молча расходятся."""
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'backend.settings')
+    from django.conf import settings
+    if server.cfg.workers > 1 and not settings.CACHE_IS_SHARED:
+        raise RuntimeError(
+            f'{server.cfg.workers} воркеров с кэшем в памяти процесса: '
+            'задайте MEMCACHED_LOCATION или GUNICORN_WORKERS=1.')
+
+
+def warm_up(log):
+    from api.warmup import warm_up
+    timings = warm_up()
+    log.info('Прогрев: %s', ', '.join(
+        f'{name} {seconds * 1000:.0f} мс'
+        for name, seconds in timings.items()))
+
+
+def when_ready(server):
+    if server.cfg.preload_app:
+        warm_up(server.log)
+        from api.warmup import close_connections
+        close_connections()
+
+
+def post_worker_init(worker):
+    if not worker.cfg.preload_app:
+        warm_up(worker.log)
+    from api.warmup import open_connections
+    open_connections()
@@ -1,6 +1,7 @@
 from django.contrib import admin
-from django.contrib.auth.admin import UserAdmin
+from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
 
+from api.deletion import delete_user
 from users.models import User, Subscription
 
 
@@ -11,8 +12,22 @@ class SubscriptionAdmin(admin.ModelAdmin):
         'subscriber',
         'subscribed',
     )
-    search_fields = ('user', 'author',)
+    list_select_related = ('subscriber', 'subscribed',)
+    search_fields = ('subscriber__username', 'subscribed__username',)
+    autocomplete_fields = ('subscriber', 'subscribed',)
+    show_full_result_count = False
     empty_value_display = '-пусто-'
 
 
+class UserAdmin(BaseUserAdmin):
+    """Рецепты и связи удаляемых юзеров удаляются пачками."""
+
+    def delete_model(self, request, obj):
+        delete_user(obj.id)
+
+    def delete_queryset(self, request, queryset):
+        for user_id in list(queryset.values_list('id', flat=True)):
+            delete_user(user_id)
+
+
 admin.site.register(User, UserAdmin)
@@ -0,0 +1,54 @@
+# Generated by Django 3.2 on 2026-10-19 11:59
+
+from django.db import migrations, models
+
+
+def delete_duplicates(model, fields):
+    keep = model.objects.values(*fields).annotate(
+        keep_id=models.Min('id')).order_by().values('keep_id')
+    return model.objects.exclude(id__in=keep).delete()[0]
+
+
+def remove_duplicate_relations(apps, schema_editor):
+    Favorite = apps.get_model('recipes', 'Favorite')
+    ShoppingCart = apps.get_model('recipes', 'ShoppingCart')
+    ShoppingListItem = apps.get_model('recipes', 'ShoppingListItem')
+    delete_duplicates(Favorite, ('user', 'recipe'))
+    if not delete_duplicates(ShoppingCart, ('user', 'recipe')):
+        return
+    ShoppingListItem.objects.all().delete()
+    totals = (
+        ShoppingCart.objects
+        .filter(recipe__recipeingredient__ingredient__isnull=False)
+        .values('user_id', 'recipe__recipeingredient__ingredient_id')
+        .annotate(amount=models.Sum('recipe__recipeingredient__amount'))
+        .order_by()
+    )
+    ShoppingListItem.objects.bulk_create(
+        ShoppingListItem(
+            user_id=total['user_id'],
+            ingredient_id=total['recipe__recipeingredient__ingredient_id'],
+            amount=total['amount'],
+        )
+        for total in totals.iterator()
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0005_recipescore'),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicate_relations,
+                             migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='favorite',
+            constraint=models.UniqueConstraint(fields=('user', 'recipe'), name='unique_favorite'),
+        ),
+        migrations.AddConstraint(
+            model_name='shoppingcart',
+            constraint=models.UniqueConstraint(fields=('user', 'recipe'), name='unique_shopping_cart'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 3.2 on 2026-10-19 12:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0007_sync_tombstones'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='version',
+            field=models.PositiveIntegerField(default=0, verbose_name='Версия представления'),
+        ),
+    ]
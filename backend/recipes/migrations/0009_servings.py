@@ -0,0 +1,29 @@
+# Generated by Django 3.2 on 2026-10-19 12:17
+
+import django.core.validators
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0008_recipe_version'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='servings',
+            field=models.PositiveSmallIntegerField(default=1, validators=[django.core.validators.MaxValueValidator(100), django.core.validators.MinValueValidator(1)], verbose_name='Число порций'),
+        ),
+        migrations.AddField(
+            model_name='shoppingcart',
+            name='servings',
+            field=models.PositiveSmallIntegerField(blank=True, null=True, validators=[django.core.validators.MaxValueValidator(100), django.core.validators.MinValueValidator(1)], verbose_name='Желаемое число порций'),
+        ),
+        migrations.AlterField(
+            model_name='shoppinglistitem',
+            name='amount',
+            field=models.FloatField(default=0, verbose_name='Общее количество'),
+        ),
+    ]
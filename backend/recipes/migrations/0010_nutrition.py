@@ -0,0 +1,54 @@
+# Generated by Django 3.2 on 2026-10-19 12:19
+
+import django.core.validators
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0009_servings'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ingredient',
+            name='carbs',
+            field=models.FloatField(default=0, validators=[django.core.validators.MinValueValidator(0)], verbose_name='Углеводы, г'),
+        ),
+        migrations.AddField(
+            model_name='ingredient',
+            name='fat',
+            field=models.FloatField(default=0, validators=[django.core.validators.MinValueValidator(0)], verbose_name='Жиры, г'),
+        ),
+        migrations.AddField(
+            model_name='ingredient',
+            name='kcal',
+            field=models.FloatField(default=0, validators=[django.core.validators.MinValueValidator(0)], verbose_name='Калорийность, ккал'),
+        ),
+        migrations.AddField(
+            model_name='ingredient',
+            name='protein',
+            field=models.FloatField(default=0, validators=[django.core.validators.MinValueValidator(0)], verbose_name='Белки, г'),
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='carbs',
+            field=models.FloatField(db_index=True, default=0, editable=False, verbose_name='Углеводы, г'),
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='fat',
+            field=models.FloatField(db_index=True, default=0, editable=False, verbose_name='Жиры, г'),
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='kcal',
+            field=models.FloatField(db_index=True, default=0, editable=False, verbose_name='Калорийность, ккал'),
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='protein',
+            field=models.FloatField(db_index=True, default=0, editable=False, verbose_name='Белки, г'),
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 3.2 on 2026-10-19 14:05
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def delete_orphan_relations(apps, schema_editor):
+    """Строки избранного и корзины, оставшиеся от удалённых рецептов.
+    Их количества уже вычтены из списков покупок при удалении рецепта."""
+    for name in ('Favorite', 'ShoppingCart'):
+        apps.get_model('recipes', name).objects.filter(
+            recipe__isnull=True).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0010_nutrition'),
+    ]
+
+    operations = [
+        migrations.RunPython(delete_orphan_relations,
+                             migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='favorite',
+            name='recipe',
+            field=models.ForeignKey(help_text='Рецепт в избранном', on_delete=django.db.models.deletion.CASCADE, related_name='recipe_favorite', to='recipes.recipe', verbose_name='Рецепт избран'),
+        ),
+        migrations.AlterField(
+            model_name='shoppingcart',
+            name='recipe',
+            field=models.ForeignKey(help_text='список покупок для рецепта', on_delete=django.db.models.deletion.CASCADE, related_name='recipe_shopping_cart', to='recipes.recipe', verbose_name='Список покупок'),
+        ),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 3.2 on 2026-10-19 12:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0011_cascade_recipe_relations'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ScoreDecay',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('decayed_at', models.DateTimeField(verbose_name='Дата последнего затухания')),
+            ],
+        ),
+    ]
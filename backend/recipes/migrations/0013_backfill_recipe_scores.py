@@ -0,0 +1,47 @@
+import math
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import migrations
+from django.utils import timezone
+
+MIN_SCORE = 1e-3
+
+
+def backfill_recipe_scores(apps, schema_editor):
+    """Популярность по уже существующим избранному и корзинам, как
+    decay_trending_scores --rebuild: иначе после выката список
+    популярных пуст до новых добавлений."""
+    Favorite = apps.get_model('recipes', 'Favorite')
+    ShoppingCart = apps.get_model('recipes', 'ShoppingCart')
+    RecipeScore = apps.get_model('recipes', 'RecipeScore')
+    ScoreDecay = apps.get_model('recipes', 'ScoreDecay')
+    now = timezone.now()
+    half_life = settings.TRENDING_HALF_LIFE_HOURS * 60 * 60
+    scores = defaultdict(float)
+    for model, weight in ((Favorite, settings.TRENDING_FAVORITE_WEIGHT),
+                          (ShoppingCart, settings.TRENDING_CART_WEIGHT)):
+        for recipe_id, created in model.objects.values_list(
+                'recipe_id', 'created').iterator():
+            seconds = max((now - created).total_seconds(), 0)
+            scores[recipe_id] += weight * math.exp(
+                -math.log(2) * seconds / half_life)
+    RecipeScore.objects.all().delete()
+    RecipeScore.objects.bulk_create(
+        (RecipeScore(recipe_id=recipe_id, score=score)
+         for recipe_id, score in scores.items() if score >= MIN_SCORE),
+        batch_size=1000,
+    )
+    ScoreDecay.objects.update_or_create(pk=1, defaults={'decayed_at': now})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0012_score_decay'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_recipe_scores,
+                             migrations.RunPython.noop),
+    ]
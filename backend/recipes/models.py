@@ -31,6 +31,27 @@ class Ingredient(models.Model):
         max_length=10,
         verbose_name='Единица измерения ингредиента'
     )
+    # Пищевая ценность одной единицы измерения ингредиента.
+    kcal = models.FloatField(
+        default=0,
+        validators=[MinValueValidator(0)],
+        verbose_name='Калорийность, ккал',
+    )
+    protein = models.FloatField(
+        default=0,
+        validators=[MinValueValidator(0)],
+        verbose_name='Белки, г',
+    )
+    fat = models.FloatField(
+        default=0,
+        validators=[MinValueValidator(0)],
+        verbose_name='Жиры, г',
+    )
+    carbs = models.FloatField(
+        default=0,
+        validators=[MinValueValidator(0)],
+        verbose_name='Углеводы, г',
+    )
 
     class Meta:
         ordering = ('id',)
@@ -70,6 +91,45 @@ class Recipe(models.Model):
     cooking_time = models.PositiveSmallIntegerField(
         validators=[MaxValueValidator(720), MinValueValidator(1)],
     )
+    servings = models.PositiveSmallIntegerField(
+        default=1,
+        validators=[MaxValueValidator(100), MinValueValidator(1)],
+        verbose_name='Число порций',
+    )
+    # Пищевая ценность всего рецепта, пересчитывается из ингредиентов.
+    kcal = models.FloatField(
+        default=0,
+        db_index=True,
+        editable=False,
+        verbose_name='Калорийность, ккал',
+    )
+    protein = models.FloatField(
+        default=0,
+        db_index=True,
+        editable=False,
+        verbose_name='Белки, г',
+    )
+    fat = models.FloatField(
+        default=0,
+        db_index=True,
+        editable=False,
+        verbose_name='Жиры, г',
+    )
+    carbs = models.FloatField(
+        default=0,
+        db_index=True,
+        editable=False,
+        verbose_name='Углеводы, г',
+    )
+    updated_at = models.DateTimeField(
+        auto_now=True,
+        db_index=True,
+        verbose_name='Дата изменения',
+    )
+    version = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Версия представления',
+    )
 
     class Meta:
         ordering = ('-id',)
@@ -134,16 +194,32 @@ class Favorite(models.Model):
     )
     recipe = models.ForeignKey(
         Recipe,
-        blank=True,
-        null=True,
-        on_delete=models.SET_NULL,
+        on_delete=models.CASCADE,
         related_name='recipe_favorite',
         verbose_name='Рецепт избран',
         help_text='Рецепт в избранном'
     )
+    created = models.DateTimeField(
+        auto_now_add=True,
+        verbose_name='Дата добавления',
+    )
+    updated_at = models.DateTimeField(
+        auto_now=True,
+        verbose_name='Дата изменения',
+    )
 
     class Meta:
         ordering = ('id',)
+        constraints = [
+            models.UniqueConstraint(
+                fields=('user', 'recipe'),
+                name='unique_favorite',
+            ),
+        ]
+        indexes = [
+            models.Index(fields=('user', 'updated_at'),
+                         name='favorite_user_updated'),
+        ]
 
     def __str__(self):
         return f'{self.user} {self.recipe}'
@@ -158,16 +234,184 @@ class ShoppingCart(models.Model):
     )
     recipe = models.ForeignKey(
         Recipe,
-        blank=True,
-        null=True,
-        on_delete=models.SET_NULL,
+        on_delete=models.CASCADE,
         related_name='recipe_shopping_cart',
         verbose_name='Список покупок',
         help_text='список покупок для рецепта'
     )
+    # Пусто - столько порций, сколько в рецепте.
+    servings = models.PositiveSmallIntegerField(
+        blank=True,
+        null=True,
+        validators=[MaxValueValidator(100), MinValueValidator(1)],
+        verbose_name='Желаемое число порций',
+    )
+    created = models.DateTimeField(
+        auto_now_add=True,
+        verbose_name='Дата добавления',
+    )
+    updated_at = models.DateTimeField(
+        auto_now=True,
+        verbose_name='Дата изменения',
+    )
 
     class Meta:
         ordering = ('id',)
+        constraints = [
+            models.UniqueConstraint(
+                fields=('user', 'recipe'),
+                name='unique_shopping_cart',
+            ),
+        ]
+        indexes = [
+            models.Index(fields=('user', 'updated_at'),
+                         name='shopping_cart_user_updated'),
+        ]
 
     def __str__(self):
         return f'{self.user} {self.recipe}'
+
+
+class ShoppingListItem(models.Model):
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='shopping_list',
+        verbose_name='Юзер',
+    )
+    ingredient = models.ForeignKey(
+        Ingredient,
+        on_delete=models.CASCADE,
+        related_name='shopping_list_items',
+        verbose_name='ингредиент',
+    )
+    amount = models.FloatField(
+        default=0,
+        verbose_name='Общее количество',
+    )
+
+    class Meta:
+        ordering = ('id',)
+        constraints = [
+            models.UniqueConstraint(
+                fields=('user', 'ingredient'),
+                name='unique_shopping_list_item',
+            ),
+        ]
+
+    def __str__(self):
+        return f'{self.user} {self.ingredient}'
+
+
+class FeedItem(models.Model):
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='feed',
+        verbose_name='Подписчик',
+    )
+    author = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='Автор рецепта',
+    )
+    recipe = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name='feed_items',
+        verbose_name='рецепт',
+    )
+
+    class Meta:
+        ordering = ('-recipe_id',)
+        constraints = [
+            models.UniqueConstraint(
+                fields=('user', 'recipe'),
+                name='unique_feed_item',
+            ),
+        ]
+        indexes = [
+            models.Index(fields=('user', 'author'), name='feed_user_author'),
+        ]
+
+    def __str__(self):
+        return f'{self.user} {self.recipe}'
+
+
+class RecipeScore(models.Model):
+    recipe = models.OneToOneField(
+        Recipe,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='score',
+        verbose_name='рецепт',
+    )
+    score = models.FloatField(
+        default=0,
+        db_index=True,
+        verbose_name='Популярность с учётом давности',
+    )
+
+    def __str__(self):
+        return f'{self.recipe} {self.score}'
+
+
+class ScoreDecay(models.Model):
+    """Момент, до которого затухли хранимые оценки популярности:
+    одна строка на всю таблицу RecipeScore."""
+    decayed_at = models.DateTimeField(
+        verbose_name='Дата последнего затухания',
+    )
+
+    def __str__(self):
+        return f'{self.decayed_at}'
+
+
+class Tombstone(models.Model):
+    """Запись об удалении объекта для дельта-синхронизации клиентов."""
+    RECIPE = 'recipe'
+    FAVORITE = 'favorite'
+    SHOPPING_CART = 'shopping_cart'
+    SUBSCRIPTION = 'subscription'
+    KINDS = (
+        (RECIPE, 'Рецепт'),
+        (FAVORITE, 'Избранное'),
+        (SHOPPING_CART, 'Список покупок'),
+        (SUBSCRIPTION, 'Подписка'),
+    )
+
+    kind = models.CharField(
+        max_length=20,
+        choices=KINDS,
+        verbose_name='Тип объекта',
+    )
+    object_id = models.PositiveIntegerField(
+        verbose_name='id рецепта или автора',
+    )
+    # Владелец связи, у рецепта - автор. Без внешнего ключа: записи
+    # создаются и при каскадном удалении юзера.
+    user = models.ForeignKey(
+        User,
+        blank=True,
+        null=True,
+        on_delete=models.DO_NOTHING,
+        db_constraint=False,
+        related_name='+',
+        verbose_name='Владелец',
+    )
+    deleted_at = models.DateTimeField(
+        auto_now_add=True,
+        db_index=True,
+        verbose_name='Дата удаления',
+    )
+
+    class Meta:
+        ordering = ('id',)
+        indexes = [
+            models.Index(fields=('user', 'kind', 'deleted_at'),
+                         name='tombstone_user_kind_deleted'),
+        ]
+
+    def __str__(self):
+        return f'{self.kind} {self.object_id}'
@@ -0,0 +1,39 @@
+from django.test import TestCase
+from django.urls import reverse
+
+from users.models import Subscription, User
+
+
+class AdminChangelistQueriesTest(TestCase):
+    """Число запросов списка в админке не зависит от числа строк."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser(
+            username='admin', email='admin@example.com', password='pass')
+        users = [
+            User.objects.create_user(
+                username=f'user{number}', email=f'user{number}@example.com',
+                password='pass')
+            for number in range(5)
+        ]
+        Subscription.objects.bulk_create(
+            Subscription(subscriber=subscriber, subscribed=subscribed)
+            for subscriber in users for subscribed in users
+            if subscriber != subscribed)
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+
+    def assert_changelist_queries(self, model, num):
+        opts = model._meta
+        url = reverse(f'admin:{opts.app_label}_{opts.model_name}_changelist')
+        with self.assertNumQueries(num):
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+
+    def test_subscription(self):
+        self.assert_changelist_queries(Subscription, 4)
+
+    def test_user(self):
+        self.assert_changelist_queries(User, 6)
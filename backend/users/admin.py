@@ -1,5 +1,7 @@
 from django.contrib import admin
+from django.db.models import Count
 
+from api.deletion import delete_recipes
 from recipes.models import (Tag, Ingredient, Recipe, ShoppingCart,
                             Favorite, RecipeIngredient)
 
@@ -24,21 +26,27 @@ class IngredientAdmin(admin.ModelAdmin):
         'pk',
         'name',
         'measurement_unit',
+        'kcal',
+        'protein',
+        'fat',
+        'carbs',
     )
-    list_editable = ('measurement_unit',)
+    list_editable = ('measurement_unit', 'kcal', 'protein', 'fat', 'carbs')
     search_fields = ('name',)
-    list_filter = ('name',)
+    list_filter = ('measurement_unit',)
+    show_full_result_count = False
     empty_value_display = '-пусто-'
 
 
 class RecipeIngredientInline(admin.TabularInline):
     model = RecipeIngredient
     min_num = 1
+    autocomplete_fields = ('ingredient',)
 
 
 @admin.register(Recipe)
 class RecipeAdmin(admin.ModelAdmin):
-    readonly_fields = ('count_favorite',)
+    readonly_fields = ('count_favorite', 'kcal', 'protein', 'fat', 'carbs')
     list_display = (
         'pk',
         'author',
@@ -48,18 +56,33 @@ class RecipeAdmin(admin.ModelAdmin):
         'is_in_shopping_cart',
         'text',
         'cooking_time',
+        'kcal',
         'get_tags',
         'get_ingredients',
         'count_favorite',
     )
     list_editable = ('name',)
-    search_fields = ('name', 'tags',)
-    list_filter = ('name', 'author', 'tags',)
+    list_select_related = ('author',)
+    search_fields = ('name', 'author__username',)
+    list_filter = ('tags',)
+    autocomplete_fields = ('author',)
+    show_full_result_count = False
     empty_value_display = '-пусто-'
     inlines = (RecipeIngredientInline,)
 
+    def get_queryset(self, request):
+        return super().get_queryset(request).prefetch_related(
+            'tags', 'ingredients',
+        ).annotate(favorites_count=Count('recipe_favorite'))
+
     def count_favorite(self, obj):
-        return obj.recipe_favorite.all().count()
+        return obj.favorites_count
+
+    def delete_model(self, request, obj):
+        delete_recipes([obj.id])
+
+    def delete_queryset(self, request, queryset):
+        delete_recipes(list(queryset.values_list('id', flat=True)))
 
 
 @admin.register(ShoppingCart)
@@ -69,7 +92,10 @@ class ShoppingCartAdmin(admin.ModelAdmin):
         'user',
         'recipe',
     )
-    search_fields = ('user', 'recipe',)
+    list_select_related = ('user', 'recipe__author',)
+    search_fields = ('user__username', 'recipe__name',)
+    autocomplete_fields = ('user', 'recipe',)
+    show_full_result_count = False
     empty_value_display = '-пусто-'
 
 
@@ -80,5 +106,8 @@ class FavoriteAdmin(admin.ModelAdmin):
         'user',
         'recipe',
     )
-    search_fields = ('user', 'recipe',)
+    list_select_related = ('user', 'recipe__author',)
+    search_fields = ('user__username', 'recipe__name',)
+    autocomplete_fields = ('user', 'recipe',)
+    show_full_result_count = False
     empty_value_display = '-пусто-'
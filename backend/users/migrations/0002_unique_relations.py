@@ -0,0 +1,26 @@
+# Generated by Django 3.2 on 2026-10-19 11:59
+
+from django.db import migrations, models
+
+
+def remove_duplicate_subscriptions(apps, schema_editor):
+    Subscription = apps.get_model('users', 'Subscription')
+    keep = Subscription.objects.values('subscriber', 'subscribed').annotate(
+        keep_id=models.Min('id')).order_by().values('keep_id')
+    Subscription.objects.exclude(id__in=keep).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicate_subscriptions,
+                             migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='subscription',
+            constraint=models.UniqueConstraint(fields=('subscriber', 'subscribed'), name='unique_subscription'),
+        ),
+    ]
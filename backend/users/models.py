@@ -43,9 +43,23 @@ class Subscription(models.Model):
         related_name='subscribed',
         verbose_name='Автор на которого подписываются',
     )
+    updated_at = models.DateTimeField(
+        auto_now=True,
+        verbose_name='Дата изменения',
+    )
 
     class Meta:
         ordering = ('id',)
+        constraints = [
+            models.UniqueConstraint(
+                fields=('subscriber', 'subscribed'),
+                name='unique_subscription',
+            ),
+        ]
+        indexes = [
+            models.Index(fields=('subscriber', 'updated_at'),
+                         name='subscription_updated'),
+        ]
 
     def __str__(self):
         return f'{self.subscriber} {self.subscribed}'
@@ -0,0 +1,73 @@
+from django.test import TestCase
+from django.urls import reverse
+
+from recipes.models import (Favorite, Ingredient, Recipe, RecipeIngredient,
+                            RecipeTag, ShoppingCart, Tag)
+from users.models import User
+
+
+class AdminChangelistQueriesTest(TestCase):
+    """Число запросов списка в админке не зависит от числа строк."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser(
+            username='admin', email='admin@example.com', password='pass')
+        users = [
+            User.objects.create_user(
+                username=f'user{number}', email=f'user{number}@example.com',
+                password='pass')
+            for number in range(5)
+        ]
+        tags = [
+            Tag.objects.create(name=f'Тэг {number}', color='#E26C2D',
+                               slug=f'tag{number}')
+            for number in range(5)
+        ]
+        ingredients = [
+            Ingredient.objects.create(name=f'ингредиент {number}',
+                                      measurement_unit='г')
+            for number in range(5)
+        ]
+        recipes = [
+            Recipe.objects.create(author=user, name=f'Рецепт {number}',
+                                  text='Описание', cooking_time=10)
+            for number, user in enumerate(users)
+        ]
+        RecipeTag.objects.bulk_create(
+            RecipeTag(recipe=recipe, tag=tag)
+            for recipe in recipes for tag in tags[:2])
+        RecipeIngredient.objects.bulk_create(
+            RecipeIngredient(recipe=recipe, ingredient=ingredient, amount=10)
+            for recipe in recipes for ingredient in ingredients[:3])
+        Favorite.objects.bulk_create(
+            Favorite(user=user, recipe=recipe)
+            for user in users for recipe in recipes[:2])
+        ShoppingCart.objects.bulk_create(
+            ShoppingCart(user=user, recipe=recipe)
+            for user in users for recipe in recipes[:2])
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+
+    def assert_changelist_queries(self, model, num):
+        opts = model._meta
+        url = reverse(f'admin:{opts.app_label}_{opts.model_name}_changelist')
+        with self.assertNumQueries(num):
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+
+    def test_tag(self):
+        self.assert_changelist_queries(Tag, 8)
+
+    def test_ingredient(self):
+        self.assert_changelist_queries(Ingredient, 5)
+
+    def test_recipe(self):
+        self.assert_changelist_queries(Recipe, 7)
+
+    def test_shopping_cart(self):
+        self.assert_changelist_queries(ShoppingCart, 4)
+
+    def test_favorite(self):
+        self.assert_changelist_queries(Favorite, 4)